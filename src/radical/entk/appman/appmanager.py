@@ -4,9 +4,7 @@ __author__    = 'Vivek Balasubramanian <vivek.balasubramaniana@rutgers.edu>'
 __license__   = 'MIT'
 
 import os
-import json
 import pika
-import time
 
 import threading     as mt
 
@@ -15,9 +13,11 @@ import radical.utils as ru
 from .. import exceptions as ree
 
 from ..pipeline    import Pipeline
-from ..task        import Task
 from ..utils       import write_session_description
 from ..utils       import write_workflows
+from ..utils       import Profiler, Progress, report_interval
+from ..transport   import RMQ_Transport, IPC_Transport, ZMQ_Transport
+from ..transport   import get_codec
 
 from .wfprocessor  import WFprocessor
 
@@ -55,6 +55,18 @@ class AppManager(object):
         :rts_config:      Configuration for the RTS, accepts
                           {'sandbox_cleanup': True/False,'db_cleanup':
                           True/False} when RTS is RP
+        :transport:       Specify the transport used between the EnTK
+                          components. Current options: 'ipc' (in-process
+                          queues, no broker needed), 'zmq' (ZeroMQ, no broker
+                          needed), 'rabbitmq' (default if unspecified)
+        :codec:           Specify the wire format of the messages between the
+                          EnTK components. Current options: 'json',
+                          'msgpack' (compact, default if unspecified - falls
+                          back to 'json' if the msgpack module is missing)
+        :submit_window:   Limit the resources requested by the tasks in flight
+                          on the RTS to this multiple of the pilot size, and
+                          submit more tasks as tasks complete (`0` for no
+                          limit, the default config uses 2)
         :name:            Name of the Application. It should be unique between
                           executions. (default is randomly assigned)
     '''
@@ -74,7 +86,10 @@ class AppManager(object):
                  rts=None,
                  rmq_cleanup=None,
                  rts_config=None,
-                 name=None):
+                 name=None,
+                 transport=None,
+                 codec=None,
+                 submit_window=None):
 
         # Create a session for each EnTK script execution
         if name:
@@ -86,7 +101,8 @@ class AppManager(object):
 
         self._read_config(config_path, hostname, port, username, password,
                           reattempts, resubmit_failed, autoterminate,
-                          write_workflow, rts, rmq_cleanup, rts_config)
+                          write_workflow, rts, rmq_cleanup, rts_config,
+                          transport, codec, submit_window)
 
         # Create an uid + logger + profiles for AppManager, under the sid
         # namespace
@@ -98,11 +114,23 @@ class AppManager(object):
         name = 'radical.entk.%s' % self._uid
 
         self._logger = ru.Logger(name=name, path=path)
-        self._prof   = ru.Profiler(name=name, path=path)
+        self._prof   = Profiler   (name=name, path=path)
         self._report = ru.Reporter(name=name)
 
+        # In performance mode, task updates are reported as periodic progress
+        # per stage instead of one line each, see `Progress`.
+        self._progress = None
+        if report_interval():
+            self._progress = Progress(self._report, report_interval())
+
         self._report.info('EnTK session: %s\n' % self._sid)
         self._report.info('Creating AppManager')
+
+        if self._codec.name != self._codec_name:
+            self._logger.warning('codec %s is not available, using %s',
+                                 self._codec_name, self._codec.name)
+            self._report.warn('Codec %s is not available, using %s\n'
+                              % (self._codec_name, self._codec.name))
         self._prof.prof('amgr_creat', uid=self._uid)
 
         self._rmgr            = None
@@ -115,6 +143,7 @@ class AppManager(object):
         self._task_manager    = None
         self._workflow        = None
         self._workflows       = list()
+        self._pipelines       = dict()
         self._cur_attempt     = 1
         self._shared_data     = list()
         self._wfp             = None
@@ -125,7 +154,11 @@ class AppManager(object):
         # Setup rabbitmq queues
         self._setup_mqs()
 
-        self._rmq_ping_interval = os.getenv('RMQ_PING_INTERVAL', 10)
+        self._mq_timeout  = 0.1
+
+        # Interval in which the main thread checks the health of the
+        # components while waiting for the workflow to complete
+        self._watchdog_interval = float(os.getenv('ENTK_WATCHDOG_INTERVAL', 1))
 
         self._logger.info('Application Manager initialized')
         self._prof.prof('amgr_created', uid=self._uid)
@@ -136,7 +169,8 @@ class AppManager(object):
     #
     def _read_config(self, config_path, hostname, port, username, password,
                      reattempts, resubmit_failed, autoterminate,
-                     write_workflow, rts, rmq_cleanup, rts_config):
+                     write_workflow, rts, rmq_cleanup, rts_config,
+                     transport, codec, submit_window):
 
         if not config_path:
             config_path = os.path.dirname(os.path.abspath(__file__))
@@ -158,6 +192,12 @@ class AppManager(object):
         self._rmq_cleanup      = _if(rmq_cleanup,     config['rmq_cleanup'])
         self._rts_config       = _if(rts_config,      config['rts_config'])
         self._rts              = _if(rts,             config['rts'])
+        self._transport_name   = _if(transport,       config.get('transport',
+                                                                 'rabbitmq'))
+        self._codec_name       = _if(codec,           config.get('codec',
+                                                                 'msgpack'))
+        self._submit_window    = _if(submit_window,   config.get(
+                                                        'submit_window', 0))
 
         credentials = pika.PlainCredentials(self._username, self._password)
         self._rmq_conn_params = pika.connection.ConnectionParameters(
@@ -171,6 +211,25 @@ class AppManager(object):
         if self._rts not in ['radical.pilot', 'mock']:
             raise ValueError('invalid RTS %s' % self._rts)
 
+        # The queues of the ipc transport are created here, so that they are
+        # inherited by the task manager process
+        if self._transport_name == 'rabbitmq':
+            self._transport = RMQ_Transport(self._rmq_conn_params)
+
+        elif self._transport_name == 'ipc':
+            self._transport = IPC_Transport()
+
+        elif self._transport_name == 'zmq':
+            self._transport = ZMQ_Transport()
+
+        else:
+            raise ValueError('invalid transport %s' % self._transport_name)
+
+        # All components of the session use the same wire format.  If the
+        # requested format is not available, we fall back to json (and warn
+        # about it once the logger exists, see `__init__()`).
+        self._codec = get_codec(self._codec_name)
+
 
     # --------------------------------------------------------------------------
     #
@@ -309,7 +368,8 @@ class AppManager(object):
         self._workflows.append(workflow)
 
         # set current workflow
-        self._workflow = workflow
+        self._workflow  = workflow
+        self._pipelines = dict()
         self._logger.info('Workflow assigned to Application Manager')
 
 
@@ -445,6 +505,9 @@ class AppManager(object):
         if self._rmq_cleanup:
             self._cleanup_mqs()
 
+        if self._progress:
+            self._progress.flush()
+
         self._report.info('All components terminated\n')
         self._prof.prof('termination done', uid=self._uid)
 
@@ -489,13 +552,6 @@ class AppManager(object):
             self._report.ok('>>ok\n')
 
             self._prof.prof('mqs_setup_start', uid=self._uid)
-            self._logger.debug('Setting up mq connection and channel')
-
-            mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-
-            mq_channel = mq_connection.channel()
-
-            self._logger.debug('Connection and channel setup successful')
             self._logger.debug('Setting up all exchanges and queues')
 
             qs = ['%s-tmgr-to-sync' % self._sid,
@@ -513,10 +569,10 @@ class AppManager(object):
                 self._completed_queue.append(queue_name)
                 qs.append(queue_name)
 
+            self._transport.declare(qs)
+
             f = open('.%s.txt' % self._sid, 'w')
             for q in qs:
-                # Durable Qs will not be lost if rabbitmq server crashes
-                mq_channel.queue_declare(queue=q)
                 f.write(q + '\n')
             f.close()
 
@@ -538,21 +594,18 @@ class AppManager(object):
         try:
             self._prof.prof('mqs_cleanup_start', uid=self._uid)
 
-            mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-            mq_channel = mq_connection.channel()
-
-            mq_channel.queue_delete(queue='%s-tmgr-to-sync' % self._sid)
-            mq_channel.queue_delete(queue='%s-cb-to-sync' % self._sid)
-            mq_channel.queue_delete(queue='%s-sync-to-tmgr' % self._sid)
-            mq_channel.queue_delete(queue='%s-sync-to-cb' % self._sid)
+            qs = ['%s-tmgr-to-sync' % self._sid,
+                  '%s-cb-to-sync'   % self._sid,
+                  '%s-sync-to-tmgr' % self._sid,
+                  '%s-sync-to-cb'   % self._sid]
 
             for i in range(1, self._num_pending_qs + 1):
-                queue_name = '%s-pendingq-%s' % (self._sid, i)
-                mq_channel.queue_delete(queue=queue_name)
+                qs.append('%s-pendingq-%s' % (self._sid, i))
 
             for i in range(1, self._num_completed_qs + 1):
-                queue_name = '%s-completedq-%s' % (self._sid, i)
-                mq_channel.queue_delete(queue=queue_name)
+                qs.append('%s-completedq-%s' % (self._sid, i))
+
+            self._transport.delete(qs)
 
             self._prof.prof('mqs_cleanup_stop', uid=self._uid)
 
@@ -588,7 +641,9 @@ class AppManager(object):
                                 pending_queue=self._pending_queue,
                                 completed_queue=self._completed_queue,
                                 resubmit_failed=self._resubmit_failed,
-                                rmq_conn_params=self._rmq_conn_params)
+                                rmq_conn_params=self._rmq_conn_params,
+                                transport=self._transport,
+                                codec=self._codec)
         self._wfp.initialize_workflow()
         self._prof.prof('wfp_create_stop', uid=self._uid)
 
@@ -622,7 +677,10 @@ class AppManager(object):
                     pending_queue=self._pending_queue,
                     completed_queue=self._completed_queue,
                     rmgr=self._rmgr,
-                    rmq_conn_params=self._rmq_conn_params)
+                    rmq_conn_params=self._rmq_conn_params,
+                    transport=self._transport,
+                    codec=self._codec,
+                    submit_window=self._submit_window)
 
             self._task_manager.start_manager()
             self._task_manager.start_heartbeat()
@@ -634,32 +692,16 @@ class AppManager(object):
     #
     def _run_workflow(self):
 
-        active_pipe_count  = len(self._workflow)
-        finished_pipe_uids = list()
-
-        # We wait till all pipelines of the workflow are marked
-        # complete
-        state      = self._rmgr.get_resource_allocation_state()
-        final      = self._rmgr.get_completed_states()
-        incomplete = self._wfp.workflow_incomplete()
-
-        while active_pipe_count and \
-              incomplete        and \
-              state not in final:
+        # We wait till all pipelines of the workflow are marked complete.  The
+        # WFprocessor signals pipeline completions, so we block until the
+        # workflow completed, or until the watchdog interval passed to check
+        # the resource allocation and the health of our components.
+        final = self._rmgr.get_completed_states()
 
-            for pipe in self._workflow:
-
-                with pipe.lock:
-
-                    if pipe.completed and \
-                        pipe.uid not in finished_pipe_uids:
-
-                        finished_pipe_uids.append(pipe.uid)
-                        active_pipe_count -= 1
-
-                        self._logger.info('Pipe %s completed' % pipe.uid)
-                        self._logger.info('Active pipes %s' % active_pipe_count)
+        while not self._wfp.wait_workflow(self._watchdog_interval):
 
+            if self._rmgr.get_resource_allocation_state() in final:
+                break
 
             if not self._sync_thread.is_alive() and \
                 self._cur_attempt <= self._reattempts:
@@ -686,7 +728,9 @@ class AppManager(object):
                                         pending_queue=self._pending_queue,
                                         completed_queue=self._completed_queue,
                                         resubmit_failed=self._resubmit_failed,
-                                        rmq_conn_params=self._rmq_conn_params)
+                                        rmq_conn_params=self._rmq_conn_params,
+                                        transport=self._transport,
+                                        codec=self._codec)
 
                 self._logger.info('Restarting WFProcessor')
                 self._wfp.start_processor()
@@ -720,100 +764,89 @@ class AppManager(object):
 
     # --------------------------------------------------------------------------
     #
-    def _task_update(self, msg, reply_to, corr_id, mq_channel, method_frame):
+    def _get_pipeline(self, uid):
+        '''
+        Return the pipeline of the current workflow with the given uid (or
+        None).  Uids are assigned after the workflow is set, so the registry is
+        (re)built on a miss.
+        '''
 
-        completed_task = Task()
-        completed_task.from_dict(msg['object'])
+        pipe = self._pipelines.get(uid)
 
-        self._logger.info('Received %s with state %s'
-                         % (completed_task.uid, completed_task.state))
+        if pipe is None and len(self._pipelines) != len(self._workflow):
+            self._pipelines = dict([(p.uid, p) for p in self._workflow])
+            pipe = self._pipelines.get(uid)
 
-      # found_task = False
+        return pipe
 
-        # Traverse the entire workflow to find the correct task
-        for pipe in self._workflow:
 
-            with pipe.lock:
+    # --------------------------------------------------------------------------
+    #
+    def _task_update(self, updates, reply_to, corr_id, mq_channel):
+
+        # the state updates of a sync message are applied in order
+        for update in updates:
+            self._update_task(update)
+
+        # The task manager blocks until it receives the ack, so we reply even
+        # if the task was not found or the state was already known.  A single
+        # ack confirms all tasks of the message.
+        mq_channel.publish(reply_to, '%s-ack' % updates[-1]['uid'], corr_id)
+
+        for update in updates:
+            self._prof.prof('pub_ack_state_%s' % update['state'],
+                            uid=update['uid'])
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _update_task(self, update):
+        self._logger.info('Received %s with state %s',
+                          update['uid'], update['state'])
+
+        # Find the task via the uid registry of the workflow (pipeline uid ->
+        # pipeline, stage uid -> stage, task uid -> task) instead of traversing
+        # the entire workflow.  Stage and task indices are shared with the
+        # WFprocessor as they live in the workflow objects.
+        task = None
+        pipe = self._get_pipeline(update['pipeline'])
 
-                if pipe.completed or \
-                    pipe.uid != completed_task.parent_pipeline['uid']:
-                    continue
+        if pipe:
 
-                for stage in pipe.stages:
+            with pipe.lock:
 
-                    if stage.uid != completed_task.parent_stage['uid']:
-                        continue
+                if not pipe.completed:
 
-                    for task in stage.tasks:
+                    stage = pipe._get_stage(update['stage'])
 
-                        if completed_task.uid != task.uid or \
-                            completed_task.state == task.state:
-                            continue
+                    if stage:
+                        task = stage._get_task(update['uid'])
 
-                        task.state = str(completed_task.state)
-                        self._logger.debug('Found task %s in state %s'
-                                          % (task.uid, task.state))
+                if task and update['state'] != task.state:
 
-                        if completed_task.path:
-                            task.path = str(completed_task.path)
+                    task.state = str(update['state'])
+                    self._logger.debug('Found task %s in state %s',
+                                       task.uid, task.state)
 
-                        mq_channel.basic_publish(
-                                exchange='',
-                                routing_key=reply_to,
-                                properties=pika.BasicProperties(
-                                    correlation_id=corr_id),
-                                body='%s-ack' % task.uid)
+                    if update.get('path'):
+                        task.path = str(update['path'])
 
-                        state = msg['object']['state']
-                        self._prof.prof('pub_ack_state_%s' % state,
-                                        uid=msg['object']['uid'])
+                    if update.get('rts_uid'):
+                        task.rts_uid = str(update['rts_uid'])
 
-                        mq_channel.basic_ack(
-                                delivery_tag=method_frame.delivery_tag)
+                    if update.get('exit_code') is not None:
+                        task.exit_code = update['exit_code']
 
+                    if self._progress:
+                        self._progress.advance(task)
+                    else:
                         self._report.ok('Update: ')
                         self._report.info('%s state: %s\n'
                                          % (task.luid, task.state))
 
-                      # found_task = True
-                        break
-
-                # if not found_task:
-                #
-                #     # If there was a Stage update, but the Stage was
-                #     # not found in any of the Pipelines. This
-                #     # means that this was a Stage that was added
-                #     # during runtime and the AppManager does not
-                #     # know about it. The current solution is going
-                #     # to be: add it to the workflow object in the
-                #     # AppManager via the synchronizer.
-                #
-                #     self._logger.info('Adding new task %s to \
-                #                         parent stage: %s'
-                #                         % (completed_task.uid,
-                #                         stage.uid))
-                #
-                #     self._prof.prof('adap_add_task_start',
-                #                     uid=completed_task.uid)
-                #     stage.add_tasks(completed_task)
-                #     self._prof.prof('adap_add_task_stop',
-                #                     uid=completed_task.uid)
-                #
-                #     mq_channel.basic_publish(exchange='',
-                #                 routing_key=reply_to,
-                #                 properties=pika.BasicProperties(
-                #                     correlation_id=corr_id),
-                #                 body='%s-ack' % completed_task.uid)
-                #
-                #     self._prof.prof('pub_ack_state_%s' %
-                #                 msg['object']['state'],
-                #                 uid=msg['object']['uid'])
-                #
-                #     mq_channel.basic_ack(
-                #         delivery_tag=method_frame.delivery_tag)
-                #     self._report.ok('Update: ')
-                #     self._report.info('%s state: %s\n' %
-                #     (completed_task.luid, completed_task.state))
+        if not task:
+            self._logger.warning('Task %s not found in the workflow'
+                                 % update['uid'])
 
 
     # --------------------------------------------------------------------------
@@ -853,69 +886,76 @@ class AppManager(object):
         self._prof.prof('sync_thread_start', uid=self._uid)
         self._logger.info('synchronizer thread started')
 
-        mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-        mq_channel = mq_connection.channel()
-
-        last  = time.time()
-        qname_t2s = '%s-tmgr-to-sync' % self._sid
-        qname_c2s = '%s-cb-to-sync'   % self._sid
-
-        while not self._terminate_sync.is_set():
+        # ----------------------------------------------------------------------
+        def task_update(reply_to):
 
-            # --------------------------------------------------------------
-            # Messages between tmgr Main thread and synchronizer -- only
-            # Task objects
-            method_frame, props, body = mq_channel.basic_get(queue=qname_t2s)
-
-            # The message received is a JSON object with the following
-            # structure:
+            # The message received is encoded by the session codec and has
+            # the following structure:
+            # msg = {
+            #         'type': 'TaskState',
+            #         'objects': [state update, ...]
+            #         }
+            # where the state updates are dicts as created by `pack_state()`
+            # of the codec.  Full task descriptions are accepted, too:
             # msg = {
             #         'type': 'Pipeline'/'Stage'/'Task',
             #         'object': json/dict
             #         }
-            if body:
+            # or, for a bulk of objects:
+            # msg = {
+            #         'type': 'Pipeline'/'Stage'/'Task',
+            #         'objects': [json/dict, ...]
+            #         }
+            def callback(body, corr_id):
 
-                msg   = json.loads(body)
-                uid   = msg['object']['uid']
-                state = msg['object']['state']
+                msg = self._codec.loads(body)
 
-                self._prof.prof('sync_recv_obj_state_%s' % state, uid=uid)
-                self._logger.debug('recv %s in state %s (sync)' % (uid, state))
+                if 'objects' in msg: objs = msg['objects']
+                else               : objs = [msg['object']]
 
-                if msg['type'] == 'Task':
-                    self._task_update(msg, '%s-sync-to-tmgr' % self._sid,
-                            props.correlation_id, mq_channel, method_frame)
+                # only Task states are synced with the AppManager, and they
+                # are applied without creating Task objects
+                if msg['type'] == 'TaskState':
+                    updates = objs
 
+                elif msg['type'] == 'Task':
+                    updates = [self._codec.pack_state(
+                                   self._codec.unpack_task(obj))
+                               for obj in objs]
 
-            # --------------------------------------------------------------
-            # Messages between callback thread and synchronizer -- only
-            # Task objects
-            method_frame, props, body = mq_channel.basic_get(queue=qname_c2s)
+                else:
+                    self._logger.debug('ignore %s sync' % msg['type'])
+                    return
 
-            # The message received is a JSON object with the following structure:
-            # msg = {
-            #         'type': 'Pipeline'/'Stage'/'Task',
-            #         'object': json/dict
-            #         }
-            if body:
+                for update in updates:
+                    self._prof.prof('sync_recv_obj_state_%s' % update['state'],
+                                    uid=update['uid'])
+                    self._logger.debug('recv %s in state %s (sync)'
+                                      % (update['uid'], update['state']))
 
-                msg   = json.loads(body)
-                uid   = msg['object']['uid']
-                state = msg['object']['state']
+                self._task_update(updates, reply_to, corr_id, mq_channel)
 
-                self._prof.prof('sync_recv_obj_state_%s' % state, uid=uid)
-                self._logger.debug('recv %s in state %s (sync)' % (uid, state))
+            return callback
+        # ----------------------------------------------------------------------
 
-                if msg['type'] == 'Task':
-                    self._task_update(msg, '%s-sync-to-cb' % self._sid,
-                            props.correlation_id, mq_channel, method_frame)
+        mq_channel = self._transport.channel()
 
+        qname_t2s = '%s-tmgr-to-sync' % self._sid
+        qname_c2s = '%s-cb-to-sync'   % self._sid
+
+        # Messages between tmgr Main thread and synchronizer, and between
+        # callback thread and synchronizer -- only Task objects.  Messages are
+        # dispatched to the callbacks by `process()`, which blocks while no
+        # messages arrive and also keeps the channel alive.
+        mq_channel.consume(qname_t2s,
+                           task_update('%s-sync-to-tmgr' % self._sid))
+        mq_channel.consume(qname_c2s,
+                           task_update('%s-sync-to-cb' % self._sid))
+
+        while not self._terminate_sync.is_set():
+            mq_channel.process(self._mq_timeout)
 
-            # Appease pika cos it thinks the connection is dead
-            now = time.time()
-            if now - last >= self._rmq_ping_interval:
-                mq_connection.process_data_events()
-                last = now
+        mq_channel.close()
 
         self._prof.prof('sync_thread_stop', uid=self._uid)
 
@@ -5,15 +5,15 @@ __license__   = "MIT"
 
 
 import os
-import json
-import pika
-import time
 import threading
+import collections
 
 import radical.utils as ru
 
 # EnTK imports
-from .. import states, Task
+from ..          import states
+from ..utils     import get_queue, Profiler, Progress, report_interval
+from ..transport import RMQ_Transport, JSON_Codec
 
 
 # ------------------------------------------------------------------------------
@@ -35,6 +35,11 @@ class WFprocessor(object):
         :resubmit_failed: (bool) True if failed tasks should be resubmitted
         :rmq_conn_params: (pika.connection.ConnectionParameters) object of
                           parameters necessary to connect to RabbitMQ
+        :transport:       (Base_Transport) transport to communicate over
+                          (optional, defaults to RabbitMQ via
+                          `rmq_conn_params`)
+        :codec:           wire format of the messages (optional, defaults to
+                          JSON)
     """
 
     # --------------------------------------------------------------------------
@@ -45,7 +50,9 @@ class WFprocessor(object):
                  pending_queue,
                  completed_queue,
                  resubmit_failed,
-                 rmq_conn_params):
+                 rmq_conn_params,
+                 transport=None,
+                 codec=None):
 
         # Mandatory arguments
         self._sid             = sid
@@ -54,6 +61,12 @@ class WFprocessor(object):
         self._resubmit_failed = resubmit_failed
         self._rmq_conn_params = rmq_conn_params
 
+        if not transport:
+            transport = RMQ_Transport(rmq_conn_params)
+
+        self._transport       = transport
+        self._codec           = codec or JSON_Codec()
+
         # Assign validated workflow
         self._workflow = workflow
 
@@ -64,14 +77,39 @@ class WFprocessor(object):
 
         name = 'radical.entk.%s' % self._uid
         self._logger = ru.Logger  (name, path=self._path)
-        self._prof   = ru.Profiler(name, path=self._path)
+        self._prof   = Profiler   (name, path=self._path)
         self._report = ru.Reporter(name)
 
+        # In performance mode, task transitions are reported as periodic
+        # progress per stage instead of one line each, see `Progress`.
+        self._progress = None
+        if report_interval():
+            self._progress = Progress(self._report, report_interval())
+
+        # Registry of the workflow's pipelines by uid, see `_get_pipeline()`
+        self._pipelines = dict()
+
+        # Pipelines which may have tasks ready for scheduling.  A pipeline is
+        # marked ready when a transition makes new tasks eligible (new stage,
+        # resumed pipeline, resubmitted task), and the enqueue thread sleeps
+        # until the ready set is non-empty.  As pipelines can also be changed
+        # by the user outside of the WFprocessor, all pipelines are rescanned
+        # if nothing got ready for `_rescan_interval` seconds.
+        self._ready           = set()
+        self._ready_cond      = threading.Condition()
+        self._rescan_interval = float(os.getenv('ENTK_WFP_RESCAN_INTERVAL', 1))
+
+        # Pipelines which have completed.  Completions are signalled via
+        # `_completed_cond`, so that waiting for the workflow to complete does
+        # not need to poll all pipelines, see `wait_workflow()`.
+        self._completed      = set([p for p in workflow if p.completed])
+        self._completed_cond = threading.Condition()
+
         # Defaults
         self._wfp_process       = None
         self._enqueue_thread    = None
-        self._dequeue_thread    = None
-        self._rmq_ping_interval = os.getenv('RMQ_PING_INTERVAL', 10)
+        self._dequeue_threads   = list()
+        self._mq_timeout        = 0.1
 
         self._logger.info('Created WFProcessor object: %s' % self._uid)
         self._prof.prof('create_wfp', uid=self._uid)
@@ -94,9 +132,16 @@ class WFprocessor(object):
         obj.state = new_state
 
         self._prof.prof('advance', uid=obj.uid, state=obj.state, msg=msg)
-        self._report.ok('Update: ')
-        self._report.info('%s state: %s\n' % (obj.luid, obj.state))
-        self._logger.info('Transition %s to state %s' % (obj.uid, new_state))
+        self._logger.info('Transition %s to state %s', obj.uid, new_state)
+
+        if obj_type == 'Task' and self._progress:
+            self._progress.advance(obj)
+        else:
+            self._report.ok('Update: ')
+            self._report.info('%s state: %s\n' % (obj.luid, obj.state))
+
+        if obj_type == 'Pipeline' and obj.completed:
+            self._set_completed(obj)
 
 
     # --------------------------------------------------------------------------
@@ -110,11 +155,71 @@ class WFprocessor(object):
     # --------------------------------------------------------------------------
     # Private Methods
     #
-    def _create_workload(self):
+    def _set_completed(self, pipe):
+        '''
+        record the completion of a pipeline and wake up threads waiting for
+        the workflow to complete
+        '''
+
+        with self._completed_cond:
+
+            if pipe in self._completed:
+                return
+
+            self._completed.add(pipe)
+            self._completed_cond.notify_all()
+
+            self._logger.info('Pipe %s completed' % pipe.uid)
+            self._logger.info('Active pipes %s'
+                              % (len(self._workflow) - len(self._completed)))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _set_ready(self, pipes):
+        '''
+        mark the given pipelines as ready for scheduling and wake up the
+        enqueue thread
+        '''
+
+        with self._ready_cond:
+            self._ready.update(pipes)
+            self._ready_cond.notify()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _get_ready(self):
+        '''
+        wait until pipelines are ready for scheduling and return them (in
+        workflow order).  If no pipeline gets ready within the rescan interval,
+        all pipelines are returned.
+        '''
+
+        with self._ready_cond:
+
+            if not self._ready:
+                self._ready_cond.wait(self._rescan_interval)
+
+            ready       = self._ready
+            self._ready = set()
+
+        if not ready:
+            return list(self._workflow)
+
+        return [pipe for pipe in self._workflow if pipe in ready]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _create_workload(self, pipes=None):
+
+        # We iterate through the given pipelines (all pipelines by default) to
+        # collect tasks from stages that are pending scheduling. Once
+        # collected, these tasks will be communicated to the tmgr in bulk.
 
-        # We iterate through all pipelines to collect tasks from
-        # stages that are pending scheduling. Once collected, these tasks
-        # will be communicated to the tmgr in bulk.
+        if pipes is None:
+            pipes = self._workflow
 
         # Initial empty list to store executable tasks across different
         # pipelines
@@ -125,7 +230,7 @@ class WFprocessor(object):
         # we can update the state of stages accordingly
         scheduled_stages = list()
 
-        for pipe in self._workflow:
+        for pipe in pipes:
 
             with pipe.lock:
 
@@ -150,6 +255,7 @@ class WFprocessor(object):
                     exec_stage.parent_pipeline['uid']  = pipe.uid
                     exec_stage.parent_pipeline['name'] = pipe.name
                     exec_stage._assign_uid(self._sid)
+                    pipe._index_stages([exec_stage])
 
                 # If its a new stage, update its state
                 if exec_stage.state == states.INITIAL:
@@ -191,29 +297,25 @@ class WFprocessor(object):
 
     # --------------------------------------------------------------------------
     #
-    def _execute_workload(self, workload, scheduled_stages):
+    def _execute_workload(self, workload, scheduled_stages, mq_channel):
 
-        # Tasks of the workload need to be converted into a dict
-        # as pika can send and receive only json/dict data
-        wl_json = json.dumps([task.to_dict() for task in workload])
+        # The workload is sharded over the pending queues by pipeline, so
+        # that the tasks of a pipeline always use the same queue
+        shards = collections.OrderedDict()
+        for task in workload:
+            queue = get_queue(task.parent_pipeline['uid'], self._pending_queue)
+            shards.setdefault(queue, list()).append(task)
 
-        # Acquire a connection+channel to the rmq server
-        mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-        mq_channel = mq_connection.channel()
+        for queue, tasks in shards.iteritems():
 
-        # Send the workload to the pending queue
-        mq_channel.basic_publish(exchange = '',
-                                    routing_key=self._pending_queue[0],
-                                    body=wl_json
+            # Tasks of the workload are encoded with the session codec, as
+            # the transport can send and receive only strings
+            body = self._codec.dumps(self._codec.pack_workload(tasks))
 
-                                    # TODO: Make durability parameters
-                                    # as a config parameter and then
-                                    # enable the following accordingly
-                                    # properties=pika.BasicProperties(
-                                    # make message persistent
-                                    # delivery_mode = 2)
+            # Send the workload to the pending queue
+            # TODO: Make durability parameters as a config parameter
+            mq_channel.publish(queue, body)
 
-                                    )
         self._logger.debug('Workload submitted to Task Manager')
 
         # Update the state of the tasks in the workload
@@ -239,18 +341,30 @@ class WFprocessor(object):
         list.
         """
 
+        mq_channel = None
+
         try:
 
             self._prof.prof('enq_start', uid=self._uid)
             self._logger.info('enqueue-thread started')
 
+            # Acquire a channel to the task manager, used for all workloads
+            mq_channel = self._transport.channel()
+
             while not self._enqueue_thread_terminate.is_set():
 
-                workload, scheduled_stages = self._create_workload()
+                # Sleep until some pipelines are ready for scheduling
+                pipes = self._get_ready()
+
+                if self._enqueue_thread_terminate.is_set():
+                    break
+
+                workload, scheduled_stages = self._create_workload(pipes)
 
                 # If there are tasks to be executed
                 if workload:
-                    self._execute_workload(workload, scheduled_stages)
+                    self._execute_workload(workload, scheduled_stages,
+                                           mq_channel)
 
             self._logger.info('Enqueue thread terminated')
             self._prof.prof('enq_stop', uid=self._uid)
@@ -267,101 +381,128 @@ class WFprocessor(object):
             self._logger.exception('Error in enqueue-thread')
             raise
 
+        finally:
+            if mq_channel:
+                mq_channel.close()
 
 
     # --------------------------------------------------------------------------
     #
-    def _update_dequeued_task(self, deq_task):
+    def _get_pipeline(self, uid):
+        '''
+        Return the pipeline of the workflow with the given uid (or None).  The
+        lookup uses the uid registry built in `initialize_workflow()`, which is
+        refreshed on a miss in case the workflow was changed since.
+        '''
+
+        pipe = self._pipelines.get(uid)
+
+        if pipe is None and len(self._pipelines) != len(self._workflow):
+            self._pipelines = dict([(p.uid, p) for p in self._workflow])
+            pipe = self._pipelines.get(uid)
 
-        # Traverse the entire workflow to find out the correct Task
-        # TODO: Investigate whether we can change the DS of the
-        # workflow so that we don't have this expensive search
-        # for each task.
-        # First search across all pipelines
-        # Note: deq_task is not the same as the task that exists in this process,
-        # they are different objects and have different state histories.
-        for pipe in self._workflow:
+        return pipe
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _update_dequeued_tasks(self, updates):
+
+        # Note: we receive state updates (see `pack_state()` of the codecs),
+        # not tasks.  We find the live tasks via the uid registry of the
+        # workflow (pipeline uid -> pipeline, stage uid -> stage, task uid ->
+        # task) instead of traversing all pipelines, stages and tasks.
+        #
+        # The updates are grouped by pipeline (keeping their order), so that
+        # the lock of each pipeline is acquired once per group.
+        groups = collections.OrderedDict()
+
+        for update in updates:
+            groups.setdefault(update['pipeline'], list()).append(update)
+
+        for pipe_uid, pipe_updates in groups.iteritems():
+
+            pipe = self._get_pipeline(pipe_uid)
+
+            if not pipe:
+                self._logger.error('Pipeline %s of tasks %s not found'
+                                   % (pipe_uid, [u['uid']
+                                                 for u in pipe_updates]))
+                continue
 
             with pipe.lock:
 
-                # Skip pipelines that have completed or are
-                # currently suspended
-                if pipe.completed or pipe.state == states.SUSPENDED:
-                    continue
+                for update in pipe_updates:
+                    self._update_dequeued_task(pipe, update)
 
-                # Skip pipelines that don't match the UID
-                # There will be only one pipeline that matches
-                if pipe.uid != deq_task.parent_pipeline['uid']:
-                    continue
 
-                self._logger.debug('Found parent pipeline: %s' %
-                                    pipe.uid)
+    # --------------------------------------------------------------------------
+    #
+    def _update_dequeued_task(self, pipe, update):
 
-                # Next search across all stages of a matching
-                # pipelines
-                for stage in pipe.stages:
+        # Note: call with `pipe.lock` held
 
-                    # Skip stages that don't match the UID
-                    # There will be only one stage that matches
-                    if stage.uid != deq_task.parent_stage['uid']:
-                        continue
+        # Skip pipelines that have completed or are currently suspended
+        if pipe.completed or pipe.state == states.SUSPENDED:
+            return
 
-                    self._logger.debug('Found parent stage: %s' %
-                                        stage.uid)
+        stage = pipe._get_stage(update['stage'])
+        task  = None
 
-                    # Search across all tasks of matching stage
-                    for task in stage.tasks:
+        if stage:
+            task = stage._get_task(update['uid'])
 
-                        # Skip tasks that don't match the UID
-                        # There will be only one task that matches
-                        if task.uid != deq_task.uid:
-                            continue
+        if not task:
+            self._logger.error('Task %s not found in stage %s of pipeline %s'
+                               % (update['uid'], update['stage'], pipe.uid))
+            return
 
-                        # If there is no exit code, we assume success
-                        # We are only concerned about state of task and not
-                        # deq_task
-                        if not deq_task.exit_code:
-                            task_state = states.DONE
-                        else:
-                            task_state = states.FAILED
+        self._logger.debug('Found task %s in stage %s of pipeline %s',
+                           task.uid, stage.uid, pipe.uid)
 
-                        if task.state == states.FAILED and \
-                            self._resubmit_failed:
-                            task_state = states.INITIAL
+        # If there is no exit code, we assume success
+        # We are only concerned about state of task and not
+        # the state in the update
+        if not update.get('exit_code'):
+            task_state = states.DONE
+        else:
+            task_state = states.FAILED
 
-                        self._advance(task, 'Task', task_state)
+        if task.state == states.FAILED and \
+            self._resubmit_failed:
+            task_state = states.INITIAL
 
-                        # Found the task and processed it -- no more
-                        # iterations needed
-                        break
+        self._advance(task, 'Task', task_state)
 
-                    # Found the stage and processed it -- no more
-                    # iterations needed for the current task
-                    break
+        if task_state == states.INITIAL:
+            self._set_ready([pipe])
 
-                # Check if current stage has completed
-                # If yes, we need to (i) check for post execs to
-                # be executed and (ii) check if it is the last
-                # stage of the pipeline -- update pipeline
-                # state if yes.
-                if stage._check_stage_complete():
+        # Check if current stage has completed
+        # If yes, we need to (i) check for post execs to
+        # be executed and (ii) check if it is the last
+        # stage of the pipeline -- update pipeline
+        # state if yes.
+        if stage._check_stage_complete():
 
-                    self._advance(stage, 'Stage', states.DONE)
+            self._advance(stage, 'Stage', states.DONE)
 
-                    # Check if the current stage has a post-exec
-                    # that needs to be executed
-                    if stage.post_exec:
-                        self._execute_post_exec(pipe, stage)
+            # Check if the current stage has a post-exec
+            # that needs to be executed
+            if stage.post_exec:
+                self._execute_post_exec(pipe, stage)
 
-                    # If pipeline has completed, make state
-                    # change
-                    if pipe.completed:
+            else:
+                pipe._increment_stage()
 
-                        self._advance(pipe, 'Pipeline', states.DONE)
+            # If pipeline has completed, make state
+            # change
+            if pipe.completed:
 
-                # Found the pipeline and processed it -- no more
-                # iterations needed for the current task
-                break
+                self._advance(pipe, 'Pipeline', states.DONE)
+
+            else:
+                # the next stage is ready for scheduling
+                self._set_ready([pipe])
 
 
     # --------------------------------------------------------------------------
@@ -403,6 +544,7 @@ class WFprocessor(object):
 
                         else:
                             self._advance(r_pipe, 'Pipeline', r_pipe.state)
+                            self._set_ready([r_pipe])
 
 
         if pipe.state == states.SUSPENDED:
@@ -417,11 +559,11 @@ class WFprocessor(object):
 
     # --------------------------------------------------------------------------
     #
-    def _dequeue(self):
+    def _dequeue(self, queue):
         """
-        **Purpose**: This is the function that is run in the dequeue thread.
-        This function extracts Tasks from the completed queues and updates the
-        workflow.
+        **Purpose**: This is the function that is run in the dequeue threads,
+        one per completed queue. This function extracts Tasks from the
+        completed queue `queue` and updates the workflow.
         """
 
         try:
@@ -429,35 +571,28 @@ class WFprocessor(object):
             self._prof.prof('deq_start', uid=self._uid)
             self._logger.info('Dequeue thread started')
 
-            # Acquire a connection+channel to the rmq server
-            mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-            mq_channel = mq_connection.channel()
+            # ------------------------------------------------------------------
+            def task_completed(body, corr_id):
 
-            last = time.time()
-            while not self._dequeue_thread_terminate.is_set():
+                # A msg carries a list of state updates of completed tasks,
+                # which are applied without creating Task objects
+                updates = self._codec.loads(body)
 
-                method_frame, header_frame, body = mq_channel.basic_get(
-                    queue=self._completed_queue[0])
-
-                # When there is no msg received, body is None
-                if not body:
-                    continue
+                self._logger.info('Got %d finished tasks from queue'
+                                  % len(updates))
+                self._update_dequeued_tasks(updates)
+            # ------------------------------------------------------------------
 
-                # Acknowledge the received message
-                mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+            # Acquire a channel to the task manager
+            mq_channel = self._transport.channel()
 
-                # Create a  task from the received msg
-                deq_task = Task()
-                deq_task.from_dict(json.loads(body))
-                self._logger.info('Got finished task %s from queue'
-                                  % (deq_task.uid))
-                self._update_dequeued_task(deq_task)
+            # Completed tasks are pushed to us by the transport.  Consumer
+            # callbacks are dispatched by `process()`, which blocks while no
+            # messages arrive and also keeps the channel alive.
+            mq_channel.consume(queue, task_completed)
 
-                # Appease pika cos it thinks the connection is dead
-                now = time.time()
-                if now - last >= self._rmq_ping_interval:
-                    mq_connection.process_data_events()
-                    last = now
+            while not self._dequeue_thread_terminate.is_set():
+                mq_channel.process(self._mq_timeout)
 
             self._logger.info('Terminated dequeue thread')
             self._prof.prof('deq_stop', uid=self._uid)
@@ -477,10 +612,10 @@ class WFprocessor(object):
 
         finally:
             try:
-                mq_connection.close()
+                mq_channel.close()
             except Exception as ex:
-                self._logger.warning('mq_connection close failed, %s' % ex)
-            self._logger.debug('closed mq_connection')
+                self._logger.warning('mq_channel close failed, %s' % ex)
+            self._logger.debug('closed mq_channel')
 
 
     # --------------------------------------------------------------------------
@@ -500,6 +635,17 @@ class WFprocessor(object):
             for p in self._workflow:
                 p._assign_uid(self._sid)
 
+            # Stages and tasks are indexed by their parents when the uids are
+            # assigned, pipelines are indexed here.
+            self._pipelines = dict([(p.uid, p) for p in self._workflow])
+
+            # The workflow may have been replaced since construction (the
+            # AppManager reuses the WFprocessor across `run()` calls), so the
+            # completed pipelines are recorded for the current workflow.
+            with self._completed_cond:
+                self._completed = set([p for p in self._workflow
+                                         if p.completed])
+
             self._prof.prof('wf_init_stop', uid=self._uid)
 
         except Exception:
@@ -524,12 +670,20 @@ class WFprocessor(object):
             self._enqueue_thread_terminate = threading.Event()
             self._dequeue_thread_terminate = threading.Event()
 
-            # Start dequeue thread
-            self._dequeue_thread = threading.Thread(target=self._dequeue,
-                                                    name='dequeue-thread')
-            self._logger.info('Starting dequeue-thread')
+            # Initially, all pipelines may have tasks to schedule
+            self._set_ready(self._workflow)
+
+            # Start one dequeue thread per completed queue
+            for queue in self._completed_queue:
+                self._dequeue_threads.append(
+                        threading.Thread(target=self._dequeue, args=(queue,),
+                                         name='dequeue-thread-%s' % queue))
+
+            self._logger.info('Starting dequeue-threads')
             self._prof.prof('starting dequeue-thread', uid=self._uid)
-            self._dequeue_thread.start()
+
+            for thread in self._dequeue_threads:
+                thread.start()
 
             # Start enqueue thread
             self._enqueue_thread = threading.Thread(target=self._enqueue,
@@ -563,16 +717,27 @@ class WFprocessor(object):
                 if not self._enqueue_thread_terminate.is_set():
                     self._logger.info('Terminating enqueue-thread')
                     self._enqueue_thread_terminate.set()
+
+                    # wake up the enqueue thread if it waits for work
+                    with self._ready_cond:
+                        self._ready_cond.notify()
+
                     self._enqueue_thread.join()
                     self._enqueue_thread = None
 
-            if self._dequeue_thread:
+            if self._dequeue_threads:
 
                 if not self._dequeue_thread_terminate.is_set():
-                    self._logger.info('Terminating dequeue-thread')
+                    self._logger.info('Terminating dequeue-threads')
                     self._dequeue_thread_terminate.set()
-                    self._dequeue_thread.join()
-                    self._dequeue_thread = None
+
+                    for thread in self._dequeue_threads:
+                        thread.join()
+
+                    self._dequeue_threads = list()
+
+            if self._progress:
+                self._progress.flush()
 
             self._logger.info('WFprocessor terminated')
             self._prof.prof('wfp_stop', uid=self._uid)
@@ -592,13 +757,8 @@ class WFprocessor(object):
         """
 
         try:
-            for pipe in self._workflow:
-                with pipe.lock:
-                    if pipe.completed:
-                        pass
-                    else:
-                        return True
-            return False
+            with self._completed_cond:
+                return len(self._completed) < len(self._workflow)
 
         except Exception, ex:
             self._logger.exception(
@@ -606,17 +766,37 @@ class WFprocessor(object):
             raise
 
 
+    # --------------------------------------------------------------------------
+    #
+    def wait_workflow(self, timeout=None):
+        """
+        **Purpose**: Block until all pipelines of the workflow have completed,
+        or (if given) `timeout` seconds passed without a pipeline completing.
+        Returns True if the workflow has completed.
+        """
+
+        with self._completed_cond:
+
+            if len(self._completed) < len(self._workflow):
+                self._completed_cond.wait(timeout)
+
+            return len(self._completed) == len(self._workflow)
+
+
     # --------------------------------------------------------------------------
     #
     def check_processor(self):
 
-        if self._enqueue_thread is None or self._dequeue_thread is None:
+        if self._enqueue_thread is None or not self._dequeue_threads:
             return False
 
-        if not self._enqueue_thread.is_alive() or \
-                not self._dequeue_thread.is_alive():
+        if not self._enqueue_thread.is_alive():
             return False
 
+        for thread in self._dequeue_threads:
+            if not thread.is_alive():
+                return False
+
         return True
 
 
@@ -1,2 +1,3 @@
 from resource_manager import Base_ResourceManager
-from task_manager import Base_TaskManager
\ No newline at end of file
+from task_manager import Base_TaskManager
+from admission import AdmissionControl
@@ -0,0 +1,143 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import threading as mt
+
+
+# ------------------------------------------------------------------------------
+#
+class AdmissionControl(object):
+    """
+    An admission controller keeps the resources requested by the tasks in
+    flight on the RTS proportional to the size of the pilot: tasks are admitted
+    while the cpus (gpus) they request, summed over all tasks in flight, stay
+    within `window` times the cpus (gpus) of the pilot.  Resources are released
+    when the tasks complete.  A task is always admitted if no other task is in
+    flight, so that tasks larger than the window still run.
+
+    :arguments:
+        :cpus:   (int) number of cpus of the pilot
+        :gpus:   (int) number of gpus of the pilot
+        :window: (float) tasks in flight, as multiple of the pilot size
+                 (`0` or None admit all tasks)
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, cpus, gpus, window):
+
+        self._enabled  = bool(window and cpus)
+        self._max_cpus = (cpus or 0) * (window or 0)
+        self._max_gpus = (gpus or 0) * (window or 0)
+
+        self._cpus     = 0
+        self._gpus     = 0
+        self._inflight = dict()        # task uid -> (cpus, gpus)
+        self._cond     = mt.Condition()
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def inflight(self):
+        """
+        :getter: Return the number of tasks in flight
+        """
+
+        return len(self._inflight)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @staticmethod
+    def get_size(task):
+        """
+        **Purpose**: Return the number of cpus and gpus requested by `task`.
+        """
+
+        # read without copying the requirements shared by many tasks
+        cpu_reqs = task._shared('_cpu_reqs')
+        gpu_reqs = task._shared('_gpu_reqs')
+
+        cpus = (cpu_reqs['processes']           or 1) \
+             * (cpu_reqs['threads_per_process'] or 1)
+        gpus = (gpu_reqs['processes']           or 0) \
+             * (gpu_reqs['threads_per_process'] or 1)
+
+        return cpus, gpus
+
+
+    # --------------------------------------------------------------------------
+    #
+    def admit(self, tasks, timeout=None):
+        """
+        **Purpose**: Admit the leading tasks of the list `tasks` which fit
+                     into the window, waiting up to `timeout` seconds for
+                     resources to be released if none fits.  Return the number
+                     of admitted tasks.
+        """
+
+        if not self._enabled:
+            return len(tasks)
+
+        with self._cond:
+
+            n = self._admit(tasks)
+
+            if not n and tasks:
+                self._cond.wait(timeout)
+                n = self._admit(tasks)
+
+            return n
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _admit(self, tasks):
+
+        # called with `_cond` held
+        n = 0
+
+        for task in tasks:
+
+            cpus, gpus = self.get_size(task)
+
+            if self._inflight:
+
+                if self._cpus + cpus > self._max_cpus: break
+                if self._gpus + gpus > self._max_gpus and gpus: break
+
+            self._inflight[task.uid] = (cpus, gpus)
+            self._cpus += cpus
+            self._gpus += gpus
+            n          += 1
+
+        return n
+
+
+    # --------------------------------------------------------------------------
+    #
+    def release(self, uids):
+        """
+        **Purpose**: Release the resources of the completed tasks with the
+                     given uids.  Unknown uids are ignored.
+        """
+
+        if not self._enabled:
+            return
+
+        with self._cond:
+
+            for uid in uids:
+
+                cpus, gpus = self._inflight.pop(uid, (0, 0))
+                self._cpus -= cpus
+                self._gpus -= gpus
+
+            self._cond.notify_all()
+
+
+# ------------------------------------------------------------------------------
+
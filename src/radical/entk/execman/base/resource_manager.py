@@ -8,6 +8,7 @@ import os
 import radical.utils as ru
 
 from ...exceptions import MissingError, TypeError, EnTKError
+from ...utils      import Profiler
 
 
 # ------------------------------------------------------------------------------
@@ -59,7 +60,7 @@ class Base_ResourceManager(object):
 
         name = 'radical.entk.%s' % self._uid
         self._logger = ru.Logger  (name, path=self._path)
-        self._prof   = ru.Profiler(name, path=self._path)
+        self._prof   = Profiler   (name, path=self._path)
 
         # Shared data list
         self._shared_data = list()
@@ -5,14 +5,17 @@ __license__   = "MIT"
 
 
 import os
-import json
-import pika
+import time
 import uuid
+import weakref
+import collections
 
 import threading     as mt
 import radical.utils as ru
 
 from ...exceptions import EnTKError, TypeError
+from ...utils      import get_queue, Profiler
+from ...transport  import Base_Transport, RMQ_Transport, JSON_Codec
 
 from resource_manager import Base_ResourceManager
 
@@ -28,24 +31,33 @@ class Base_TaskManager(object):
 
     :arguments:
         :pending_queue:     (list) List of queue(s) with tasks ready to be
-                            executed. Currently, only one queue.
+                            executed.
         :completed_queue:   (list) List of queue(s) with tasks that have
-                            finished execution. Currently, only one queue.
+                            finished execution.
         :rmgr:              (ResourceManager) Object to be used to access the
                             Pilot where the tasks can be submitted
         :rmq_conn_params:   (pika.connection.ConnectionParameters) object of
                             parameters necessary to connect to RabbitMQ
-
-    Currently, EnTK is configured to work with one pending queue and one
-    completed queue. In the future, the number of queues can be varied for
+        :transport:         (Base_Transport) transport to communicate over
+                            (optional, defaults to RabbitMQ via
+                            `rmq_conn_params`)
+        :codec:             wire format of the messages (optional, defaults
+                            to JSON)
+        :submit_window:     (float) limit of the resources requested by the
+                            tasks in flight on the RTS, as multiple of the
+                            pilot size (optional, `0`/None for no limit)
+
+    The number of queues can be varied (`pending_qs`, `completed_qs`) for
     different throughput requirements at the cost of additional Memory and CPU
-    consumption.
+    consumption.  Tasks are sharded over the queues by their pipeline, so that
+    the tasks of one pipeline always use the same queues.
     """
 
     # --------------------------------------------------------------------------
     #
     def __init__(self, sid, pending_queue, completed_queue, rmgr,
-                       rmq_conn_params, rts):
+                       rmq_conn_params, rts, transport=None, codec=None,
+                       submit_window=None):
 
         if not isinstance(sid, basestring):
             raise TypeError(expected_type=basestring,
@@ -63,10 +75,12 @@ class Base_TaskManager(object):
             raise TypeError(expected_type=Base_ResourceManager,
                             actual_type=type(rmgr))
 
-        if not isinstance(rmq_conn_params,
-                            pika.connection.ConnectionParameters):
-            raise TypeError(expected_type=pika.connection.ConnectionParameters,
-                            actual_type=type(rmq_conn_params))
+        if not transport:
+            transport = RMQ_Transport(rmq_conn_params)
+
+        if not isinstance(transport, Base_Transport):
+            raise TypeError(expected_type=Base_Transport,
+                            actual_type=type(transport))
 
         self._sid             = sid
         self._pending_queue   = pending_queue
@@ -74,6 +88,9 @@ class Base_TaskManager(object):
         self._rmgr            = rmgr
         self._rts             = rts
         self._rmq_conn_params = rmq_conn_params
+        self._transport       = transport
+        self._codec           = codec or JSON_Codec()
+        self._submit_window   = submit_window
 
         # Utility parameters
         self._uid  = ru.generate_id('task_manager.%(item_counter)04d',
@@ -82,29 +99,35 @@ class Base_TaskManager(object):
 
         name = 'radical.entk.%s' % self._uid
         self._log  = ru.Logger  (name, path=self._path)
-        self._prof = ru.Profiler(name, path=self._path)
-
-        # Thread should run till terminate condtion is encountered
-        mq_connection = pika.BlockingConnection(rmq_conn_params)
+        self._prof = Profiler   (name, path=self._path)
 
         self._hb_request_q  = '%s-hb-request'  % self._sid
         self._hb_response_q = '%s-hb-response' % self._sid
 
-        mq_channel = mq_connection.channel()
-
         # To respond to heartbeat - get request from rpc_queue
-        mq_channel.queue_delete(queue=self._hb_response_q)
-        mq_channel.queue_declare(queue=self._hb_response_q)
-
-        # To respond to heartbeat - get request from rpc_queue
-        mq_channel.queue_delete(queue=self._hb_request_q)
-        mq_channel.queue_declare(queue=self._hb_request_q)
+        self._transport.delete ([self._hb_response_q, self._hb_request_q])
+        self._transport.declare([self._hb_response_q, self._hb_request_q])
 
         self._tmgr_process = None
         self._hb_thread    = None
         self._hb_interval  = int(os.getenv('ENTK_HB_INTERVAL', 30))
 
-        mq_connection.close()
+        # Time we block waiting for messages before checking for termination
+        self._mq_timeout     = 0.1
+        self._sync_consumers = weakref.WeakKeyDictionary()
+        self._sync_published = weakref.WeakKeyDictionary()
+
+        # Sync messages carry up to `_sync_size` objects, and up to
+        # `_sync_window` of them are in flight before waiting for acks.
+        self._sync_size   = int(os.getenv('ENTK_SYNC_SIZE',   1024))
+        self._sync_window = int(os.getenv('ENTK_SYNC_WINDOW', 8))
+
+        # Completed tasks are pushed to the completed queue in messages of up
+        # to `_completion_bulk` tasks, collected for up to `_completion_window`
+        # seconds.
+        self._completion_bulk   = int(os.getenv('ENTK_COMPLETION_BULK', 1024))
+        self._completion_window = float(os.getenv('ENTK_COMPLETION_WINDOW',
+                                                  0.1))
 
 
     # --------------------------------------------------------------------------
@@ -136,19 +159,123 @@ class Base_TaskManager(object):
     #
     def _sync_with_master(self, obj, obj_type, channel, queue):
 
+        self._sync_bulk([obj], obj_type, channel, queue)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sync_bulk(self, objs, obj_type, channel, queue):
+        """
+        **Purpose**: Sync the state of a list of objects with the AppManager.
+                     The objects are sent in messages of up to `_sync_size`
+                     objects each, and up to `_sync_window` messages are in
+                     flight before we wait for acknowledgements.  This method
+                     returns once all objects are synced.
+        """
+
+        for idx in range(0, len(objs), self._sync_size):
+
+            self._publish_sync(objs[idx:idx + self._sync_size], obj_type,
+                               channel, queue)
+
+            if len(self._sync_pending(channel, queue)) > self._sync_window:
+                self._wait_sync(channel, queue,
+                                limit=self._sync_window)
+
+        self._wait_sync(channel, queue)
+
+        for obj in objs:
+            self._prof.prof('sync', state=obj.state, uid=obj.uid,
+                            msg=self._sync_msg(obj, obj_type))
+
+        self._log.debug('%d %ss synced with amgr', len(objs), obj_type)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _sync_msg(self, obj, obj_type):
+
+        if   obj_type == 'Task' : return obj.parent_stage['uid']
+        elif obj_type == 'Stage': return obj.parent_pipeline['uid']
+        else                    : return ''
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _publish_sync(self, objs, obj_type, channel, queue):
+        """
+        **Purpose**: Publish one sync message for a list of objects, without
+                     waiting for the acknowledgement.  Tasks are synced as
+                     state updates (message type `TaskState`), not as full
+                     task descriptions.
+        """
+
+        if obj_type == 'Task':
+            msg_type = 'TaskState'
+            objects  = [self._codec.pack_state(obj) for obj in objs]
+
+        else:
+            msg_type = obj_type
+            objects  = [obj.to_dict() for obj in objs]
+
         corr_id = str(uuid.uuid4())
-        body    = json.dumps({'object': obj.to_dict(),
-                              'type'  : obj_type})
+        body    = self._codec.dumps({'objects': objects, 'type': msg_type})
+
+        for obj in objs:
+            self._prof.prof('pub_sync', state=obj.state, uid=obj.uid,
+                            msg=self._sync_msg(obj, obj_type))
+
+        self._log.debug('%d %ss to sync with amgr', len(objs), obj_type)
+
+        # register the message before publishing, so that no ack can arrive
+        # before we know about it
+        self._sync_pending(channel, queue).append(corr_id)
+
+        channel.publish(queue, body, corr_id)
+
+        return corr_id
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _wait_sync(self, channel, queue, limit=0):
+        """
+        **Purpose**: Wait until no more than `limit` sync messages published
+                     on `queue` are unacknowledged.
+
+        **Details**: The synchronizer handles the messages of a queue in
+                     order, so an ack is cumulative: it also confirms all
+                     messages published before the acknowledged one.
+        """
+
+        reply_queue = self._reply_queue(queue)
+        pending     = self._sync_pending(channel, queue)
+        acked       = self._sync_consumer(channel, reply_queue)
+
+        while len(pending) > limit:
+
+            # replies are collected in `acked` by the consumer callback while
+            # we block in `process()` - no polling of the reply queue
+            if not acked:
+                channel.process(self._mq_timeout)
+                continue
 
-        if   obj_type == 'Task' : msg = obj.parent_stage['uid']
-        elif obj_type == 'Stage': msg = obj.parent_pipeline['uid']
-        else                    : msg = ''
+            last = None
+            for idx, corr_id in enumerate(pending):
+                if corr_id in acked:
+                    last = idx
 
-        self._prof.prof('pub_sync', state=obj.state, uid=obj.uid, msg=msg)
-        self._log.debug('%s (%s) to sync with amgr', obj.uid, obj.state)
+            if last is not None:
+                for _ in range(last + 1):
+                    pending.popleft()
 
-        channel.basic_publish(exchange='', routing_key=queue, body=body,
-                        properties=pika.BasicProperties(correlation_id=corr_id))
+            # anything left over is not pending (anymore)
+            acked.clear()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _reply_queue(self, queue):
 
         # all queue name parts up to the last three are used as sid, the last
         # three parts are channel specifiers which need to be inversed to obtain
@@ -156,54 +283,125 @@ class Base_TaskManager(object):
         sid         = '-'.join(queue.split('-')[:-3])
         qname       = queue.split('-')[-3:]
         reply_queue = '-'.join(list(reversed(qname)))
-        reply_queue = sid + '-' + reply_queue
 
-        while True:
+        return sid + '-' + reply_queue
 
-            # FIXME: is this a busy loop?
 
-            method_frame, props, body = channel.basic_get(queue=reply_queue)
+    # --------------------------------------------------------------------------
+    #
+    def _sync_pending(self, channel, queue):
+        """
+        **Purpose**: Return the correlation ids of the sync messages published
+                     on `queue` via `channel` which are not yet acknowledged,
+                     in publishing order.
+        """
 
-            if not body:
-                continue
+        pending = self._sync_published.setdefault(channel, dict())
 
-            if corr_id != props.correlation_id:
-                continue
+        if queue not in pending:
+            pending[queue] = collections.deque()
 
-            channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+        return pending[queue]
 
-            self._prof.prof('sync', state=obj.state, uid=obj.uid, msg=msg)
-            self._log.debug('%s (%s) synced with amgr', obj.uid, obj.state)
 
-            break
+    # --------------------------------------------------------------------------
+    #
+    def _sync_consumer(self, channel, reply_queue):
+        """
+        **Purpose**: Register (once per channel and reply queue) a consumer
+                     which collects the correlation ids of the acknowledgements
+                     sent by the synchronizer.
+        """
+
+        consumers = self._sync_consumers.setdefault(channel, dict())
+
+        if reply_queue not in consumers:
+
+            acked = set()
+
+            # ------------------------------------------------------------------
+            def sync_ack(body, corr_id):
+
+                acked.add(corr_id)
+            # ------------------------------------------------------------------
+
+            channel.consume(reply_queue, sync_ack)
+            consumers[reply_queue] = acked
+
+        return consumers[reply_queue]
+
 
     # --------------------------------------------------------------------------
     #
     def _advance(self, obj, obj_type, new_state, channel, queue):
 
-        try:
-            old_state = obj.state
-            obj.state = new_state
+        self._advance_bulk([obj], obj_type, new_state, channel, queue)
 
-            if   obj_type == 'Task' : msg = obj.parent_stage['uid']
-            elif obj_type == 'Stage': msg = obj.parent_pipeline['uid']
-            else                    : msg = None
 
-            self._prof.prof('advance', uid=obj.uid, state=obj.state, msg=msg)
-            self._log.info('Transition %s to %s', obj.uid, new_state)
+    # --------------------------------------------------------------------------
+    #
+    def _advance_bulk(self, objs, obj_type, new_state, channel, queue):
+        """
+        **Purpose**: Transition a list of objects to `new_state` and sync them
+                     with the AppManager in bulk.  On failure, the objects are
+                     reverted to their old states.
+        """
+
+        old_states = [obj.state for obj in objs]
+
+        try:
+            for obj in objs:
+
+                obj.state = new_state
+                self._prof.prof('advance', uid=obj.uid, state=obj.state,
+                                msg=self._sync_msg(obj, obj_type) or None)
+                self._log.info('Transition %s to %s', obj.uid, new_state)
 
-            self._sync_with_master(obj, obj_type, channel, queue)
+            self._sync_bulk(objs, obj_type, channel, queue)
 
 
         except Exception, ex:
 
-            self._log.exception('Transition %s to state %s failed, error: %s',
-                                obj.uid, new_state, ex)
-            obj.state = old_state
-            self._sync_with_master(obj, obj_type, channel, queue)
+            self._log.exception('Transition of %d %ss to state %s failed, '
+                                'error: %s', len(objs), obj_type, new_state, ex)
+
+            for obj, old_state in zip(objs, old_states):
+                obj.state = old_state
+
+            self._sync_bulk(objs, obj_type, channel, queue)
             raise
 
 
+    # --------------------------------------------------------------------------
+    #
+    def _publish_completed(self, tasks, channel):
+        '''
+        **Purpose**: Push the state updates of completed tasks to the
+                     completed queues, as lists of up to `_completion_bulk`
+                     updates per message.  The tasks are sharded over the
+                     completed queues by pipeline.
+        '''
+
+        shards = collections.OrderedDict()
+        for task in tasks:
+            queue = get_queue(task.parent_pipeline['uid'],
+                              self._completed_queue)
+            shards.setdefault(queue, list()).append(task)
+
+        for queue, shard in shards.iteritems():
+
+            for idx in range(0, len(shard), self._completion_bulk):
+
+                bulk = shard[idx:idx + self._completion_bulk]
+                body = self._codec.dumps([self._codec.pack_state(task)
+                                          for task in bulk])
+
+                channel.publish(queue, body)
+
+                self._log.info('Pushed %d tasks to completed queue %s',
+                               len(bulk), queue)
+
+
     # --------------------------------------------------------------------------
     #
     def _heartbeat(self):
@@ -225,42 +423,43 @@ class Base_TaskManager(object):
 
             self._prof.prof('hbeat_start', uid=self._uid)
 
-            mq_connection = pika.BlockingConnection(self._rmq_conn_params)
-            mq_channel = mq_connection.channel()
+            mq_channel = self._transport.channel()
+            responses  = list()
+
+            # ------------------------------------------------------------------
+            def heartbeat_response(body, corr_id):
+
+                responses.append(corr_id)
+            # ------------------------------------------------------------------
+
+            # we consume responses before sending the first request, so that
+            # transports without a broker can deliver them right away
+            mq_channel.consume(self._hb_response_q, heartbeat_response)
 
             while not self._hb_terminate.is_set():
 
                 corr_id  = str(uuid.uuid4())
 
                 # Heartbeat request signal sent to task manager via rpc-queue
-                props = pika.BasicProperties(reply_to=self._hb_response_q,
-                                             correlation_id=corr_id)
-                mq_channel.basic_publish(exchange='',
-                                         routing_key=self._hb_request_q,
-                                         properties=props,
-                                         body='request')
+                mq_channel.publish(self._hb_request_q, 'request', corr_id)
                 self._log.info('Sent heartbeat request')
 
-                # Sleep for hb_interval and then check if tmgr responded
-                mq_connection.sleep(self._hb_interval)
+                # Wait for hb_interval and then check if tmgr responded
+                deadline = time.time() + self._hb_interval
+                while time.time() < deadline:
+                    mq_channel.process(max(0, deadline - time.time()))
 
-                method_frame, props, body = mq_channel.basic_get(
-                                                      queue=self._hb_response_q)
-                if not body:
+                if not responses:
                     # no usable response
                     return
                     raise EnTKError('heartbeat timeout')
 
-                if corr_id != props.correlation_id:
+                if corr_id != responses.pop(0):
                     # incorrect response
                     return
                     raise EnTKError('heartbeat timeout')
 
                 self._log.info('Received heartbeat response')
-                mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
-
-                # Appease pika cos it thinks the connection is dead
-                # mq_connection.close()
 
         except KeyboardInterrupt:
             self._log.exception('Execution interrupted by user (probably '
@@ -288,9 +487,9 @@ class Base_TaskManager(object):
 
         finally:
             try:
-                mq_connection.close()
+                mq_channel.close()
             except:
-                self._log.warning('mq_connection not closed')
+                self._log.warning('mq_channel not closed')
 
             self._prof.prof('hbeat_stop', uid=self._uid)
 
@@ -363,14 +562,9 @@ class Base_TaskManager(object):
 
             if not self.check_heartbeat() or self.check_manager():
 
-                conn = pika.BlockingConnection(self._rmq_conn_params)
-                mq_channel = conn.channel()
-
                 # To respond to heartbeat - get request from rpc_queue
-                mq_channel.queue_delete(queue=self._hb_response_q)
-                mq_channel.queue_delete(queue=self._hb_request_q)
-
-                conn.close()
+                self._transport.delete([self._hb_response_q,
+                                        self._hb_request_q])
 
 
     # --------------------------------------------------------------------------
@@ -4,16 +4,13 @@ __author__    = "Vivek Balasubramanian <vivek.balasubramanian@rutgers.edu>"
 __license__   = "MIT"
 
 
-import os
-import json
-import pika
 import Queue
 
 import threading       as mt
 import multiprocessing as mp
 
 from ...exceptions       import EnTKError
-from ...                 import states, Task
+from ...                 import states
 from ..base.task_manager import Base_TaskManager
 
 
@@ -28,31 +25,38 @@ class TaskManager(Base_TaskManager):
 
     :arguments:
         :pending_queue:     (list) List of queue(s) with tasks ready to be
-                            executed. Currently, only one queue.
+                            executed.
         :completed_queue:   (list) List of queue(s) with tasks that have
-                            finished execution. Currently, only one queue.
+                            finished execution.
         :rmgr:              (ResourceManager) Object to be used to access the
                             Pilot where the tasks can be submitted
         :rmq_conn_params:   (pika.connection.ConnectionParameters) object of
                             parameters necessary to connect to RabbitMQ
+        :transport:         (Base_Transport) transport to communicate over
+                            (optional, defaults to RabbitMQ via
+                            `rmq_conn_params`)
+        :codec:             wire format of the messages (optional, defaults
+                            to JSON)
 
-    Currently, EnTK is configured to work with one pending queue and one
-    completed queue. In the future, the number of queues can be varied for
+    The number of queues can be varied (`pending_qs`, `completed_qs`) for
     different throughput requirements at the cost of additional Memory and CPU
-    consumption.
+    consumption.  Tasks are sharded over the queues by their pipeline, so that
+    the tasks of one pipeline always use the same queues.
     """
 
     # --------------------------------------------------------------------------
     #
     def __init__(self, sid, pending_queue, completed_queue, rmgr,
-                       rmq_conn_params):
+                       rmq_conn_params, transport=None, codec=None,
+                       submit_window=None):
 
         super(TaskManager, self).__init__(sid, pending_queue, completed_queue,
-                                          rmgr, rmq_conn_params, rts='mock')
+                                          rmgr, rmq_conn_params, rts='mock',
+                                          transport=transport,
+                                          codec=codec,
+                                          submit_window=submit_window)
         self._rts_runner = None
 
-        self._rmq_ping_interval = os.getenv('RMQ_PING_INTERVAL', 10)
-
         self._log.info('Created task manager object: %s', self._uid)
         self._prof.prof('tmgr_create', uid=self._uid)
 
@@ -85,81 +89,65 @@ class TaskManager(Base_TaskManager):
         try:
 
             # ------------------------------------------------------------------
-            def heartbeat_response(mq_channel):
+            def heartbeat_response(body, corr_id):
 
                 try:
 
-                    # Get request from heartbeat-req for heartbeat response
-                    method_frame, props, body = \
-                                  mq_channel.basic_get(queue=self._hb_request_q)
-
-                    if not body:
-                        return
-
+                    # Got request from heartbeat-req for heartbeat response
                     self._log.info('Received heartbeat request')
 
-                    nprops = pika.BasicProperties(
-                                            correlation_id=props.correlation_id)
-                    mq_channel.basic_publish(
-                                exchange='',
-                                routing_key=self._hb_response_q,
-                                properties=nprops,
-                                body='response')
+                    mq_channel.publish(self._hb_response_q, 'response',
+                                       corr_id)
 
                     self._log.info('Sent heartbeat response')
 
-                    mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
-
 
                 except Exception as e:
                     self._log.exception('Failed to respond to heartbeat, '
                                         'error: %s', e)
                     raise
+
+            # ------------------------------------------------------------------
+            def tasks_pending(body, corr_id):
+
+                try:
+
+                    # Got tasks from the pending queue
+                    body = self._codec.loads(body)
+                    task_queue.put(body)
+
+                except Exception as e:
+                    self._log.exception('Error in task execution: %s', e)
+                    raise
             # ------------------------------------------------------------------
 
             self._prof.prof('tmgr process started', uid=self._uid)
             self._log.info('Task Manager process started')
 
-            # Acquire a connection+channel to the rmq server
-            mq_connection = pika.BlockingConnection(rmq_conn_params)
-            mq_channel = mq_connection.channel()
+            # Acquire a channel to communicate with the other components
+            mq_channel = self._transport.channel()
 
             # Make sure the heartbeat response queue is empty
-            mq_channel.queue_delete(queue=self._hb_response_q)
-            mq_channel.queue_declare(queue=self._hb_response_q)
+            self._transport.purge([self._hb_response_q])
 
             # Queue for communication between threads of this process
             task_queue = Queue.Queue()
 
             # Start second thread to receive tasks and push to RTS
             self._rts_runner = mt.Thread(target=self._process_tasks,
-                                         args=(task_queue, rmgr,
-                                               rmq_conn_params))
+                                         args=(task_queue, rmgr))
             self._rts_runner.start()
 
+            # Tasks and heartbeat requests are dispatched to the callbacks by
+            # `process()`, which blocks while no messages arrive.
+            for queue in pending_queue:
+                mq_channel.consume(queue, tasks_pending)
+            mq_channel.consume(self._hb_request_q, heartbeat_response)
+
             self._prof.prof('tmgr infrastructure setup done', uid=uid)
 
             while not self._tmgr_terminate.is_set():
-
-                try:
-
-                    # Get tasks from the pending queue
-                    method_frame, header_frame, body = \
-                                    mq_channel.basic_get(queue=pending_queue[0])
-
-                    if body:
-
-                        body = json.loads(body)
-                        task_queue.put(body)
-
-                        mq_channel.basic_ack(
-                                delivery_tag=method_frame.delivery_tag)
-
-                    heartbeat_response(mq_channel)
-
-                except Exception as e:
-                    self._log.exception('Error in task execution: %s', e)
-                    raise
+                mq_channel.process(self._mq_timeout)
 
 
         except KeyboardInterrupt:
@@ -181,13 +169,13 @@ class TaskManager(Base_TaskManager):
             if self._rts_runner:
                 self._rts_runner.join()
 
-            mq_connection.close()
+            mq_channel.close()
             self._prof.close()
 
 
     # --------------------------------------------------------------------------
     #
-    def _process_tasks(self, task_queue, rmgr, rmq_conn_params):
+    def _process_tasks(self, task_queue, rmgr):
         '''
         **Purpose**: The new thread that gets spawned by the main tmgr process
                      invokes this function. This function receives tasks from
@@ -213,8 +201,7 @@ class TaskManager(Base_TaskManager):
                     task.name)] = str(task.path)
         # ----------------------------------------------------------------------
 
-        mq_connection = pika.BlockingConnection(rmq_conn_params)
-        mq_channel = mq_connection.channel()
+        mq_channel = self._transport.channel()
 
         try:
 
@@ -234,32 +221,18 @@ class TaskManager(Base_TaskManager):
 
                 task_queue.task_done()
 
-                bulk_tasks = list()
-
-                for msg in body:
-
-                    task = Task()
-                    task.from_dict(msg)
-                    bulk_tasks.append(task)
-
-                    self._advance(task, 'Task', states.SUBMITTING,
-                                  mq_channel, '%s-tmgr-to-sync' % self._sid)
+                bulk_tasks = self._codec.unpack_workload(body)
 
-                # this mock RTS immmedialtely completes all tasks
-                for task in bulk_tasks:
+                self._advance_bulk(bulk_tasks, 'Task', states.SUBMITTING,
+                                   mq_channel, '%s-tmgr-to-sync' % self._sid)
 
-                    self._advance(task, 'Task', states.COMPLETED,
-                                  mq_channel, '%s-cb-to-sync' % self._sid)
+                # this mock RTS immmedialtely completes all tasks.  The
+                # completion must be synced before the tasks are pushed to the
+                # completed queue.
+                self._advance_bulk(bulk_tasks, 'Task', states.COMPLETED,
+                                   mq_channel, '%s-cb-to-sync' % self._sid)
 
-                    task_as_dict = json.dumps(task.to_dict())
-                    mq_channel.basic_publish(
-                            exchange='',
-                            routing_key='%s-completedq-1' % self._sid,
-                            body=task_as_dict)
-
-                    self._log.info('Pushed task %s with state %s to '
-                                   'completed queue %s-completedq-1',
-                                   task.uid, task.state, self._sid)
+                self._publish_completed(bulk_tasks, mq_channel)
 
         except KeyboardInterrupt:
             self._log.exception('Execution interrupted (probably by Ctrl+C), '
@@ -269,6 +242,9 @@ class TaskManager(Base_TaskManager):
             self._log.exception('%s failed with %s', self._uid, e)
             raise EnTKError(e)
 
+        finally:
+            mq_channel.close()
+
 
     # --------------------------------------------------------------------------
     #
@@ -5,19 +5,23 @@ __license__   = "MIT"
 
 
 import os
-import json
-import pika
+import time
 import Queue
+import collections
 
 import threading       as mt
 import multiprocessing as mp
 
+from multiprocessing.pool import ThreadPool
+
 import radical.pilot   as rp
 
 from ...exceptions       import EnTKError
-from ...                 import states, Task
+from ...                 import states
 from ..base.task_manager import Base_TaskManager
-from .task_processor     import create_cud_from_task, create_task_from_cu
+from ..base.admission    import AdmissionControl
+from .task_processor     import create_cuds_from_tasks, create_task_from_cu
+from .task_processor     import Placeholders
 
 
 # ------------------------------------------------------------------------------
@@ -33,32 +37,51 @@ class TaskManager(Base_TaskManager):
 
     :arguments:
         :pending_queue:     (list) List of queue(s) with tasks ready to be
-                            executed. Currently, only one queue.
+                            executed.
         :completed_queue:   (list) List of queue(s) with tasks that have
-                            finished execution. Currently, only one queue.
+                            finished execution.
         :rmgr:              (ResourceManager) Object to be used to access the
                             Pilot where the tasks can be submitted
         :rmq_conn_params:   (pika.connection.ConnectionParameters) object of
                             parameters necessary to connect to RabbitMQ
+        :transport:         (Base_Transport) transport to communicate over
+                            (optional, defaults to RabbitMQ via
+                            `rmq_conn_params`)
+        :codec:             wire format of the messages (optional, defaults
+                            to JSON)
 
-    Currently, EnTK is configured to work with one pending queue and one
-    completed queue. In the future, the number of queues can be varied for
+    The number of queues can be varied (`pending_qs`, `completed_qs`) for
     different throughput requirements at the cost of additional Memory and CPU
-    consumption.
+    consumption.  Tasks are sharded over the queues by their pipeline, so that
+    the tasks of one pipeline always use the same queues.
     """
 
     # --------------------------------------------------------------------------
     #
     def __init__(self, sid, pending_queue, completed_queue, rmgr,
-                       rmq_conn_params):
+                       rmq_conn_params, transport=None, codec=None,
+                       submit_window=None):
 
         super(TaskManager, self).__init__(sid, pending_queue, completed_queue,
                                           rmgr, rmq_conn_params,
-                                          rts='radical.pilot')
+                                          rts='radical.pilot',
+                                          transport=transport,
+                                          codec=codec,
+                                          submit_window=submit_window)
         self._umgr       = None
         self._rts_runner = None
+        self._publisher  = None
+        self._admission  = None
+
+        # Long lived connections are serviced (to handle heartbeats of the
+        # rmq server) at least every `_rmq_ping_interval` seconds while idle
+        self._rmq_ping_interval = float(os.getenv('RMQ_PING_INTERVAL', 10))
 
-        self._rmq_ping_interval = os.getenv('RMQ_PING_INTERVAL', 10)
+        # Workloads are converted into CUDs by `_cud_workers` threads in
+        # chunks of `_submit_chunk` tasks, and each chunk is submitted as soon
+        # as it is converted and admitted, see `_process_tasks()`.
+        self._submit_chunk = int(os.getenv('ENTK_SUBMIT_CHUNK', 1024))
+        self._cud_workers  = int(os.getenv('ENTK_CUD_WORKERS',  1))
 
         self._log.info('Created task manager object: %s', self._uid)
         self._prof.prof('tmgr_create', uid=self._uid)
@@ -105,81 +128,71 @@ class TaskManager(Base_TaskManager):
         try:
 
             # ------------------------------------------------------------------
-            def heartbeat_response(mq_channel):
+            def heartbeat_response(body, corr_id):
 
                 try:
 
-                    # Get request from heartbeat-req for heartbeat response
-                    method_frame, props, body = \
-                                  mq_channel.basic_get(queue=self._hb_request_q)
-
-                    if not body:
-                        return
-
+                    # Got request from heartbeat-req for heartbeat response
                     self._log.info('Received heartbeat request')
 
-                    nprops = pika.BasicProperties(
-                                            correlation_id=props.correlation_id)
-                    mq_channel.basic_publish(
-                                exchange='',
-                                routing_key=self._hb_response_q,
-                                properties=nprops,
-                                body='response')
+                    mq_channel.publish(self._hb_response_q, 'response',
+                                       corr_id)
 
                     self._log.info('Sent heartbeat response')
 
-                    mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
-
 
                 except Exception as e:
                     self._log.exception('Failed to respond to heartbeat, '
                                         'error: %s', e)
                     raise
+
+            # ------------------------------------------------------------------
+            def tasks_pending(body, corr_id):
+
+                try:
+
+                    # Got tasks from the pending queue
+                    body = self._codec.loads(body)
+                    task_queue.put(body)
+
+                except Exception as e:
+                    self._log.exception('Error in task execution: %s', e)
+                    raise
             # ------------------------------------------------------------------
 
             self._prof.prof('tmgr process started', uid=self._uid)
             self._log.info('Task Manager process started')
 
-            # Acquire a connection+channel to the rmq server
-            mq_connection = pika.BlockingConnection(rmq_conn_params)
-            mq_channel = mq_connection.channel()
+            # Acquire a channel to communicate with the other components
+            mq_channel = self._transport.channel()
 
             # Make sure the heartbeat response queue is empty
-            mq_channel.queue_delete(queue=self._hb_response_q)
-            mq_channel.queue_declare(queue=self._hb_response_q)
+            self._transport.purge([self._hb_response_q])
 
             # Queue for communication between threads of this process
             task_queue = Queue.Queue()
 
             # Start second thread to receive tasks and push to RTS
             self._rts_runner = mt.Thread(target=self._process_tasks,
-                                         args=(task_queue, rmgr,
-                                               rmq_conn_params))
+                                         args=(task_queue, rmgr))
             self._rts_runner.start()
 
+            # Tasks and heartbeat requests are dispatched to the callbacks by
+            # `process()`, which blocks while no messages arrive.
+            for queue in pending_queue:
+                mq_channel.consume(queue, tasks_pending)
+            mq_channel.consume(self._hb_request_q, heartbeat_response)
+
             self._prof.prof('tmgr infrastructure setup done', uid=uid)
 
             while not self._tmgr_terminate.is_set():
 
-                try:
-
-                    # Get tasks from the pending queue
-                    method_frame, header_frame, body = \
-                                    mq_channel.basic_get(queue=pending_queue[0])
-
-                    if body:
+                mq_channel.process(self._mq_timeout)
 
-                        body = json.loads(body)
-                        task_queue.put(body)
-
-                        mq_channel.basic_ack(
-                                delivery_tag=method_frame.delivery_tag)
-
-                    heartbeat_response(mq_channel)
-
-                except Exception as e:
-                    self._log.exception('Error in task execution: %s', e)
-                    raise
+                # Stop responding to heartbeats if the task processing died,
+                # so that the AppManager restarts the tmgr process
+                if not self._rts_runner.is_alive():
+                    raise EnTKError('task processor died')
 
 
         except KeyboardInterrupt:
@@ -201,123 +214,127 @@ class TaskManager(Base_TaskManager):
             if self._rts_runner:
                 self._rts_runner.join()
 
-            mq_connection.close()
+            mq_channel.close()
             self._prof.close()
 
 
     # --------------------------------------------------------------------------
     #
-    def _process_tasks(self, task_queue, rmgr, rmq_conn_params):
+    def _process_tasks(self, task_queue, rmgr):
         '''
         **Purpose**: The new thread that gets spawned by the main tmgr process
                      invokes this function. This function receives tasks from
                      'task_queue' and submits them to the RADICAL Pilot RTS.
-        '''
-
-        placeholders = dict()
-
-        # ----------------------------------------------------------------------
-        def load_placeholder(task, rts_uid):
 
-            parent_pipeline = str(task.parent_pipeline['name'])
-            parent_stage    = str(task.parent_stage['name'])
+        **Details**: Workloads are submitted in chunks of `_submit_chunk`
+                     tasks.  The chunks are converted into CUDs by a pool of
+                     `_cud_workers` threads, in order, while earlier chunks
+                     are synced and submitted, so that the first units of a
+                     large workload do not wait for the last ones to be
+                     converted.
+
+                     Tasks are only submitted as admitted by the admission
+                     control (see `AdmissionControl`), which keeps the tasks
+                     in flight within `_submit_window` times the pilot size.
+                     Completed tasks make room for more.
+        '''
 
-            if parent_pipeline not in placeholders:
-                placeholders[parent_pipeline] = dict()
+        placeholders = Placeholders()
 
-            if parent_stage not in placeholders[parent_pipeline]:
-                placeholders[parent_pipeline][parent_stage] = dict()
-
-            if None not in [parent_pipeline, parent_stage, task.name]:
-                placeholders[parent_pipeline][parent_stage][task.name] = \
-                                                          {'path'   : task.path,
-                                                           'rts_uid': rts_uid}
+        # Final units are handed from the RP callbacks to the publisher
+        # thread, which converts, syncs and pushes them in bulks, so that the
+        # callbacks do not wait for EnTK
+        completed = Queue.Queue()
 
         # ----------------------------------------------------------------------
         def unit_state_cb(unit, state):
 
             try:
 
-                self._log.debug('Unit %s in state %s' % (unit.uid, unit.state))
-
-                if unit.state in rp.FINAL:
+                self._log.debug('Unit %s in state %s', unit.uid, state)
 
-                    # Acquire a connection+channel to the rmq server
-                    mq_connection = pika.BlockingConnection(rmq_conn_params)
-                    mq_channel = mq_connection.channel()
+                if state in rp.FINAL:
+                    completed.put(unit)
 
-                    task = None
-                    task = create_task_from_cu(unit, self._prof)
+            except KeyboardInterrupt:
+                self._log.exception('Execution interrupted (probably by Ctrl+C)'
+                                    ' exit callback thread gracefully...')
+                raise KeyboardInterrupt
 
-                    self._advance(task, 'Task', states.COMPLETED,
-                                  mq_channel, '%s-cb-to-sync' % self._sid)
+            except Exception as e:
+                self._log.exception('Error in RP callback thread: %s', e)
+        # ----------------------------------------------------------------------
 
-                    load_placeholder(task, unit.uid)
 
-                    task_as_dict = json.dumps(task.to_dict())
+        self._admission = AdmissionControl(rmgr.cpus, rmgr.gpus,
+                                           self._submit_window)
 
-                    mq_channel.basic_publish(
-                            exchange='',
-                            routing_key='%s-completedq-1' % self._sid,
-                            body=task_as_dict)
+        umgr = self._create_umgr(rmgr, unit_state_cb)
 
-                    self._log.info('Pushed task %s with state %s to completed '
-                                   'queue %s-completedq-1',
-                                   task.uid, task.state, self._sid)
+        # set when this thread exits, so that the publisher also exits if the
+        # task processing fails
+        stopped = mt.Event()
 
-                    mq_connection.close()
+        self._publisher = mt.Thread(target=self._publish_completions,
+                                    args=(completed, placeholders, stopped),
+                                    name='completion-publisher')
+        self._publisher.start()
 
-            except KeyboardInterrupt:
-                self._log.exception('Execution interrupted (probably by Ctrl+C)'
-                                    ' exit callback thread gracefully...')
-                raise KeyboardInterrupt
+        # Acquire a channel to sync with the AppManager, used for all bulks
+        mq_channel = self._transport.channel()
 
-            except Exception as e:
-                self._log.exception('Error in RP callback thread: %s', e)
         # ----------------------------------------------------------------------
+        def create_cuds(tasks):
 
+            return create_cuds_from_tasks(tasks, placeholders, self._prof)
+        # ----------------------------------------------------------------------
 
-        umgr = rp.UnitManager(session=rmgr._session)
-        umgr.add_pilots(rmgr.pilot)
-        umgr.register_callback(unit_state_cb)
+        pool = ThreadPool(self._cud_workers)
 
         try:
 
             while not self._tmgr_terminate.is_set():
 
+                self._check_publisher()
+
                 body = None
 
                 try:
-                    body = task_queue.get(block=True, timeout=10)
+                    body = task_queue.get(block=True,
+                                          timeout=self._rmq_ping_interval)
 
                 except Queue.Empty:
                     # Ignore, we don't always have new tasks to run
                     pass
 
+                # keep the channel alive while idle
+                mq_channel.process(0)
+
                 if not body:
                     continue
 
                 task_queue.task_done()
 
-                bulk_tasks = list()
-                bulk_cuds  = list()
+                tasks = self._codec.unpack_workload(body)
 
-                for msg in body:
+                # Up to `_cud_workers` chunks are converted ahead of the chunk
+                # being submitted, which bounds the memory used by CUDs which
+                # wait for admission
+                converting = collections.deque()
 
-                    task = Task()
-                    task.from_dict(msg)
-                    bulk_tasks.append(task)
-                    bulk_cuds.append(create_cud_from_task(
-                                            task, placeholders, self._prof))
+                for idx in range(0, len(tasks), self._submit_chunk):
 
-                    mq_connection = pika.BlockingConnection(rmq_conn_params)
-                    mq_channel = mq_connection.channel()
+                    chunk = tasks[idx:idx + self._submit_chunk]
+                    converting.append((chunk, pool.apply_async(create_cuds,
+                                                               (chunk,))))
 
-                    self._advance(task, 'Task', states.SUBMITTING,
-                                  mq_channel, '%s-tmgr-to-sync' % self._sid)
-                    mq_connection.close()
+                    if len(converting) > self._cud_workers:
+                        chunk, result = converting.popleft()
+                        self._submit(chunk, result.get(), umgr, mq_channel)
 
-                umgr.submit_units(bulk_cuds)
+                while converting:
+                    chunk, result = converting.popleft()
+                    self._submit(chunk, result.get(), umgr, mq_channel)
 
         except KeyboardInterrupt:
             self._log.exception('Execution interrupted (probably by Ctrl+C), '
@@ -327,6 +344,183 @@ class TaskManager(Base_TaskManager):
             self._log.exception('%s failed with %s', self._uid, e)
             raise EnTKError(e)
 
+        finally:
+
+            pool.terminate()
+            mq_channel.close()
+
+            stopped.set()
+            self._publisher.join()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _create_umgr(self, rmgr, unit_state_cb):
+        '''
+        **Purpose**: Return a UnitManager for the pilot of 'rmgr', which
+                     reports unit state changes to 'unit_state_cb'.
+        '''
+
+        umgr = rp.UnitManager(session=rmgr._session)
+        umgr.add_pilots(rmgr.pilot)
+        umgr.register_callback(unit_state_cb)
+
+        return umgr
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _submit(self, tasks, cuds, umgr, mq_channel):
+        '''
+        **Purpose**: Submit the CUDs of the given tasks to the RTS, as soon as
+                     the tasks are admitted.  Tasks are synced as SUBMITTING
+                     before their submission.
+        '''
+
+        while tasks and not self._tmgr_terminate.is_set():
+
+            # completions only make room for more tasks while published
+            self._check_publisher()
+
+            n = self._admission.admit(tasks, timeout=1)
+
+            # keep the channel alive while waiting for admission
+            mq_channel.process(0)
+
+            if not n:
+                continue
+
+            # sync the tasks before submission, so that no completion can
+            # overtake the SUBMITTING state of its task
+            self._advance_bulk(tasks[:n], 'Task', states.SUBMITTING,
+                               mq_channel, '%s-tmgr-to-sync' % self._sid)
+
+            umgr.submit_units(cuds[:n])
+
+            tasks = tasks[n:]
+            cuds  = cuds[n:]
+
+        if tasks:
+            self._log.info('%d tasks not submitted on termination', len(tasks))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _check_publisher(self):
+        '''
+        **Purpose**: Raise if the completion publisher thread died: completed
+                     tasks would never be reported.
+        '''
+
+        if not self._publisher.is_alive():
+            raise EnTKError('completion publisher died')
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _publish_completions(self, completed, placeholders, stopped):
+        '''
+        **Purpose**: The thread spawned by `_process_tasks` invokes this
+                     function.  It collects the units completed by the RTS from
+                     'completed' for up to `_completion_window` seconds (or
+                     `_completion_bulk` units), converts them into tasks, adds
+                     those to the 'placeholders', syncs their state with the
+                     AppManager and pushes them to the completed queue as one
+                     message.  On termination (or when 'stopped' is set), the
+                     units received so far are published before the thread
+                     exits.
+        '''
+
+        mq_channel = self._transport.channel()
+
+        try:
+
+            while True:
+
+                try:
+                    bulk = [completed.get(block=True, timeout=1)]
+
+                except Queue.Empty:
+
+                    if self._tmgr_terminate.is_set() or stopped.is_set():
+                        break
+
+                    # keep the channel alive while idle
+                    mq_channel.process(0)
+                    continue
+
+                deadline = time.time() + self._completion_window
+
+                while len(bulk) < self._completion_bulk:
+
+                    timeout = deadline - time.time()
+
+                    if timeout <= 0:
+                        break
+
+                    try:
+                        bulk.append(completed.get(block=True, timeout=timeout))
+
+                    except Queue.Empty:
+                        break
+
+                # make room for more tasks - for all final units, also those
+                # which fail conversion, which would shrink the window for good
+                self._admission.release([(unit.name or '').split(',')[0].strip()
+                                         for unit in bulk])
+
+                bulk = self._tasks_from_units(bulk, placeholders)
+
+                if not bulk:
+                    continue
+
+                # the completion must be synced before the tasks are pushed to
+                # the completed queue
+                self._advance_bulk(bulk, 'Task', states.COMPLETED,
+                                   mq_channel, '%s-cb-to-sync' % self._sid)
+
+                self._publish_completed(bulk, mq_channel)
+
+        except Exception as e:
+            self._log.exception('Error in completion publisher: %s', e)
+            raise EnTKError(e)
+
+        finally:
+            mq_channel.close()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _tasks_from_units(self, units, placeholders):
+        '''
+        **Purpose**: Convert a list of final units into tasks, and add their
+                     paths to the 'placeholders'.  Units which cannot be
+                     converted are logged and skipped.
+        '''
+
+        tasks = list()
+
+        for unit in units:
+
+            try:
+                task = create_task_from_cu(unit, self._prof)
+
+            except Exception as e:
+                self._log.exception('Failed to convert unit %s: %s',
+                                    unit.uid, e)
+                continue
+
+            parent_pipeline = str(task.parent_pipeline['name'])
+            parent_stage    = str(task.parent_stage['name'])
+
+            if None not in [parent_pipeline, parent_stage, task.name]:
+                placeholders.add(parent_pipeline, parent_stage, task.name,
+                                 task.path, unit.uid)
+
+            tasks.append(task)
+
+        return tasks
+
 
     # --------------------------------------------------------------------------
     #
@@ -1,5 +1,7 @@
 
 import os
+import threading
+
 import radical.pilot as rp
 import radical.utils as ru
 
@@ -11,6 +13,53 @@ from radical.entk import exceptions as ree
 logger = ru.Logger('radical.entk.task_processor')
 
 
+# ------------------------------------------------------------------------------
+#
+def _get_placeholder(path):
+    """
+    **Purpose**: Return the placeholder (`$SHARED` or
+                 `$Pipeline_(name)_Stage_(name)_Task_(name)`) used in the
+                 staging path `path`, or None.
+    """
+
+    if '$' not in path:
+        return None
+
+    elems = path.split('>')
+
+    if len(elems) == 1:
+        return path.split('/')[0]
+
+    if elems[0].strip().startswith('$'):
+        return elems[0].strip().split('/')[0]
+
+    return elems[1].strip().split('/')[0]
+
+
+# ------------------------------------------------------------------------------
+#
+def _split_placeholder(placeholder):
+    """
+    **Purpose**: Return the pipeline, stage and task name referenced by
+                 a `$Pipeline_(name)_Stage_(name)_Task_(name)` placeholder.
+    """
+
+    # Expected placeholder format:
+    # $Pipeline_{pipeline.uid}_Stage_{stage.uid}_Task_{task.uid}
+
+    elems = placeholder.split('/')[0].split('_')
+
+    if not len(elems) == 6:
+
+        expected = '$Pipeline_(pipeline_name)_' \
+                   'Stage_(stage_name)_' \
+                   'Task_(task_name) or $SHARED'
+        raise ree.ValueError(obj='placeholder', attribute='task',
+                             expected_value=expected, actual_value=elems)
+
+    return elems[1], elems[3], elems[5]
+
+
 # ------------------------------------------------------------------------------
 #
 def resolve_placeholders(path, placeholders):
@@ -33,38 +82,16 @@ def resolve_placeholders(path, placeholders):
             raise ree.TypeError(expected_type=basestring,
                                 actual_type=type(path))
 
-        if '$' not in path:
-            return path
+        placeholder = _get_placeholder(path)
 
-        # Extract placeholder from path
-        if len(path.split('>')) == 1:
-            placeholder = path.split('/')[0]
-        else:
-            if path.split('>')[0].strip().startswith('$'):
-                placeholder = path.split('>')[0].strip().split('/')[0]
-            else:
-                placeholder = path.split('>')[1].strip().split('/')[0]
+        if not placeholder:
+            return path
 
         # SHARED
         if placeholder == "$SHARED":
             return path.replace(placeholder, 'pilot://')
 
-        # Expected placeholder format:
-        # $Pipeline_{pipeline.uid}_Stage_{stage.uid}_Task_{task.uid}
-
-        elems = placeholder.split('/')[0].split('_')
-
-        if not len(elems) == 6:
-
-            expected = '$Pipeline_(pipeline_name)_' \
-                       'Stage_(stage_name)_' \
-                       'Task_(task_name) or $SHARED',
-            raise ree.ValueError(obj='placeholder', attribute='task',
-                                 expected_value=expected, actual_value=elems)
-
-        pname    = elems[1]
-        sname    = elems[3]
-        tname    = elems[5]
+        pname, sname, tname = _split_placeholder(placeholder)
         resolved = None
 
         if pname in placeholders:
@@ -90,7 +117,8 @@ def resolve_placeholders(path, placeholders):
                        'Stage_(stage_name)_' \
                        'Task_(task_name) or $SHARED'
             raise ree.ValueError(obj='placeholder', attribute='task',
-                                 expected_value=expected, actual_value=elems)
+                                 expected_value=expected,
+                                 actual_value=placeholder)
 
         return resolved
 
@@ -150,10 +178,131 @@ def resolve_arguments(args, placeholders):
     return resolved_args
 
 
+# ------------------------------------------------------------------------------
+#
+class Placeholders(dict):
+    """
+    **Purpose**: The placeholder table of a task manager.  This is the dict
+                 used by `resolve_placeholders()` and `resolve_arguments()`,
+                 which holds the path and the RTS uid of each executed task by
+                 names: `{pipeline: {stage: {task: {'path'   : path,
+                 'rts_uid': rts_uid}}}}`.  In addition, it indexes the RTS uids
+                 by task name, per pipeline and over all pipelines, so that
+                 `resolve_tags()` does not need to search the table.  Entries
+                 are to be added via `add()`.
+
+                 It also caches the staging directives created from staging
+                 paths (see `get_directive()`), so that paths which are shared
+                 by many tasks are parsed and resolved only once.  Cached
+                 directives which use a placeholder are dropped when the entry
+                 of that placeholder changes.
+    """
+
+    # max number of cached directives, the cache is cleared when exceeded
+    MAX_DIRECTIVES = 16 * 1024
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        super(Placeholders, self).__init__()
+
+        self._pipeline_tags = dict()  # pipeline -> {task: rts_uid}
+        self._tags          = dict()  # task     -> rts_uid
+
+        self._directives    = dict()  # (path, action)        -> directive
+        self._users         = dict()  # (pname, sname, tname) -> [(path, ..)]
+        self._lock          = threading.Lock()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def add(self, pname, sname, tname, path, rts_uid):
+        """
+        **Purpose**: Add the path and RTS uid of the task `tname` of stage
+                     `sname` of pipeline `pname`.  If several tasks have the
+                     same name, the last one added is used to resolve tags.
+        """
+
+        with self._lock:
+
+            self.setdefault(pname, dict()).setdefault(sname, dict())[tname] = \
+                    {'path': path, 'rts_uid': rts_uid}
+
+            self._pipeline_tags.setdefault(pname, dict())[tname] = rts_uid
+            self._tags[tname] = rts_uid
+
+            # directives which use this placeholder are outdated
+            for key in self._users.pop((pname, sname, tname), []):
+                self._directives.pop(key, None)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_tag(self, tag, pname):
+        """
+        **Purpose**: Return the RTS uid of the task named `tag`, preferring the
+                     tasks of pipeline `pname`, or None if no such task was
+                     added.
+        """
+
+        rts_uid = self._pipeline_tags.get(pname, {}).get(tag)
+
+        if rts_uid is None:
+            rts_uid = self._tags.get(tag)
+
+        return rts_uid
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get_directive(self, path, action):
+        """
+        **Purpose**: Return the RP staging directive for the staging path
+                     `path` and `action` (see `get_directive()`), using the
+                     cached directive if the path was seen before.
+        """
+
+        key = (path, action)
+
+        with self._lock:
+
+            directive = self._directives.get(key)
+
+            if directive is None:
+
+                directive = _create_directive(path, action, self)
+
+                if len(self._directives) >= self.MAX_DIRECTIVES:
+                    self._directives = dict()
+                    self._users      = dict()
+
+                self._directives[key] = directive
+
+                placeholder = _get_placeholder(path)
+                if placeholder and placeholder != '$SHARED':
+                    self._users.setdefault(_split_placeholder(placeholder),
+                                           list()).append(key)
+
+        # RP may change the directives it gets
+        return dict(directive)
+
+
 # ------------------------------------------------------------------------------
 #
 def resolve_tags(tag, parent_pipeline_name, placeholders):
 
+    # `Placeholders` index the tags, other dicts are searched
+    if isinstance(placeholders, Placeholders):
+
+        rts_uid = placeholders.get_tag(tag, parent_pipeline_name)
+
+        if rts_uid is not None:
+            return rts_uid
+
+        raise ree.EnTKError(msg='Tag %s cannot be used as no previous task '
+                                'with that name is found' % tag)
+
     # Check self pipeline first
     for sname in placeholders[parent_pipeline_name]:
         for tname in placeholders[parent_pipeline_name][sname]:
@@ -179,115 +328,96 @@ def resolve_tags(tag, parent_pipeline_name, placeholders):
 
 # ------------------------------------------------------------------------------
 #
-def get_input_list_from_task(task, placeholders):
-    """
-    Purpose: Parse Task object to extract the files to be staged as the output.
-
-    Details: The extracted data is then converted into the appropriate RP
-             directive depending on whether the data is to be copied/downloaded.
-
-    :arguments:
-        :task:         EnTK Task object
-        :placeholders: dictionary holding the values for placeholders
-
-    :return: list of RP directives for the files that need to be staged out
-    """
-
-    try:
-
-        if not isinstance(task, Task):
-            raise ree.TypeError(expected_type=Task, actual_type=type(task))
+# Task attributes which describe the staging of a task, and their RP actions
+# (None for uploads and downloads)
+#
+_INPUT_STAGING  = [('link_input_data',      rp.LINK),
+                   ('upload_input_data',    None   ),
+                   ('copy_input_data',      rp.COPY),
+                   ('move_input_data',      rp.MOVE)]
 
-        input_data = list()
+_OUTPUT_STAGING = [('copy_output_data',     rp.COPY),
+                   ('download_output_data', None   ),
+                   ('move_output_data',     rp.MOVE)]
 
-        if task.link_input_data:
 
-            for path in task.link_input_data:
+# ------------------------------------------------------------------------------
+#
+def _create_directive(path, action, placeholders):
 
-                path = resolve_placeholders(path, placeholders)
+    path  = resolve_placeholders(path, placeholders)
+    elems = path.split('>')
 
-                if len(path.split('>')) > 1:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.LINK
-                    }
+    source = elems[0].strip()
 
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.LINK
-                    }
-                input_data.append(temp)
+    if len(elems) > 1: target = elems[1].strip()
+    else             : target = os.path.basename(source)
 
+    directive = {'source': source,
+                 'target': target}
 
-        if task.upload_input_data:
+    if action:
+        directive['action'] = action
 
-            for path in task.upload_input_data:
+    return directive
 
-                path = resolve_placeholders(path, placeholders)
 
-                if len(path.split('>')) > 1:
+# ------------------------------------------------------------------------------
+#
+def get_directive(path, action, placeholders):
+    """
+    Purpose: Convert a staging path of a Task (`source [> target]`, possibly
+             using a placeholder) into an RP staging directive.
 
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip()
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip())
-                    }
-                input_data.append(temp)
+    :arguments:
+        :path:         staging path
+        :action:       RP staging action (None for uploads and downloads)
+        :placeholders: dictionary holding the values for placeholders
 
+    :return: RP staging directive
+    """
 
-        if task.copy_input_data:
+    # `Placeholders` cache the directives
+    if isinstance(placeholders, Placeholders):
+        return placeholders.get_directive(path, action)
 
-            for path in task.copy_input_data:
+    return _create_directive(path, action, placeholders)
 
-                path = resolve_placeholders(path, placeholders)
 
-                if len(path.split('>')) > 1:
+# ------------------------------------------------------------------------------
+#
+def _get_staging_list(task, staging, placeholders):
 
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.COPY
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.COPY
-                    }
-                input_data.append(temp)
+    if not isinstance(task, Task):
+        raise ree.TypeError(expected_type=Task, actual_type=type(task))
 
+    directives = list()
 
-        if task.move_input_data:
+    for attr, action in staging:
+        for path in task._shared('_' + attr):
+            directives.append(get_directive(path, action, placeholders))
 
-            for path in task.move_input_data:
+    return directives
 
-                path = resolve_placeholders(path, placeholders)
 
-                if len(path.split('>')) > 1:
+# ------------------------------------------------------------------------------
+#
+def get_input_list_from_task(task, placeholders):
+    """
+    Purpose: Parse Task object to extract the files to be staged as the input.
 
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.MOVE
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.MOVE
-                    }
+    Details: The extracted data is then converted into the appropriate RP
+             directive depending on whether the data is to be copied/uploaded.
 
-                input_data.append(temp)
+    :arguments:
+        :task:         EnTK Task object
+        :placeholders: dictionary holding the values for placeholders
 
-        return input_data
+    :return: list of RP directives for the files that need to be staged in
+    """
 
+    try:
+        return _get_staging_list(task, _INPUT_STAGING, placeholders)
 
     except Exception:
 
@@ -313,79 +443,7 @@ def get_output_list_from_task(task, placeholders):
     """
 
     try:
-
-        if not isinstance(task, Task):
-            raise ree.TypeError(expected_type=Task, actual_type=type(task))
-
-
-        output_data = list()
-
-        if task.copy_output_data:
-
-            for path in task.copy_output_data:
-
-                path = resolve_placeholders(path, placeholders)
-
-                if len(path.split('>')) > 1:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.COPY
-                    }
-
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.COPY
-                    }
-                output_data.append(temp)
-
-
-        if task.download_output_data:
-
-            for path in task.download_output_data:
-
-                path = resolve_placeholders(path, placeholders)
-
-                if len(path.split('>')) > 1:
-
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip()
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip())
-                    }
-                output_data.append(temp)
-
-
-        if task.move_output_data:
-
-            for path in task.move_output_data:
-
-                path = resolve_placeholders(path, placeholders)
-
-                if len(path.split('>')) > 1:
-
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': path.split('>')[1].strip(),
-                        'action': rp.MOVE
-                    }
-                else:
-                    temp = {
-                        'source': path.split('>')[0].strip(),
-                        'target': os.path.basename(path.split('>')[0].strip()),
-                        'action': rp.MOVE
-                    }
-
-                output_data.append(temp)
-
-        return output_data
-
+        return _get_staging_list(task, _OUTPUT_STAGING, placeholders)
 
     except Exception:
         logger.exception('Failed to get output list of files from task')
@@ -418,10 +476,17 @@ def create_cud_from_task(task, placeholders, prof=None):
                                           task.parent_stage['name'],
                                           task.parent_pipeline['uid'],
                                           task.parent_pipeline['name'])
-        cud.pre_exec   = task.pre_exec
+        # the description of the task is read without copying the values it
+        # shares with other tasks (see `Task._shared()`), and the CUD gets its
+        # own lists
+        cpu_reqs = task._shared('_cpu_reqs')
+        gpu_reqs = task._shared('_gpu_reqs')
+
+        cud.pre_exec   = list(task._shared('_pre_exec'))
         cud.executable = task.executable
-        cud.arguments  = resolve_arguments(task.arguments, placeholders)
-        cud.post_exec  = task.post_exec
+        cud.arguments  = resolve_arguments(task._shared('_arguments'),
+                                           placeholders)
+        cud.post_exec  = list(task._shared('_post_exec'))
 
         if task.tag:
             if task.parent_pipeline['name']:
@@ -430,14 +495,14 @@ def create_cud_from_task(task, placeholders, prof=None):
                         parent_pipeline_name=task.parent_pipeline['name'],
                         placeholders=placeholders)
 
-        cud.cpu_processes    = task.cpu_reqs['processes']
-        cud.cpu_threads      = task.cpu_reqs['threads_per_process']
-        cud.cpu_process_type = task.cpu_reqs['process_type']
-        cud.cpu_thread_type  = task.cpu_reqs['thread_type']
-        cud.gpu_processes    = task.gpu_reqs['processes']
-        cud.gpu_threads      = task.gpu_reqs['threads_per_process']
-        cud.gpu_process_type = task.gpu_reqs['process_type']
-        cud.gpu_thread_type  = task.gpu_reqs['thread_type']
+        cud.cpu_processes    = cpu_reqs['processes']
+        cud.cpu_threads      = cpu_reqs['threads_per_process']
+        cud.cpu_process_type = cpu_reqs['process_type']
+        cud.cpu_thread_type  = cpu_reqs['thread_type']
+        cud.gpu_processes    = gpu_reqs['processes']
+        cud.gpu_threads      = gpu_reqs['threads_per_process']
+        cud.gpu_process_type = gpu_reqs['process_type']
+        cud.gpu_thread_type  = gpu_reqs['thread_type']
 
         if task.lfs_per_process:
             cud.lfs_per_process = task.lfs_per_process
@@ -461,6 +526,25 @@ def create_cud_from_task(task, placeholders, prof=None):
         raise
 
 
+# ------------------------------------------------------------------------------
+#
+def create_cuds_from_tasks(tasks, placeholders, prof=None):
+    """
+    Purpose: Create the Compute Unit descriptions for a list of Tasks (like
+             a workload received by the task manager).  With `Placeholders`,
+             staging paths which are shared by the tasks are parsed and
+             resolved only once for the whole list.
+
+    :arguments:
+        :tasks:        list of EnTK Task objects
+        :placeholders: dictionary holding the values for placeholders
+
+    :return: list of ComputeUnitDescriptions
+    """
+
+    return [create_cud_from_task(task, placeholders, prof) for task in tasks]
+
+
 # ------------------------------------------------------------------------------
 #
 def create_task_from_cu(cu, prof=None):
@@ -488,20 +572,21 @@ def create_task_from_cu(cu, prof=None):
         if prof:
             prof.prof('task_create', uid=cu.name.split(',')[0].strip())
 
-        task = Task()
-
-        task.uid                     = cu.name.split(',')[0].strip()
-        task.name                    = cu.name.split(',')[1].strip()
-        task.parent_stage['uid']     = cu.name.split(',')[2].strip()
-        task.parent_stage['name']    = cu.name.split(',')[3].strip()
-        task.parent_pipeline['uid']  = cu.name.split(',')[4].strip()
-        task.parent_pipeline['name'] = cu.name.split(',')[5].strip()
-        task.rts_uid                 = cu.uid
-
-        if cu.state == rp.DONE: task.exit_code = 0
-        else                  : task.exit_code = 1
-
-        task.path = ru.Url(cu.sandbox).path
+        # the CU name was created by `create_cud_from_task`, so the Task is
+        # created without validating its attributes
+        names = [elem.strip() for elem in cu.name.split(',')]
+
+        if cu.state == rp.DONE: exit_code = 0
+        else                  : exit_code = 1
+
+        task = Task._from_trusted_dict({
+                    'uid'            : names[0],
+                    'name'           : names[1],
+                    'parent_stage'   : {'uid': names[2], 'name': names[3]},
+                    'parent_pipeline': {'uid': names[4], 'name': names[5]},
+                    'rts_uid'        : cu.uid,
+                    'exit_code'      : exit_code,
+                    'path'           : ru.Url(cu.sandbox).path})
 
         if prof:
             prof.prof('task_created', uid=cu.name.split(',')[0].strip())
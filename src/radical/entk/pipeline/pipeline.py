@@ -1,6 +1,7 @@
 import radical.utils as ru
 from radical.entk.exceptions import *
 from radical.entk.stage.stage import Stage
+from radical.entk.utils.id_utils import generate_ids
 import threading
 from radical.entk import states
 from collections import Iterable
@@ -22,6 +23,9 @@ class Pipeline(object):
 
         self._stages = list()
 
+        # Lookup table to find stages of this pipeline by their uid
+        self._stage_index = dict()
+
         self._state = states.INITIAL
 
         # Keep track of states attained
@@ -166,6 +170,8 @@ class Pipeline(object):
     def stages(self, value):
 
         self._stages = self._validate_entities(value)
+        self._stage_index = dict()
+        self._index_stages(self._stages)
 
         self._stage_count = len(self._stages)
         if self._cur_stage == 0:
@@ -200,6 +206,7 @@ class Pipeline(object):
         stages = self._validate_entities(value)
 
         self._stages.extend(stages)
+        self._index_stages(stages)
         self._stage_count = len(self._stages)
         if self._cur_stage == 0:
             self._cur_stage = 1
@@ -342,6 +349,35 @@ class Pipeline(object):
         except Exception, ex:
             raise EnTKError(text=ex)
 
+    def _index_stages(self, stages):
+        """
+        Purpose: Add the stages which already have a uid to the uid lookup table of the current pipeline.
+
+        :argument: List of Stage objects
+        """
+
+        for stage in stages:
+            if stage.uid:
+                self._stage_index[stage.uid] = stage
+
+    def _get_stage(self, uid):
+        """
+        Purpose: Return the stage of the current pipeline with the given uid, or None if there is no such stage. The
+        lookup is O(1); stages which got their uid after being added to the pipeline (e.g. stages added at runtime) are
+        indexed on the first miss.
+
+        :argument: String
+        :return: Stage or None
+        """
+
+        stage = self._stage_index.get(uid)
+
+        if stage is None and len(self._stage_index) != len(self._stages):
+            self._index_stages(self._stages)
+            stage = self._stage_index.get(uid)
+
+        return stage
+
     @classmethod
     def _validate_entities(self, stages):
         """
@@ -385,24 +421,31 @@ class Pipeline(object):
     def _assign_uid(self, sid):
         """
         Purpose: Assign a uid to the current object based on the sid passed. Pass the current uid to children of
-        current object
+        current object. The uids of all stages are allocated in one batch.
         """
         self._uid = ru.generate_id(
             'pipeline.%(item_counter)04d', ru.ID_CUSTOM, namespace=sid)
-        for stage in self._stages:
-            stage._assign_uid(sid)
 
-        self._pass_uid()
+        # the stages pass the uids to their tasks when they get their own
+        p_pipeline = {'uid': self._uid, 'name': self._name}
+
+        uids = generate_ids('stage.%(item_counter)04d', len(self._stages), sid)
+        for stage, stage_uid in zip(self._stages, uids):
+            stage._p_pipeline = p_pipeline
+            stage._assign_uid(sid, stage_uid)
+
+        self._stage_index = dict()
+        self._index_stages(self._stages)
 
     def _pass_uid(self):
         """
-        Purpose: Pass current Pipeline's uid to all Stages.
-
-        :argument: List of Stage objects (optional)
+        Purpose: Pass current Pipeline's uid to all Stages. All stages (and their tasks) share the same dict (by
+        reference) to describe this pipeline.
         """
 
+        p_pipeline = {'uid': self._uid, 'name': self._name}
+
         for stage in self._stages:
-            stage.parent_pipeline['uid'] = self._uid
-            stage.parent_pipeline['name'] = self._name
+            stage._p_pipeline = p_pipeline
             stage._pass_uid()
     # ------------------------------------------------------------------------------------------------------------------
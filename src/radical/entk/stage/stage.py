@@ -1,6 +1,9 @@
+import copy
+import weakref
 import radical.utils as ru
 from radical.entk.exceptions import *
 from radical.entk.task.task import Task
+from radical.entk.utils.id_utils import generate_ids
 from radical.entk import states
 from collections import Iterable
 
@@ -20,6 +23,12 @@ class Stage(object):
         self._tasks = set()
         self._state = states.INITIAL
 
+        # Lookup table to find tasks of this stage by their uid
+        self._task_index = dict()
+
+        # Number of tasks of this stage per task state, kept up to date by the tasks on each state transition
+        self._task_states = dict()
+
         # Keep track of states attained
         self._state_history = [states.INITIAL]
 
@@ -29,6 +38,9 @@ class Stage(object):
         # Pipeline this stage belongs to
         self._p_pipeline = {'uid': None, 'name': None}
 
+        # Fully qualified uid, computed on first use
+        self._luid = None
+
         self._post_exec = None
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -51,11 +63,12 @@ class Stage(object):
         """
         Tasks of the stage
 
-        :getter: Returns all the tasks of the current stage
+        :getter: Returns (a copy of the set of) all the tasks of the current stage. Use `add_tasks()` to add tasks: the
+                 stage keeps track of the states of its tasks.
         :setter: Assigns tasks to the current stage
         :type: set of Tasks
         """
-        return self._tasks
+        return set(self._tasks)
 
     @property
     def state(self):
@@ -100,15 +113,20 @@ class Stage(object):
         :getter: Returns the fully qualified uid of the current stage
         :type: String
         """
-        p_elem = self.parent_pipeline.get('name')
-        if not p_elem:
-            p_elem = self.parent_pipeline['uid']
+        # cached until name or parents are assigned, or the uid is passed to the tasks
+        if self._luid is None:
 
-        s_elem = self.name
-        if not s_elem:
-            s_elem = self.uid
+            p_elem = self.parent_pipeline.get('name')
+            if not p_elem:
+                p_elem = self.parent_pipeline['uid']
 
-        return '%s.%s' % (p_elem, s_elem)
+            s_elem = self.name
+            if not s_elem:
+                s_elem = self.uid
+
+            self._luid = '%s.%s' % (p_elem, s_elem)
+
+        return self._luid
 
 
     @property
@@ -121,6 +139,35 @@ class Stage(object):
 
         return self._state_history
 
+    @property
+    def task_states(self):
+        """
+        Number of tasks of the stage per state
+
+        example:
+            >>> stage.task_states
+            {'DONE': 12, 'FAILED': 1, 'EXECUTED': 3}
+
+        :getter: Returns a dictionary with the number of tasks (value) per state (key)
+        :type: dict
+        """
+
+        return dict([(state, n) for state, n in self._task_states.iteritems() if n])
+
+    @property
+    def progress(self):
+        """
+        Fraction of the tasks of the stage which have completed (i.e., are in DONE or FAILED state)
+
+        :getter: Returns a float between 0.0 and 1.0
+        :type: float
+        """
+
+        if not self._tasks:
+            return 0.0
+
+        return float(self._count_final()) / len(self._tasks)
+
     @property
     def post_exec(self):
         '''
@@ -152,18 +199,26 @@ class Stage(object):
                                 expected_value="Using ',' in an object's name will corrupt the profiling and internal mapping tables")
             else:
                 self._name = value
+                self._luid = None
         else:
             raise TypeError(expected_type=str, actual_type=type(value))
 
     @tasks.setter
     def tasks(self, value):
-        self._tasks = self._validate_entities(value)
+        tasks = self._validate_entities(value)
+        self._check_other_stage(tasks)
+        self._tasks = tasks
         self._task_count = len(self._tasks)
+        self._task_index = dict()
+        self._index_tasks(self._tasks)
+        self._task_states = dict()
+        self._count_tasks(self._tasks)
 
     @parent_pipeline.setter
     def parent_pipeline(self, value):
         if isinstance(value, dict):
             self._p_pipeline = value
+            self._luid = None
         else:
             raise TypeError(expected_type=dict, actual_type=type(value))
 
@@ -199,13 +254,96 @@ class Stage(object):
     # ------------------------------------------------------------------------------------------------------------------
     def add_tasks(self, value):
         """
-        Adds tasks to the existing set of tasks of the Stage
+        Adds tasks to the existing set of tasks of the Stage. A task can only be part of one stage at a time.
 
         :argument: set of tasks
         """
         tasks = self._validate_entities(value)
+        tasks = tasks.difference(self._tasks)
+        self._check_other_stage(tasks)
         self._tasks.update(tasks)
         self._task_count = len(self._tasks)
+        self._index_tasks(tasks)
+        self._count_tasks(tasks)
+
+    def add_task_array(self, template, n, per_task_args=None):
+        """
+        Adds `n` tasks with the description of the `template` task to the existing set of tasks of the Stage. The
+        tasks share the description of the template (until it is changed for a task), which saves memory and is sent
+        only once per message to the task manager. A copy of the template is used, so changing the template afterwards
+        does not affect the tasks. Task names need to be unique within a stage, so if the template has a name, the
+        tasks are named `<name>.<index>` (e.g. `sim.0000`), unless a name is given in `per_task_args`.
+
+        example:
+            >>> stage.add_task_array(task, 3, per_task_args=[{'arguments': ['-n', str(i)]} for i in range(3)])
+
+        :arguments:
+            :template: Task
+            :n: number of tasks to add
+            :per_task_args: (optional) list of `n` dicts with the attributes which differ per task, which are assigned
+                            to the tasks in order
+        :return: list of the added Tasks
+        """
+
+        if not isinstance(template, Task):
+            raise TypeError(expected_type=Task, actual_type=type(template))
+
+        if not isinstance(n, (int, long)):
+            raise TypeError(expected_type=int, actual_type=type(n))
+
+        if n < 0:
+            raise ValueError(obj=self._uid,
+                             attribute='n',
+                             expected_value='number of tasks >= 0',
+                             actual_value=n)
+
+        if per_task_args is not None:
+
+            if not isinstance(per_task_args, list):
+                raise TypeError(expected_type=list, actual_type=type(per_task_args))
+
+            if len(per_task_args) != n:
+                raise ValueError(obj=self._uid,
+                                 attribute='per_task_args',
+                                 expected_value='list of %d dicts' % n,
+                                 actual_value='list of %d elements' % len(per_task_args))
+
+            # check all arguments before any task is created
+            for args in per_task_args:
+
+                if not isinstance(args, dict):
+                    raise TypeError(expected_type=dict, actual_type=type(args))
+
+                for k in args:
+                    attr = getattr(Task, k, None)
+                    if not isinstance(attr, property) or not attr.fset:
+                        raise ValueError(obj=self._uid,
+                                         attribute='per_task_args',
+                                         expected_value='settable Task attributes',
+                                         actual_value=k)
+
+        # the tasks share the lists and dicts of the template, so we use a private copy of it
+        template = Task._from_trusted_dict(copy.deepcopy(template.to_dict()))
+
+        tasks = list()
+        for i in range(n):
+
+            task = Task._from_template(template)
+
+            if template.name:
+                task.name = '%s.%04d' % (template.name, i)
+
+            # per-task attributes are assigned via the (validating) task setters
+            if per_task_args:
+                for k, v in per_task_args[i].iteritems():
+                    setattr(task, k, v)
+
+            tasks.append(task)
+
+        if tasks:
+            self.add_tasks(tasks)
+
+        return tasks
 
     def to_dict(self):
         """
@@ -241,6 +379,8 @@ class Stage(object):
             if d['name']:
                 self._name = d['name']
 
+        self._luid = None
+
         if 'state' in d:
             if isinstance(d['state'], str) or isinstance(d['state'], unicode):
                 if d['state'] in states._stage_state_values.keys():
@@ -287,18 +427,93 @@ class Stage(object):
         for task in self._tasks:
             task.state = value
 
+    def _index_tasks(self, tasks):
+        """
+        Purpose: Add the tasks which already have a uid to the uid lookup table of the current stage.
+
+        :arguments: iterable of Tasks
+        """
+
+        for task in tasks:
+            if task.uid:
+                self._task_index[task.uid] = task
+
+    def _get_task(self, uid):
+        """
+        Purpose: Return the task of the current stage with the given uid, or None if there is no such task. The lookup
+        is O(1); tasks which got their uid after being added to the stage are indexed on the first miss.
+
+        :arguments: String
+        :return: Task or None
+        """
+
+        task = self._task_index.get(uid)
+
+        if task is None and len(self._task_index) != len(self._tasks):
+            self._index_tasks(self._tasks)
+            task = self._task_index.get(uid)
+
+        return task
+
+    def _check_other_stage(self, tasks):
+        """
+        Purpose: Reject tasks which are part of another stage: a task notifies (and is counted by) only one stage,
+        and has only one parent stage.
+
+        :arguments: iterable of Tasks
+        """
+
+        for task in tasks:
+
+            stage = task._stage() if task._stage else None
+
+            if stage is not None and stage is not self and task in stage._tasks:
+                raise ValueError(obj=self._uid,
+                                 attribute='tasks',
+                                 expected_value='tasks which are not part of another stage',
+                                 actual_value='task %s of stage %s' % (task.uid, stage.uid))
+
+    def _count_tasks(self, tasks):
+        """
+        Purpose: Attach the tasks to the current stage and add their states to the state counts of the current stage.
+
+        :arguments: iterable of Tasks
+        """
+
+        for task in tasks:
+            task._stage = weakref.ref(self)
+            self._task_states[task.state] = self._task_states.get(task.state, 0) + 1
+
+    def _task_state_changed(self, task, old_state, new_state):
+        """
+        Purpose: Update the state counts of the current stage on a state transition of one of its tasks. This is
+        invoked by the task.
+
+        :arguments: Task, String, String
+        """
+
+        # the task might have been removed from this stage since
+        if task not in self._tasks:
+            return
+
+        self._task_states[old_state] -= 1
+        self._task_states[new_state] = self._task_states.get(new_state, 0) + 1
+
+    def _count_final(self):
+        """
+        Purpose: Return the number of tasks of the current stage which are in either DONE or FAILED state.
+        """
+
+        return self._task_states.get(states.DONE, 0) + self._task_states.get(states.FAILED, 0)
+
     def _check_stage_complete(self):
         """
         Purpose: Check if all tasks of the current stage have completed, i.e., are in either DONE or FAILED state.
+        The check is O(1) as it uses the state counts of the stage.
         """
 
         try:
-
-            for task in self._tasks:
-                if task.state not in [states.DONE, states.FAILED]:
-                    return False
-
-            return True
+            return self._count_final() == len(self._tasks)
 
         except Exception, ex:
             raise EnTKError(ex)
@@ -347,28 +562,37 @@ class Stage(object):
         for task in self._tasks:
             task._validate()
 
-    def _assign_uid(self, sid):
+    def _assign_uid(self, sid, uid=None):
         """
-        Purpose: Assign a uid to the current object based on the sid passed. Pass the current uid to children of
-        current object
+        Purpose: Assign a uid to the current object based on the sid passed (or the given uid, if the parent
+        allocated it already). Pass the current uid to children of current object. The uids of all tasks are
+        allocated in one batch.
         """
-        self._uid = ru.generate_id('stage.%(item_counter)04d', ru.ID_CUSTOM, namespace=sid)
-        for task in self._tasks:
-            task._assign_uid(sid)
+        if uid: self._uid = uid
+        else  : self._uid = ru.generate_id('stage.%(item_counter)04d', ru.ID_CUSTOM, namespace=sid)
+
+        uids = generate_ids('task.%(item_counter)04d', len(self._tasks), sid)
+        for task, task_uid in zip(self._tasks, uids):
+            task._uid = task_uid
+
+        self._task_index = dict()
+        self._index_tasks(self._tasks)
 
         self._pass_uid()
 
     def _pass_uid(self):
         """
-        Purpose: Assign the parent Stage and the parent Pipeline to all the tasks of the current stage. 
-
-        :arguments: set of Tasks (optional)
-        :return: list of updated Tasks
+        Purpose: Assign the parent Stage and the parent Pipeline to all the tasks of the current stage. All tasks share
+        the same dicts (by reference) to describe their parents.
         """
 
+        self._luid = None
+
+        p_stage = {'uid': self._uid, 'name': self._name}
+        p_pipeline = self._p_pipeline
+
         for task in self._tasks:
-            task.parent_stage['uid'] = self._uid
-            task.parent_stage['name'] = self._name
-            task.parent_pipeline['uid'] = self._p_pipeline['uid']
-            task.parent_pipeline['name'] = self._p_pipeline['name']
+            task._p_stage = p_stage
+            task._p_pipeline = p_pipeline
+            task._luid = None
     # ------------------------------------------------------------------------------------------------------------------
@@ -5,6 +5,37 @@ from .. import exceptions as ree
 from .. import states     as res
 
 
+# Default resource requirements.  They are shared by all Tasks until they are
+# changed: do not modify these dicts in place.
+_CPU_REQS = {'processes'           : 1,
+             'process_type'        : None,
+             'threads_per_process' : 1,
+             'thread_type'         : None}
+_GPU_REQS = {'processes'           : 0,
+             'process_type'        : None,
+             'threads_per_process' : 0,
+             'thread_type'         : None}
+
+# Parents of Tasks which were not added to a stage yet.  Tasks of a stage share
+# the dicts which describe their stage and pipeline.
+_NO_PARENT = {'uid': None, 'name': None}
+
+# List attributes which are allocated on first use (`None` until then)
+_LISTS = ['pre_exec', 'arguments', 'post_exec', 'upload_input_data',
+          'copy_input_data', 'link_input_data', 'move_input_data',
+          'copy_output_data', 'move_output_data', 'download_output_data']
+
+
+def _list(val):
+    if val is None: return list()
+    else          : return val
+
+
+def _dict(val, default):
+    if val is default: return dict(default)
+    else             : return val
+
+
 # ------------------------------------------------------------------------------
 #
 class Task(object):
@@ -23,6 +54,16 @@ class Task(object):
     # FIXME: this should be converted into an RU/RS Attribute object, almost all
     #        of the code is redundant with the attribute class...
 
+    # Workflows can have millions of Tasks, so Tasks do not have a `__dict__`,
+    # share their default resource requirements (and the attributes of their
+    # template, see `Stage.add_task_array()`), and allocate their (mostly
+    # empty) lists on first use.
+    __slots__ = ['_uid', '_name', '_state', '_executable', '_lfs_per_process',
+                 '_cpu_reqs', '_gpu_reqs', '_stdout', '_stderr', '_path',
+                 '_exit_code', '_tag', '_rts_uid', '_state_history',
+                 '_p_stage', '_p_pipeline', '_stage', '_template', '_luid'] \
+              + ['_%s' % attr for attr in _LISTS]
+
     # --------------------------------------------------------------------------
     #
     def __init__(self, from_dict=None):
@@ -32,29 +73,23 @@ class Task(object):
         self._state      = res.INITIAL
 
         # Attributes necessary for execution
-        self._pre_exec   = list()
+        self._pre_exec   = None
         self._executable = None
-        self._arguments  = list()
-        self._post_exec  = list()
+        self._arguments  = None
+        self._post_exec  = None
 
         self._lfs_per_process = 0
-        self._cpu_reqs        = {'processes'           : 1,
-                                 'process_type'        : None,
-                                 'threads_per_process' : 1,
-                                 'thread_type'         : None}
-        self._gpu_reqs        = {'processes'           : 0,
-                                 'process_type'        : None,
-                                 'threads_per_process' : 0,
-                                 'thread_type'         : None}
+        self._cpu_reqs        = _CPU_REQS
+        self._gpu_reqs        = _GPU_REQS
 
         # Data staging attributes
-        self._upload_input_data    = list()
-        self._copy_input_data      = list()
-        self._link_input_data      = list()
-        self._move_input_data      = list()
-        self._copy_output_data     = list()
-        self._move_output_data     = list()
-        self._download_output_data = list()
+        self._upload_input_data    = None
+        self._copy_input_data      = None
+        self._link_input_data      = None
+        self._move_input_data      = None
+        self._copy_output_data     = None
+        self._move_output_data     = None
+        self._download_output_data = None
 
         # Name of file to write stdout and stderr of task
         self._stdout = None
@@ -65,13 +100,24 @@ class Task(object):
         self._path      = None
         self._exit_code = None
         self._tag       = None
+        self._rts_uid   = None
 
         # Keep track of res attained
         self._state_history = [res.INITIAL]
 
         # Stage and pipeline this task belongs to
-        self._p_stage    = {'uid': None, 'name': None}
-        self._p_pipeline = {'uid': None, 'name': None}
+        self._p_stage    = _NO_PARENT
+        self._p_pipeline = _NO_PARENT
+
+        # Fully qualified uid, computed on first use
+        self._luid = None
+
+        # Weak reference to the Stage object this task was added to, which
+        # keeps count of the states of its tasks
+        self._stage = None
+
+        # Task this task was created from, see `Stage.add_task_array()`
+        self._template = None
 
         # populate task attributes if so requesteed
         if from_dict:
@@ -110,18 +156,20 @@ class Task(object):
         :type: String
         '''
 
-        # TODO: cache
+        # cached until uid, name or parents are assigned
+        if self._luid is None:
 
+            p_elem = self._p_pipeline.get('name')
+            s_elem = self._p_stage.get('name')
+            t_elem = self._name
 
-        p_elem = self.parent_pipeline.get('name')
-        s_elem = self.parent_stage.get('name')
-        t_elem = self.name
+            if not p_elem: p_elem = self._p_pipeline['uid']
+            if not s_elem: s_elem = self._p_stage['uid']
+            if not t_elem: t_elem = self._uid
 
-        if not p_elem: p_elem = self.parent_pipeline['uid']
-        if not s_elem: s_elem = self.parent_stage['uid']
-        if not t_elem: t_elem = self.uid
+            self._luid = '%s.%s.%s' % (p_elem, s_elem, t_elem)
 
-        return '%s.%s.%s' % (p_elem, s_elem, t_elem)
+        return self._luid
 
 
     @property
@@ -159,7 +207,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._pre_exec
+        return self._private('_pre_exec')
 
 
     @property
@@ -185,7 +233,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._arguments
+        return self._private('_arguments')
 
 
     @property
@@ -198,7 +246,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._post_exec
+        return self._private('_post_exec')
 
 
     @property
@@ -239,7 +287,7 @@ class Task(object):
         :arguments: dict
         '''
 
-        return self._cpu_reqs
+        return self._private('_cpu_reqs')
 
 
     @property
@@ -279,7 +327,7 @@ class Task(object):
         :arguments: dict
         '''
 
-        return self._gpu_reqs
+        return self._private('_gpu_reqs')
 
 
     @property
@@ -302,7 +350,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._upload_input_data
+        return self._private('_upload_input_data')
 
 
     @property
@@ -316,7 +364,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._copy_input_data
+        return self._private('_copy_input_data')
 
 
     @property
@@ -330,7 +378,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._link_input_data
+        return self._private('_link_input_data')
 
 
     @property
@@ -344,7 +392,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._move_input_data
+        return self._private('_move_input_data')
 
 
     @property
@@ -358,7 +406,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._copy_output_data
+        return self._private('_copy_output_data')
 
 
     @property
@@ -372,7 +420,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._move_output_data
+        return self._private('_move_output_data')
 
 
     @property
@@ -386,7 +434,7 @@ class Task(object):
         :arguments: list of strings
         '''
 
-        return self._download_output_data
+        return self._private('_download_output_data')
 
 
     @property
@@ -449,6 +497,17 @@ class Task(object):
         return self._tag
 
 
+    @property
+    def rts_uid(self):
+        '''
+        Get the uid of the unit which executes the task in the RTS
+
+        :getter: return the RTS uid of the current task
+        '''
+
+        return self._rts_uid
+
+
     @property
     def parent_stage(self):
         '''
@@ -456,7 +515,7 @@ class Task(object):
         :setter: Assigns the stage uid this task belongs to
         '''
 
-        return self._p_stage
+        return self._private('_p_stage')
 
 
     @property
@@ -466,7 +525,7 @@ class Task(object):
         :setter: Assigns the pipeline uid this task belongs to
         '''
 
-        return self._p_pipeline
+        return self._private('_p_pipeline')
 
 
     @property
@@ -489,7 +548,8 @@ class Task(object):
             raise ree.TypeError(expected_type=basestring,
                                 actual_type=type(value))
 
-        self._uid = value
+        self._uid  = value
+        self._luid = None
 
 
     @name.setter
@@ -507,6 +567,7 @@ class Task(object):
                                  "will corrupt internal mapping tables")
 
         self._name = value
+        self._luid = None
 
 
     @state.setter
@@ -525,9 +586,13 @@ class Task(object):
                              attribute='state',
                              expected_value=res._task_state_values.keys(),
                              actual_value=value)
+
+        old_state   = self._state
         self._state = value
         self._state_history.append(value)
 
+        self._notify_stage(old_state)
+
 
     @state_history.setter
     def state_history(self, value):
@@ -620,10 +685,10 @@ class Task(object):
                                  actual_value=value.get('thread_type'),
                                  attribute='thread_type')
 
-        self._cpu_reqs['processes']           = value.get('processes', 1)
-        self._cpu_reqs['process_type']        = value.get('process_type')
-        self._cpu_reqs['threads_per_process'] = value.get('threads_per_process', 1)
-        self._cpu_reqs['thread_type']         = value.get('thread_type')
+        self._cpu_reqs = {'processes'           : value.get('processes', 1),
+                         'process_type'        : value.get('process_type'),
+                         'threads_per_process' : value.get('threads_per_process', 1),
+                         'thread_type'         : value.get('thread_type')}
 
 
     @gpu_reqs.setter
@@ -662,10 +727,10 @@ class Task(object):
                                  obj='gpu_reqs',
                                  attribute='thread_type')
 
-        self._gpu_reqs['processes']           = value.get('processes', 1)
-        self._gpu_reqs['process_type']        = value.get('process_type')
-        self._gpu_reqs['threads_per_process'] = value.get('threads_per_process', 1)
-        self._gpu_reqs['thread_type']         = value.get('thread_type')
+        self._gpu_reqs = {'processes'           : value.get('processes', 1),
+                         'process_type'        : value.get('process_type'),
+                         'threads_per_process' : value.get('threads_per_process', 1),
+                         'thread_type'         : value.get('thread_type')}
 
 
     @lfs_per_process.setter
@@ -790,6 +855,16 @@ class Task(object):
         self._tag = value
 
 
+    @rts_uid.setter
+    def rts_uid(self, value):
+
+        if not isinstance(value, basestring):
+            raise ree.TypeError(entity='rts_uid', expected_type=basestring,
+                                actual_type=type(value))
+
+        self._rts_uid = value
+
+
     @parent_stage.setter
     def parent_stage(self, value):
 
@@ -797,6 +872,7 @@ class Task(object):
             raise ree.TypeError(expected_type=dict, actual_type=type(value))
 
         self._p_stage = value
+        self._luid    = None
 
 
     @parent_pipeline.setter
@@ -806,6 +882,7 @@ class Task(object):
             raise ree.TypeError(expected_type=dict, actual_type=type(value))
 
         self._p_pipeline = value
+        self._luid       = None
 
 
     # --------------------------------------------------------------------------
@@ -817,27 +894,29 @@ class Task(object):
         :return: python dictionary
         '''
 
+        # lists which were never used are not allocated, and the default
+        # requirements and parents are shared: return copies of those
         task_desc_as_dict = {
             'uid'                  : self._uid,
             'name'                 : self._name,
             'state'                : self._state,
             'state_history'        : self._state_history,
 
-            'pre_exec'             : self._pre_exec,
+            'pre_exec'             : _list(self._pre_exec),
             'executable'           : self._executable,
-            'arguments'            : self._arguments,
-            'post_exec'            : self._post_exec,
-            'cpu_reqs'             : self._cpu_reqs,
-            'gpu_reqs'             : self._gpu_reqs,
+            'arguments'            : _list(self._arguments),
+            'post_exec'            : _list(self._post_exec),
+            'cpu_reqs'             : _dict(self._cpu_reqs, _CPU_REQS),
+            'gpu_reqs'             : _dict(self._gpu_reqs, _GPU_REQS),
             'lfs_per_process'      : self._lfs_per_process,
 
-            'upload_input_data'    : self._upload_input_data,
-            'copy_input_data'      : self._copy_input_data,
-            'link_input_data'      : self._link_input_data,
-            'move_input_data'      : self._move_input_data,
-            'copy_output_data'     : self._copy_output_data,
-            'move_output_data'     : self._move_output_data,
-            'download_output_data' : self._download_output_data,
+            'upload_input_data'    : _list(self._upload_input_data),
+            'copy_input_data'      : _list(self._copy_input_data),
+            'link_input_data'      : _list(self._link_input_data),
+            'move_input_data'      : _list(self._move_input_data),
+            'copy_output_data'     : _list(self._copy_output_data),
+            'move_output_data'     : _list(self._move_output_data),
+            'download_output_data' : _list(self._download_output_data),
 
             'stdout'               : self._stdout,
             'stderr'               : self._stderr,
@@ -845,9 +924,10 @@ class Task(object):
             'exit_code'            : self._exit_code,
             'path'                 : self._path,
             'tag'                  : self._tag,
+            'rts_uid'              : self._rts_uid,
 
-            'parent_stage'         : self._p_stage,
-            'parent_pipeline'      : self._p_pipeline,
+            'parent_stage'         : _dict(self._p_stage,    _NO_PARENT),
+            'parent_pipeline'      : _dict(self._p_pipeline, _NO_PARENT),
         }
 
         return task_desc_as_dict
@@ -867,6 +947,10 @@ class Task(object):
         if d.get('uid')  is not None: self._uid  = d['uid']
         if d.get('name') is not None: self._name = d['name']
 
+        self._luid = None
+
+        old_state = self._state
+
         if 'state' not in d:
             self._state = res.INITIAL
 
@@ -877,6 +961,8 @@ class Task(object):
                                     actual_type=type(d['state']))
             self._state = d['state']
 
+        self._notify_stage(old_state)
+
 
         # for all other attributes, we use the type and value checks in the
         # class setters
@@ -886,6 +972,146 @@ class Task(object):
                     setattr(self, k, v)
 
 
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def _from_trusted_dict(cls, d):
+        '''
+        Create a Task from a dictionary which was created by EnTK itself (see
+        `to_dict()`).  Unlike `from_dict()`, the attributes are not type and
+        value checked, and no setters are invoked.  Missing attributes get their
+        default values.  This is not to be used for user provided input.
+
+        :argument: python dictionary
+        :return: Task
+        '''
+
+        task  = cls.__new__(cls)
+        state = d.get('state') or res.INITIAL
+
+        task._uid             = d.get('uid')
+        task._name            = d.get('name')
+        task._state           = state
+        task._state_history   = d.get('state_history') or [state]
+        task._executable      = d.get('executable')
+        task._lfs_per_process = d.get('lfs_per_process') or 0
+        task._cpu_reqs        = d.get('cpu_reqs')        or _CPU_REQS
+        task._gpu_reqs        = d.get('gpu_reqs')        or _GPU_REQS
+        task._stdout          = d.get('stdout')
+        task._stderr          = d.get('stderr')
+        task._path            = d.get('path')
+        task._exit_code       = d.get('exit_code')
+        task._tag             = d.get('tag')
+        task._rts_uid         = d.get('rts_uid')
+        task._p_stage         = d.get('parent_stage')    or _NO_PARENT
+        task._p_pipeline      = d.get('parent_pipeline') or _NO_PARENT
+        task._stage           = None
+        task._template        = None
+        task._luid            = None
+
+        # empty lists are left unallocated
+        for attr in _LISTS:
+            setattr(task, '_' + attr, d.get(attr) or None)
+
+        return task
+
+
+    # --------------------------------------------------------------------------
+    #
+    @classmethod
+    def _from_template(cls, template):
+        '''
+        Create a Task with the description of the given template Task.  The
+        lists and dicts of the template are shared with the new Task until
+        they are accessed via the Task's properties, which copies them.  The
+        template must not be changed afterwards.  The new Task is not executed:
+        state, exit code, path and RTS uid of the template are not inherited.
+
+        :argument: Task
+        :return: Task
+        '''
+
+        task = cls.__new__(cls)
+
+        for attr in cls.__slots__:
+            setattr(task, attr, getattr(template, attr))
+
+        task._uid           = None
+        task._state         = res.INITIAL
+        task._state_history = [res.INITIAL]
+        task._exit_code     = None
+        task._path          = None
+        task._rts_uid       = None
+        task._p_stage       = _NO_PARENT
+        task._p_pipeline    = _NO_PARENT
+        task._stage         = None
+        task._template      = template
+        task._luid          = None
+
+        return task
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _private(self, attr):
+        '''
+        Purpose: Return the value of the list or dict attribute `attr` such that
+        it is not shared with other Tasks, as it might get changed in place:
+        lists are allocated on first use, and values shared with the defaults
+        or the template are copied.  (The parents of the Tasks of a stage are
+        shared on purpose.)
+        '''
+
+        val = getattr(self, attr)
+
+        if val is None:
+            val = list()
+
+        elif val is _CPU_REQS or val is _GPU_REQS or val is _NO_PARENT or \
+             (self._template and val is getattr(self._template, attr)):
+            val = type(val)(val)
+
+        else:
+            return val
+
+        setattr(self, attr, val)
+
+        return val
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _shared(self, attr):
+        '''
+        Purpose: Return the value of the list or dict attribute `attr` for
+        reading only.  Unlike `_private()` (and thus the property getters),
+        values shared with the defaults or the template are not copied, and
+        unallocated lists are not allocated, so that EnTK's own readers of the
+        Task description (admission, CUD creation) keep the sharing intact.
+        The returned value must not be changed.
+        '''
+
+        val = getattr(self, attr)
+
+        if val is None:
+            return list()
+
+        return val
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _notify_stage(self, old_state):
+        '''
+        Purpose: Let the stage this task belongs to update its state counts
+        '''
+
+        if self._stage:
+            stage = self._stage()
+            if stage:
+                stage._task_state_changed(self, old_state, self._state)
+
+
     # --------------------------------------------------------------------------
     #
     def _assign_uid(self, sid):
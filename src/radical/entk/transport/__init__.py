@@ -0,0 +1,6 @@
+from .base   import Base_Transport, Base_Channel
+from .rmq    import RMQ_Transport,  RMQ_Channel
+from .ipc    import IPC_Transport,  IPC_Channel
+from .zeromq import ZMQ_Transport,  ZMQ_Channel
+
+from .codec  import JSON_Codec, MsgPack_Codec, get_codec
@@ -0,0 +1,165 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+# ------------------------------------------------------------------------------
+#
+class Base_Transport(object):
+    """
+    A transport provides the named message queues used for the communication
+    between the components of EnTK: the pending and completed queues between
+    the WFprocessor and the TaskManager, the sync queues between the
+    TaskManager and the synchronizer of the AppManager, and the heartbeat
+    queues.
+
+    Queues are managed on the transport, messages are sent and received via
+    channels.  A channel is used by one thread only, every thread which
+    communicates opens its own channel via `channel()`.
+
+    The transport object is created in the AppManager and shared by all
+    components, including the TaskManager process: queues are to be declared
+    before the TaskManager process is started.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def declare(self, queues):
+        """
+        **Purpose**: Create the given queues (if they do not exist yet).
+        """
+
+        raise NotImplementedError('declare() method not implemented in '
+                                  'transport %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def purge(self, queues):
+        """
+        **Purpose**: Drop all messages from the given queues.
+        """
+
+        raise NotImplementedError('purge() method not implemented in '
+                                  'transport %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def delete(self, queues):
+        """
+        **Purpose**: Delete the given queues.
+        """
+
+        raise NotImplementedError('delete() method not implemented in '
+                                  'transport %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def channel(self):
+        """
+        **Purpose**: Open a new channel to send and receive messages.
+
+        :return: Base_Channel
+        """
+
+        raise NotImplementedError('channel() method not implemented in '
+                                  'transport %s' % type(self).__name__)
+
+
+# ------------------------------------------------------------------------------
+#
+class Base_Channel(object):
+    """
+    A channel sends messages to and receives messages from the queues of its
+    transport.  A message consists of a body (string) and an optional
+    correlation id (string), which is used to match requests and replies.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def is_open(self):
+        """
+        :getter: Returns whether the channel can still be used
+        :type: Boolean
+        """
+
+        raise NotImplementedError('is_open not implemented in '
+                                  'channel %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def publish(self, queue, body, corr_id=None):
+        """
+        **Purpose**: Send a message to a queue.
+        """
+
+        raise NotImplementedError('publish() method not implemented in '
+                                  'channel %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def consume(self, queue, callback):
+        """
+        **Purpose**: Register `callback(body, corr_id)` to be invoked for every
+        message received from `queue`.  Callbacks are only invoked from within
+        `process()`.  A message is acknowledged once its callback returned.
+        """
+
+        raise NotImplementedError('consume() method not implemented in '
+                                  'channel %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, queue):
+        """
+        **Purpose**: Receive a single message from a queue, without blocking.
+
+        :return: tuple (body, corr_id), or (None, None) if the queue is empty
+        """
+
+        raise NotImplementedError('get() method not implemented in '
+                                  'channel %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def process(self, timeout):
+        """
+        **Purpose**: Invoke the consumer callbacks for the messages received.
+        Blocks for up to `timeout` seconds if no messages are available.
+        """
+
+        raise NotImplementedError('process() method not implemented in '
+                                  'channel %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def sleep(self, duration):
+        """
+        **Purpose**: Sleep for `duration` seconds while keeping the channel
+        alive.
+        """
+
+        raise NotImplementedError('sleep() method not implemented in '
+                                  'channel %s' % type(self).__name__)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+        """
+        **Purpose**: Close the channel.
+        """
+
+        raise NotImplementedError('close() method not implemented in '
+                                  'channel %s' % type(self).__name__)
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,262 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import json
+
+from ..task import Task
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# msgpack >= 1.0 only accepts string keys unless told otherwise
+if msgpack and msgpack.version >= (1, 0):
+    _UNPACK_KWARGS = {'raw': False, 'strict_map_key': False}
+else:
+    _UNPACK_KWARGS = {'raw': False}
+
+
+# Optional task attributes which are sent with state updates
+STATE_FIELDS = ['exit_code', 'path', 'rts_uid']
+
+
+# ------------------------------------------------------------------------------
+#
+class JSON_Codec(object):
+    """
+    Encodes messages as JSON, and Tasks as their full `to_dict()`.  This is
+    the fallback wire format if msgpack is not installed (the default format
+    is msgpack, see `get_codec()`).
+    """
+
+    name = 'json'
+
+    # --------------------------------------------------------------------------
+    #
+    def dumps(self, msg):
+
+        return json.dumps(msg)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def loads(self, data):
+
+        return json.loads(data)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def pack_task(self, task):
+
+        return self._encode(task.to_dict())
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unpack_task(self, packed):
+
+        # the messages are created by EnTK, no need to validate them
+        return Task._from_trusted_dict(self._decode(packed))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def pack_workload(self, tasks):
+        """
+        Pack a list of Tasks into one message.  Tasks which were created from
+        a template (see `Stage.add_task_array()`) carry only the attributes in
+        which they differ from their template, and each template is sent once
+        per message:
+
+            {'templates': [packed template, ...],
+             'tasks'    : [[template index or None, packed task], ...]}
+        """
+
+        templates = list()
+        index     = dict()
+        packed    = list()
+
+        for task in tasks:
+
+            template = task._template
+
+            if template is None:
+                packed.append([None, self.pack_task(task)])
+                continue
+
+            if template not in index:
+                index[template] = len(templates)
+                templates.append(template.to_dict())
+
+            idx = index[template]
+            packed.append([idx, self._encode(task.to_dict(), templates[idx])])
+
+        return {'templates': [self._encode(t) for t in templates],
+                'tasks'    : packed}
+
+
+    # --------------------------------------------------------------------------
+    #
+    def unpack_workload(self, msg):
+        """
+        Return the list of Tasks packed by `pack_workload()`.
+        """
+
+        templates = [self._decode(t) for t in msg['templates']]
+        parents   = dict()
+        tasks     = list()
+
+        for idx, packed in msg['tasks']:
+
+            d = self._decode(packed)
+
+            if idx is not None:
+                tmp = dict(templates[idx])
+                tmp.update(d)
+                d = tmp
+
+            # like in the workflow, the tasks of a stage share the dicts which
+            # describe their stage and pipeline
+            for key in ['parent_stage', 'parent_pipeline']:
+                parent = d.get(key)
+                if parent:
+                    d[key] = parents.setdefault((parent['uid'],
+                                                 parent['name']), parent)
+
+            tasks.append(Task._from_trusted_dict(d))
+
+        return tasks
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _encode(self, d, base=None):
+        """
+        Encode the dict `d` of a Task.  If the dict `base` of another Task is
+        given, only the attributes which differ from `base` are encoded.
+        """
+
+        if base is None:
+            return d
+
+        return {k: v for k, v in d.iteritems() if v != base[k]}
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _decode(self, packed):
+
+        return packed
+
+
+    # --------------------------------------------------------------------------
+    #
+    def pack_state(self, task):
+        """
+        Return a state update for the given Task: a dict with the task's uid,
+        state and the uids of its parents (to find the task), plus those of
+        `STATE_FIELDS` which are set.  State updates are applied to the live
+        Tasks as they are, no Task is created for them.
+        """
+
+        update = {'uid'     : task.uid,
+                  'state'   : task.state,
+                  'stage'   : task.parent_stage['uid'],
+                  'pipeline': task.parent_pipeline['uid']}
+
+        for field in STATE_FIELDS:
+            val = getattr(task, field)
+            if val is not None:
+                update[field] = val
+
+        return update
+
+
+# ------------------------------------------------------------------------------
+#
+class MsgPack_Codec(JSON_Codec):
+    """
+    Encodes messages with msgpack, and Tasks as compact dicts: the keys are
+    the indices of the attributes in `TASK_FIELDS`, and attributes which have
+    their default value are left out.  The state history is not sent: the
+    receivers only ever use the current state, the history is kept on the
+    Tasks of the AppManager.
+    """
+
+    name = 'msgpack'
+
+    # The field ids of the compact format are the indices in this list: only
+    # ever append to it.
+    TASK_FIELDS = ['uid', 'name', 'state', 'pre_exec', 'executable',
+                   'arguments', 'post_exec', 'cpu_reqs', 'gpu_reqs',
+                   'lfs_per_process', 'upload_input_data', 'copy_input_data',
+                   'link_input_data', 'move_input_data', 'copy_output_data',
+                   'move_output_data', 'download_output_data', 'stdout',
+                   'stderr', 'exit_code', 'path', 'tag', 'parent_stage',
+                   'parent_pipeline', 'rts_uid']
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        self._fields   = list(enumerate(self.TASK_FIELDS))
+        self._defaults = Task().to_dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def dumps(self, msg):
+
+        return msgpack.packb(msg, use_bin_type=True)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def loads(self, data):
+
+        return msgpack.unpackb(data, **_UNPACK_KWARGS)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _encode(self, d, base=None):
+
+        # attributes which were not sent have their default values
+        if base is None:
+            base = self._defaults
+
+        return {idx: d[field] for idx, field in self._fields
+                              if d[field] != base[field]}
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _decode(self, packed):
+
+        return {self.TASK_FIELDS[idx]: val for idx, val in packed.iteritems()}
+
+
+# ------------------------------------------------------------------------------
+#
+def get_codec(name):
+    """
+    Return the codec for the given wire format name, or the JSON codec if the
+    format is not available here.  Callers should check the `name` of the
+    returned codec: all components of a session need to use the same codec.
+    """
+
+    if name == 'msgpack' and msgpack:
+        return MsgPack_Codec()
+
+    if name not in ['json', 'msgpack']:
+        raise ValueError('invalid codec %s' % name)
+
+    return JSON_Codec()
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,183 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import time
+import Queue
+import select
+
+import multiprocessing as mp
+
+from .base import Base_Transport, Base_Channel
+
+
+# ------------------------------------------------------------------------------
+#
+class IPC_Transport(Base_Transport):
+    """
+    Transport via multiprocessing queues, for EnTK runs without a RabbitMQ
+    server.  Messages are handed over between the threads of the AppManager
+    process and the TaskManager process directly, without a broker.
+
+    The queues are inherited by the TaskManager process when it is forked, so
+    all queues need to be declared before the TaskManager is started.  For the
+    same reason, deleting a queue only drops its messages: the queue object
+    itself remains valid in all processes.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self):
+
+        self._queues = dict()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _queue(self, name):
+
+        if name not in self._queues:
+            raise KeyError('queue %s not declared' % name)
+
+        return self._queues[name]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def declare(self, queues):
+
+        for name in queues:
+            if name not in self._queues:
+                self._queues[name] = mp.Queue()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def purge(self, queues):
+
+        for name in queues:
+
+            queue = self._queues.get(name)
+
+            if not queue:
+                continue
+
+            while True:
+                try:
+                    queue.get(block=False)
+                except Queue.Empty:
+                    break
+
+
+    # --------------------------------------------------------------------------
+    #
+    def delete(self, queues):
+
+        self.purge(queues)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def channel(self):
+
+        return IPC_Channel(self)
+
+
+# ------------------------------------------------------------------------------
+#
+class IPC_Channel(Base_Channel):
+    """
+    A channel on the queues of an IPC_Transport.  Messages are tuples of
+    (corr_id, body).
+    """
+
+    # Max number of messages handed to the callback of a queue per `process()`
+    _BULK = 100
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, transport):
+
+        self._transport = transport
+        self._consumers = list()
+        self._open      = True
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def is_open(self):
+
+        return self._open
+
+
+    # --------------------------------------------------------------------------
+    #
+    def publish(self, queue, body, corr_id=None):
+
+        self._transport._queue(queue).put((corr_id, body))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def consume(self, queue, callback):
+
+        self._consumers.append((self._transport._queue(queue), callback))
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, queue):
+
+        try:
+            corr_id, body = self._transport._queue(queue).get(block=False)
+            return body, corr_id
+
+        except Queue.Empty:
+            return None, None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def process(self, timeout):
+
+        if not self._consumers:
+            time.sleep(timeout)
+            return
+
+        # wait until any of the consumed queues has data
+        readers  = [queue._reader for queue, _ in self._consumers]
+        ready, _, _ = select.select(readers, [], [], timeout)
+
+        for queue, callback in self._consumers:
+
+            if queue._reader not in ready:
+                continue
+
+            for _ in range(self._BULK):
+
+                try:
+                    corr_id, body = queue.get(block=False)
+
+                except Queue.Empty:
+                    break
+
+                callback(body, corr_id)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def sleep(self, duration):
+
+        time.sleep(duration)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        self._open = False
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,179 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import pika
+
+from ..exceptions import TypeError
+
+from .base import Base_Transport, Base_Channel
+
+
+# ------------------------------------------------------------------------------
+#
+class RMQ_Transport(Base_Transport):
+    """
+    Transport via a RabbitMQ server.
+
+    :arguments:
+        :rmq_conn_params:   (pika.connection.ConnectionParameters) object of
+                            parameters necessary to connect to RabbitMQ
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, rmq_conn_params):
+
+        if not isinstance(rmq_conn_params,
+                            pika.connection.ConnectionParameters):
+            raise TypeError(expected_type=pika.connection.ConnectionParameters,
+                            actual_type=type(rmq_conn_params))
+
+        self._rmq_conn_params = rmq_conn_params
+
+        # Messages are pushed to consumers by RabbitMQ: limit the number of
+        # unacknowledged messages in flight per channel
+        self._prefetch = int(os.getenv('ENTK_MQ_PREFETCH', 100))
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def rmq_conn_params(self):
+        return self._rmq_conn_params
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _run(self, method, queues):
+
+        mq_connection = pika.BlockingConnection(self._rmq_conn_params)
+        mq_channel    = mq_connection.channel()
+
+        for queue in queues:
+            getattr(mq_channel, method)(queue=queue)
+
+        mq_connection.close()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def declare(self, queues):
+
+        self._run('queue_declare', queues)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def purge(self, queues):
+
+        self._run('queue_purge', queues)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def delete(self, queues):
+
+        self._run('queue_delete', queues)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def channel(self):
+
+        return RMQ_Channel(self._rmq_conn_params, self._prefetch)
+
+
+# ------------------------------------------------------------------------------
+#
+class RMQ_Channel(Base_Channel):
+    """
+    A channel on its own connection to the RabbitMQ server.
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, rmq_conn_params, prefetch):
+
+        self._mq_connection = pika.BlockingConnection(rmq_conn_params)
+        self._mq_channel    = self._mq_connection.channel()
+        self._mq_channel.basic_qos(prefetch_count=prefetch)
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def is_open(self):
+
+        return self._mq_connection.is_open
+
+
+    # --------------------------------------------------------------------------
+    #
+    def publish(self, queue, body, corr_id=None):
+
+        props = None
+        if corr_id:
+            props = pika.BasicProperties(correlation_id=corr_id)
+
+        self._mq_channel.basic_publish(exchange='', routing_key=queue,
+                                       body=body, properties=props)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def consume(self, queue, callback):
+
+        # ----------------------------------------------------------------------
+        def on_message(channel, method_frame, props, body):
+
+            callback(body, props.correlation_id)
+
+            # Acknowledge the received message
+            channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+        # ----------------------------------------------------------------------
+
+        self._mq_channel.basic_consume(on_message, queue=queue)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, queue):
+
+        method_frame, props, body = self._mq_channel.basic_get(queue=queue)
+
+        if not body:
+            return None, None
+
+        self._mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+
+        return body, props.correlation_id
+
+
+    # --------------------------------------------------------------------------
+    #
+    def process(self, timeout):
+
+        # `process_data_events()` blocks while no messages arrive and also
+        # keeps the connection alive
+        self._mq_connection.process_data_events(time_limit=timeout)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def sleep(self, duration):
+
+        self._mq_connection.sleep(duration)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        if self._mq_connection.is_open:
+            self._mq_connection.close()
+
+
+# ------------------------------------------------------------------------------
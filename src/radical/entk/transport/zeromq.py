@@ -0,0 +1,255 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import time
+import tempfile
+
+from ..exceptions import EnTKError
+
+from .base import Base_Transport, Base_Channel
+
+try:
+    import zmq
+except ImportError:
+    zmq = None
+
+
+# ------------------------------------------------------------------------------
+#
+class ZMQ_Transport(Base_Transport):
+    """
+    Brokerless transport via ZeroMQ.  Each queue is an `ipc://` endpoint in
+    a session directory: the (single) consumer of a queue binds a PULL socket
+    to it, all producers connect PUSH sockets.  Messages sent before the
+    consumer bound are kept by the producers and are delivered once it
+    binds, so queues need not exist before they are used.
+
+    Without a broker there is no central place which holds messages: purging
+    a queue is a no-op, and deleting a queue removes its endpoint.  Closing a
+    channel waits (for a while) until the messages it sent are delivered.
+
+    :arguments:
+        :path:  (str) directory for the endpoints (optional, a temporary
+                directory is created by default)
+    """
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, path=None):
+
+        if not zmq:
+            raise EnTKError('zeromq transport needs the pyzmq module')
+
+        if not path:
+            path = tempfile.mkdtemp(prefix='entk.')
+
+        self._path = path
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def path(self):
+        return self._path
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _endpoint(self, queue):
+
+        return 'ipc://%s/%s' % (self._path, queue)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def declare(self, queues):
+
+        # queues are created on demand by their consumer, we only provide the
+        # directory for the endpoints (which may race with other processes)
+        try:
+            os.makedirs(self._path)
+        except OSError:
+            if not os.path.isdir(self._path):
+                raise
+
+
+    # --------------------------------------------------------------------------
+    #
+    def purge(self, queues):
+
+        pass
+
+
+    # --------------------------------------------------------------------------
+    #
+    def delete(self, queues):
+
+        for queue in queues:
+            try:
+                os.unlink('%s/%s' % (self._path, queue))
+            except OSError:
+                pass
+
+        # remove the session directory once all queues are gone
+        try:
+            os.rmdir(self._path)
+        except OSError:
+            pass
+
+
+    # --------------------------------------------------------------------------
+    #
+    def channel(self):
+
+        return ZMQ_Channel(self)
+
+
+# ------------------------------------------------------------------------------
+#
+class ZMQ_Channel(Base_Channel):
+    """
+    A channel on the endpoints of a ZMQ_Transport.  Messages are sent as
+    multipart messages [corr_id, body].
+    """
+
+    # Max number of messages handed to the callback of a queue per `process()`
+    _BULK = 100
+
+    # Max time (in seconds) `close()` waits for pending messages to be sent
+    _LINGER = 1
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, transport):
+
+        # every channel has its own context, which is never shared with
+        # a forked process and which we terminate to flush our messages
+        self._context   = zmq.Context()
+        self._transport = transport
+        self._pushers   = dict()
+        self._pullers   = dict()
+        self._callbacks = dict()
+        self._poller    = zmq.Poller()
+        self._open      = True
+
+
+    # --------------------------------------------------------------------------
+    #
+    @property
+    def is_open(self):
+
+        return self._open
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _puller(self, queue):
+
+        if queue not in self._pullers:
+
+            self._transport.declare([queue])
+
+            sock = self._context.socket(zmq.PULL)
+            sock.bind(self._transport._endpoint(queue))
+
+            self._pullers[queue] = sock
+
+        return self._pullers[queue]
+
+
+    # --------------------------------------------------------------------------
+    #
+    def publish(self, queue, body, corr_id=None):
+
+        if queue not in self._pushers:
+
+            sock = self._context.socket(zmq.PUSH)
+            sock.connect(self._transport._endpoint(queue))
+
+            self._pushers[queue] = sock
+
+        # zmq only sends bytes
+        frames = [corr_id or '', body]
+        frames = [f.encode('utf-8') if isinstance(f, unicode) else f
+                  for f in frames]
+
+        self._pushers[queue].send_multipart(frames)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def consume(self, queue, callback):
+
+        sock = self._puller(queue)
+
+        self._callbacks[sock] = callback
+        self._poller.register(sock, zmq.POLLIN)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def get(self, queue):
+
+        try:
+            corr_id, body = self._puller(queue).recv_multipart(zmq.NOBLOCK)
+            return body, corr_id or None
+
+        except zmq.Again:
+            return None, None
+
+
+    # --------------------------------------------------------------------------
+    #
+    def process(self, timeout):
+
+        if not self._callbacks:
+            time.sleep(timeout)
+            return
+
+        for sock, _ in self._poller.poll(timeout * 1000):
+
+            callback = self._callbacks[sock]
+
+            for _ in range(self._BULK):
+
+                try:
+                    corr_id, body = sock.recv_multipart(zmq.NOBLOCK)
+
+                except zmq.Again:
+                    break
+
+                callback(body, corr_id or None)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def sleep(self, duration):
+
+        time.sleep(duration)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def close(self):
+
+        if not self._open:
+            return
+
+        for sock in self._pullers.values():
+            sock.close(linger=0)
+
+        # messages to a consumer which did not connect yet are still pending
+        # in the PUSH sockets: terminating the context blocks until they are
+        # delivered, so that they are not lost when our process exits.
+        for sock in self._pushers.values():
+            sock.close(linger=self._LINGER * 1000)
+
+        self._context.term()
+        self._open = False
+
+
+# ------------------------------------------------------------------------------
+
@@ -8,6 +8,12 @@ from .prof_utils         import write_session_description
 from .prof_utils         import get_session_description
 from .prof_utils         import write_workflows
 
+from .queue_utils        import get_queue
+from .id_utils           import generate_ids
+
+from .perf_utils         import Profiler, Progress
+from .perf_utils         import perf_mode, prof_bulk, report_interval
+
 
 # ------------------------------------------------------------------------------
 #
@@ -0,0 +1,103 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import fcntl
+import getpass
+
+import radical.utils as ru
+
+
+# Per (namespace, prefix): True if `ru.generate_id()` uses the counter file
+# of `_counter_file()`, see `generate_ids()`
+_shared_counter = dict()
+
+
+# ------------------------------------------------------------------------------
+#
+def _counter_file(prefix, namespace):
+
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = 'nobody'
+
+    # same counter file as in `ru.generate_id()` (radical.utils 0.72)
+    return '%s/%s/ru_%s_%s.cnt' % (ru.get_radical_base('utils'), namespace,
+                                   user, prefix)
+
+
+# ------------------------------------------------------------------------------
+#
+def _read_counter(fname):
+
+    try:
+        with open(fname) as fin:
+            return int(fin.read() or 0)
+
+    except (IOError, ValueError):
+        return None
+
+
+# ------------------------------------------------------------------------------
+#
+def generate_ids(prefix, count, namespace):
+    '''
+    Return `count` uids for the given prefix (a template with an
+    `%(item_counter)` pattern, like `task.%(item_counter)04d`), as
+    `ru.generate_id(prefix, ru.ID_CUSTOM, namespace=namespace)` would return
+    for `count` consecutive calls.  The uids are reserved as one contiguous
+    range of the counter of that prefix and namespace, which is read and
+    written once (instead of once per uid), so this can be freely mixed with
+    `ru.generate_id()`.
+
+    radical.utils has no API to reserve a range of uids, so this uses the
+    counter file and locking of `ru.generate_id()`.  The first call for a
+    prefix and namespace checks that `ru.generate_id()` advances that counter
+    file: if it does not (i.e., the layout of radical.utils changed), all uids
+    are generated by `ru.generate_id()`, one by one.
+    '''
+
+    if count <= 0:
+        return list()
+
+    fname = _counter_file(prefix, namespace)
+    key   = (namespace, prefix)
+    uids  = list()
+
+    if key not in _shared_counter:
+
+        before = _read_counter(fname) or 0
+        uids.append(ru.generate_id(prefix, ru.ID_CUSTOM, namespace=namespace))
+
+        # concurrent allocations also fail the check, which is safe
+        _shared_counter[key] = _read_counter(fname) == before + 1
+        count -= 1
+
+    if not _shared_counter[key]:
+        return uids + [ru.generate_id(prefix, ru.ID_CUSTOM, namespace=namespace)
+                       for _ in range(count)]
+
+    if count <= 0:
+        return uids
+
+    fd = os.open(fname, os.O_RDWR | os.O_CREAT)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.lseek(fd, 0, os.SEEK_SET)
+        data  = os.read(fd, 256)
+        start = int(data or 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, '%d\n' % (start + count))
+
+    finally:
+        os.close(fd)
+
+    return uids + [prefix % {'item_counter': idx}
+                   for idx in range(start, start + count)]
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,254 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import os
+import time
+import atexit
+import threading
+
+import radical.utils as ru
+
+from .. import states
+
+
+# ------------------------------------------------------------------------------
+#
+def perf_mode():
+    '''
+    Return True if EnTK runs in performance mode (`ENTK_PERF_MODE` is set).
+    In performance mode, profile events are written in bulks (see `Profiler`)
+    and task state transitions are reported as periodic progress per stage
+    (see `Progress`) instead of one line per transition.
+    '''
+
+    return os.getenv('ENTK_PERF_MODE', '').lower() not in ['', '0', 'false',
+                                                           'off']
+
+
+# ------------------------------------------------------------------------------
+#
+def prof_bulk():
+    '''
+    Return the number of profile events `Profiler` collects before writing
+    them (`ENTK_PROF_BULK`, defaults to 1024 in performance mode and to `1`,
+    i.e. one write per event, otherwise).
+    '''
+
+    return int(os.getenv('ENTK_PROF_BULK', 1024 if perf_mode() else 1))
+
+
+# ------------------------------------------------------------------------------
+#
+def report_interval():
+    '''
+    Return the number of seconds between two progress reports
+    (`ENTK_REPORT_INTERVAL`, defaults to 10 in performance mode and to `0`,
+    i.e. one report line per transition, otherwise).
+    '''
+
+    return float(os.getenv('ENTK_REPORT_INTERVAL', 10 if perf_mode() else 0))
+
+
+# ------------------------------------------------------------------------------
+#
+class Profiler(ru.Profiler):
+    '''
+    A `ru.Profiler` which collects the events in memory and writes them in
+    bulks of `bulk` events (and on `flush()` and `close()`), instead of writing
+    (and line-flushing) one line per event.  Events keep the time they were
+    recorded at.  For `bulk <= 1` this behaves like `ru.Profiler`.
+
+    Events which a forked process inherits in the buffer of its parent are
+    dropped in the child: they are written by the parent.
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, name, ns=None, path=None, bulk=None):
+
+        if bulk is None:
+            bulk = prof_bulk()
+
+        # set before `ru.Profiler.__init__()`, which returns early for
+        # disabled profiles
+        self._bulk   = bulk
+        self._buffer = list()
+        self._lock   = threading.Lock()
+        self._pid    = os.getpid()
+        self._handle = None
+
+        ru.Profiler.__init__(self, name, ns=ns, path=path)
+
+        if self._enabled and self._bulk > 1:
+            atexit.register(self._write)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def prof(self, event, uid=None, state=None, msg=None, timestamp=None,
+             comp=None, tid=None):
+
+        if self._bulk <= 1:
+            return ru.Profiler.prof(self, event, uid=uid, state=state,
+                                    msg=msg, timestamp=timestamp, comp=comp,
+                                    tid=tid)
+
+        if not self._enabled: return
+        if not self._handle : return
+
+        if timestamp is None: timestamp = self.timestamp()
+        if comp      is None: comp      = self._name
+        if tid       is None: tid       = threading.current_thread().name
+        if uid       is None: uid       = ''
+        if state     is None: state     = ''
+        if msg       is None: msg       = ''
+
+        if isinstance(uid, list): uids = uid
+        else                    : uids = [uid]
+
+        lines = ['%.7f,%s,%s,%s,%s,%s,%s\n'
+                 % (timestamp, event, comp, tid, _uid, state, msg)
+                 for _uid in uids]
+
+        with self._lock:
+
+            if self._pid != os.getpid():
+                self._pid    = os.getpid()
+                self._buffer = list()
+
+            self._buffer.extend(lines)
+
+            if len(self._buffer) >= self._bulk:
+                self._write_buffer()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def flush(self, verbose=True):
+
+        if not self._enabled: return
+        if not self._handle : return
+
+        if verbose:
+            self.prof('flush')
+
+        self._write()
+        ru.Profiler.flush(self, verbose=False)
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _write(self):
+
+        with self._lock:
+
+            if self._pid != os.getpid():
+                self._pid    = os.getpid()
+                self._buffer = list()
+
+            self._write_buffer()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def _write_buffer(self):
+
+        # called with `_lock` held
+        if self._buffer and self._handle:
+            self._handle.write(''.join(self._buffer))
+
+        self._buffer = list()
+
+
+# ------------------------------------------------------------------------------
+#
+class Progress(object):
+    '''
+    Aggregated reporting of task state transitions: instead of reporting one
+    line per transition, the transitions are counted per stage and state, and
+    the counts of the stages which progressed are reported at most every
+    `interval` seconds (and on `flush()`), like:
+
+        Progress: pipe.0000.stage.0001: SCHEDULING: 1000, SUBMITTING: 400
+
+    The counts are cumulative: they give the number of tasks of the stage which
+    reached a state (more than once for resubmitted tasks).
+    '''
+
+    # --------------------------------------------------------------------------
+    #
+    def __init__(self, reporter, interval):
+
+        self._report   = reporter
+        self._interval = interval
+        self._counts   = dict()       # stage uid -> {state: count}
+        self._luids    = dict()       # stage uid -> stage luid
+        self._changed  = set()        # stages which progressed since report
+        self._last     = time.time()
+        self._lock     = threading.Lock()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def advance(self, task):
+        '''
+        Count the transition of `task` into its current state.
+        '''
+
+        stage = task.parent_stage['uid']
+
+        with self._lock:
+
+            counts = self._counts.get(stage)
+
+            if counts is None:
+
+                # the luid of a stage is the luid of its tasks without the
+                # task part
+                p_elem = task.parent_pipeline.get('name') \
+                      or task.parent_pipeline['uid']
+                s_elem = task.parent_stage.get('name') or stage
+
+                counts = self._counts[stage] = dict()
+                self._luids[stage] = '%s.%s' % (p_elem, s_elem)
+
+            counts[task.state] = counts.get(task.state, 0) + 1
+            self._changed.add(stage)
+
+            if time.time() - self._last < self._interval:
+                return
+
+        self.flush()
+
+
+    # --------------------------------------------------------------------------
+    #
+    def flush(self):
+        '''
+        Report the counts of all stages which progressed since the last
+        report.
+        '''
+
+        with self._lock:
+
+            lines = list()
+
+            for stage in sorted(self._changed, key=self._luids.get):
+
+                counts = sorted(self._counts[stage].iteritems(),
+                                key=lambda x: states.state_numbers.get(x[0]))
+                lines.append('%s: %s\n' % (self._luids[stage],
+                             ', '.join(['%s: %d' % x for x in counts])))
+
+            self._changed = set()
+            self._last    = time.time()
+
+        for line in lines:
+            self._report.ok('Progress: ')
+            self._report.info(line)
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,22 @@
+
+__copyright__ = "Copyright 2017-2019, http://radical.rutgers.edu"
+__license__   = "MIT"
+
+
+import zlib
+
+
+# ------------------------------------------------------------------------------
+#
+def get_queue(uid, queues):
+    '''
+    Return the queue out of `queues` which the object with the given uid is
+    sharded to.  The mapping is a stable hash of the uid, so that all messages
+    of one pipeline are sent through the same queue (and stay ordered), and is
+    the same in all processes.
+    '''
+
+    return queues[(zlib.crc32(uid) & 0xffffffff) % len(queues)]
+
+
+# ------------------------------------------------------------------------------
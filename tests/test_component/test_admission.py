@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+import time
+
+import threading as mt
+
+from radical.entk              import Task, Stage
+from radical.entk.execman.base import AdmissionControl
+
+
+# ------------------------------------------------------------------------------
+#
+def _tasks(n, processes=1, threads=1, gpus=0):
+
+    tasks = list()
+
+    for idx in range(n):
+
+        task = Task()
+        task.uid      = 'task.%04d' % idx
+        task.cpu_reqs = {'processes'          : processes,
+                         'process_type'       : None,
+                         'threads_per_process': threads,
+                         'thread_type'        : None}
+        task.gpu_reqs = {'processes'          : gpus,
+                         'process_type'       : None,
+                         'threads_per_process': 1,
+                         'thread_type'        : None}
+        tasks.append(task)
+
+    return tasks
+
+
+# ------------------------------------------------------------------------------
+#
+def test_admission_size():
+
+    task = _tasks(1, processes=4, threads=2, gpus=1)[0]
+    assert AdmissionControl.get_size(task) == (8, 1)
+    assert AdmissionControl.get_size(Task()) == (1, 0)
+
+    # the requirements shared by array tasks stay shared
+    template          = Task()
+    template.cpu_reqs = {'processes'          : 2,
+                         'process_type'       : None,
+                         'threads_per_process': 1,
+                         'thread_type'        : None}
+    stage             = Stage()
+    tasks             = stage.add_task_array(template, 2)
+
+    assert [AdmissionControl.get_size(t) for t in tasks] == [(2, 0), (2, 0)]
+    assert tasks[0]._cpu_reqs is tasks[1]._cpu_reqs
+    assert tasks[0]._gpu_reqs is tasks[1]._gpu_reqs
+
+
+# ------------------------------------------------------------------------------
+#
+def test_admission_window():
+
+    # no window: all tasks are admitted
+    admission = AdmissionControl(cpus=4, gpus=0, window=0)
+    assert admission.admit(_tasks(100)) == 100
+
+    # 2 x 4 cpus in flight
+    admission = AdmissionControl(cpus=4, gpus=0, window=2)
+    tasks     = _tasks(10, processes=2)
+
+    assert admission.admit(tasks)          == 4
+    assert admission.inflight              == 4
+    assert admission.admit(tasks[4:], 0.1) == 0
+
+    admission.release([tasks[0].uid, 'task.unknown'])
+    assert admission.admit(tasks[4:]) == 1
+
+    # tasks larger than the window are admitted if nothing is in flight
+    admission.release([task.uid for task in tasks[1:5]])
+    assert admission.inflight == 0
+
+    big = _tasks(2, processes=16)
+    assert admission.admit(big)          == 1
+    assert admission.admit(big[1:], 0.1) == 0
+
+    # gpu tasks are limited by the gpus of the pilot
+    admission = AdmissionControl(cpus=16, gpus=1, window=2)
+    assert admission.admit(_tasks(4, gpus=1)) == 2
+
+
+# ------------------------------------------------------------------------------
+#
+def test_admission_wait():
+
+    admission = AdmissionControl(cpus=1, gpus=0, window=1)
+    tasks     = _tasks(2)
+
+    assert admission.admit(tasks) == 1
+
+    def release():
+        time.sleep(0.1)
+        admission.release([tasks[0].uid])
+
+    thread = mt.Thread(target=release)
+    thread.start()
+
+    start = time.time()
+    assert admission.admit(tasks[1:], timeout=10) == 1
+    assert time.time() - start < 5
+
+    thread.join()
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    test_admission_size()
+    test_admission_window()
+    test_admission_wait()
+
+
+# ------------------------------------------------------------------------------
+
@@ -125,6 +125,7 @@ def test_amgr_read_config():
     assert amgr._num_completed_qs == 1
     assert amgr._rts_config       == {"sandbox_cleanup": False,
                                       "db_cleanup"     : False}
+    assert amgr._submit_window    == 2
 
     d = {"hostname"       : "radical.two",
          "port"           : 25672,
@@ -270,6 +271,46 @@ def test_amgr_run_mock():
     appman.run()
 
 
+# ------------------------------------------------------------------------------
+#
+def test_amgr_run_mock_twice():
+
+    def workflow():
+
+        p = Pipeline()
+        s = Stage()
+        t = Task()
+
+        t.executable = '/bin/sleep'
+        t.arguments  = ['1']
+        s.tasks      = t
+        p.add_stages(s)
+
+        return [p]
+
+    res_dict = {'resource': 'local.localhost',
+                'walltime': 5,
+                'cpus'    : 1,
+                'project' : ''}
+
+    appman = Amgr(rts='mock', transport='ipc', autoterminate=False)
+    appman.resource_desc = res_dict
+
+    # the second run reuses the WFprocessor of the first one, and must wait
+    # for its own pipelines to complete
+    try:
+        for _ in range(2):
+
+            pipes = workflow()
+            appman.workflow = pipes
+            appman.run()
+
+            assert [p.state for p in pipes] == [states.DONE]
+
+    finally:
+        appman.terminate()
+
+
 # ------------------------------------------------------------------------------
 #
 def test_amgr_resource_terminate():
@@ -388,9 +429,7 @@ def func_for_synchronizer_test(sid, p, tmgr):
 
     # FIXME: what is tested / asserted here?
 
-    mq_connection = pika.BlockingConnection(pika.ConnectionParameters(
-                                                      host=hostname, port=port))
-    mq_channel    = mq_connection.channel()
+    mq_channel = tmgr._transport.channel()
 
     for t in p.stages[0].tasks:
 
@@ -399,7 +438,7 @@ def func_for_synchronizer_test(sid, p, tmgr):
                                obj_type='Task',
                                channel=mq_channel,
                                queue='%s-tmgr-to-sync' % sid)
-    mq_connection.close()
+    mq_channel.close()
 
 
 # ------------------------------------------------------------------------------
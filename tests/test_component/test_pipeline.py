@@ -325,3 +325,28 @@ def test_pipeline_suspend_resume():
 
 # ------------------------------------------------------------------------------
 
+#
+def test_pipeline_get_stage():
+
+    p  = Pipeline()
+    s1 = Stage()
+    s2 = Stage()
+    p.add_stages([s1, s2])
+
+    assert p._get_stage('stage.0000') is None
+
+    p._assign_uid('test.get_stage')
+
+    assert p._get_stage(s1.uid) is s1
+    assert p._get_stage(s2.uid) is s2
+    assert p._get_stage('foo')  is None
+
+    # stages added at runtime get their uid later and are still found
+    s3 = Stage()
+    p.add_stages(s3)
+    s3._assign_uid('test.get_stage')
+
+    assert p._get_stage(s3.uid) is s3
+
+
+# ------------------------------------------------------------------------------
@@ -339,3 +339,191 @@ def test_stage_pass_uid():
 
 # ------------------------------------------------------------------------------
 
+#
+def test_stage_get_task():
+
+    s  = Stage()
+    t1 = Task()
+    t2 = Task()
+    s.add_tasks([t1, t2])
+
+    assert s._get_task('task.0000') is None
+
+    s._assign_uid('test.get_task')
+
+    assert s._get_task(t1.uid) is t1
+    assert s._get_task(t2.uid) is t2
+    assert s._get_task('foo')  is None
+
+    # tasks which receive their uid after being added are found, too
+    t3 = Task()
+    s.add_tasks(t3)
+    t3._uid = 'task.late'
+
+    assert s._get_task('task.late') is t3
+
+
+# ------------------------------------------------------------------------------
+#
+def test_stage_task_states():
+
+    s  = Stage()
+    t1 = Task()
+    t2 = Task()
+    t3 = Task()
+    s.add_tasks([t1, t2])
+
+    assert s.task_states == {states.INITIAL: 2}
+    assert s.progress    == 0.0
+
+    # adding a task twice does not count it twice
+    s.add_tasks([t2, t3])
+    assert s.task_states == {states.INITIAL: 3}
+
+    t1.state = states.DONE
+    t2.state = states.FAILED
+    assert s.task_states == {states.INITIAL: 1,
+                             states.DONE   : 1,
+                             states.FAILED : 1}
+    assert not s._check_stage_complete()
+
+    # state updates via from_dict are counted, too
+    t3.from_dict({'state': states.DONE})
+    assert s.task_states == {states.DONE: 2, states.FAILED: 1}
+    assert s.progress    == 1.0
+    assert s._check_stage_complete()
+
+    # tasks which are not part of the stage (anymore) are not counted
+    s.tasks = [t1, t2]
+    t3.state = states.INITIAL
+    assert s.task_states == {states.DONE: 1, states.FAILED: 1}
+    assert s._check_stage_complete()
+
+    # a task is counted by one stage only, so it can't be part of two stages
+    s2 = Stage()
+    with pytest.raises(ValueError):
+        s2.add_tasks(t1)
+    with pytest.raises(ValueError):
+        s2.tasks = [t1]
+
+    s2.add_tasks(t3)
+    assert s2.task_states == {states.INITIAL: 1}
+
+    # the tasks can only be changed via the stage's methods, which count them
+    s2.tasks.add(t1)
+    assert s2.tasks       == set([t3])
+    assert s2.task_states == {states.INITIAL: 1}
+
+
+# ------------------------------------------------------------------------------
+#
+def test_stage_add_task_array():
+
+    t = Task()
+    t.executable = '/bin/echo'
+    t.arguments  = ['hello']
+
+    s = Stage()
+
+    with pytest.raises(TypeError):
+        s.add_task_array('foo', 2)
+
+    with pytest.raises(ValueError):
+        s.add_task_array(t, 2, per_task_args=[{}])
+
+    with pytest.raises(ValueError):
+        s.add_task_array(t, 1, per_task_args=[{'foo': 1}])
+
+    with pytest.raises(ValueError):
+        s.add_task_array(t, 1, per_task_args=[{'luid': 'x'}])
+
+    with pytest.raises(TypeError):
+        s.add_task_array(t, 1, per_task_args=['foo'])
+
+    assert not s.tasks
+
+    tasks = s.add_task_array(t, 3, per_task_args=[{'name': 't%d' % i}
+                                                  for i in range(3)])
+    assert len(s.tasks) == 3
+    assert [task.name for task in tasks] == ['t0', 't1', 't2']
+    assert s.task_states == {states.INITIAL: 3}
+
+    # the tasks share the description until it is accessed for one of them
+    assert tasks[0]._arguments is tasks[1]._arguments
+
+    # changing the template does not affect the tasks
+    t.arguments.append('world')
+    for task in tasks:
+        assert task.executable == '/bin/echo'
+        assert task.arguments  == ['hello']
+
+    tasks[0].arguments.append('world')
+    assert tasks[0].arguments == ['hello', 'world']
+    assert tasks[1].arguments == ['hello']
+
+    s._assign_uid('test')
+    s._validate()
+    assert len(set([task.uid for task in tasks])) == 3
+
+    # tasks from an executed template are not executed themselves
+    t.state     = states.DONE
+    t.exit_code = 1
+    t.path      = '/old/sandbox'
+    t.rts_uid   = 'unit.0003'
+    for task in s.add_task_array(t, 2):
+        assert task.state == states.INITIAL
+        assert (task.exit_code, task.path, task.rts_uid) == (None, None, None)
+
+    # named templates give unique names to the tasks
+    t.name = 'sim'
+    tasks  = s.add_task_array(t, 2)
+    assert [task.name for task in tasks] == ['sim.0000', 'sim.0001']
+    assert t.name == 'sim'
+
+    # counts may be longs, but not negative
+    assert len(s.add_task_array(t, long(2))) == 2
+    assert s.add_task_array(t, 0) == []
+
+    with pytest.raises(ValueError):
+        s.add_task_array(t, -1)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_stage_shared_parents():
+
+    p = Pipeline()
+    p.name = 'p1'
+    s = Stage()
+    s.name = 's1'
+    t1 = Task()
+    t2 = Task()
+    s.add_tasks([t1, t2])
+    p.add_stages(s)
+
+    p._assign_uid('test')
+
+    # tasks share their parents' metadata
+    assert t1._p_stage is t2._p_stage
+    assert t1._p_pipeline is t2._p_pipeline is s._p_pipeline
+    assert t1.parent_stage == {'uid': s.uid, 'name': 's1'}
+    assert t1.parent_pipeline == {'uid': p.uid, 'name': 'p1'}
+
+    # luids are cached, and recomputed when the name changes
+    assert t1.luid == 'p1.s1.%s' % t1.uid
+    assert s.luid == 'p1.s1'
+    t1.name = 't1'
+    s.name = 's2'
+    assert t1.luid == 'p1.s1.t1'
+    assert s.luid == 'p1.s2'
+    s._pass_uid()
+    assert t1.luid == 'p1.s2.t1'
+
+    # tasks which were not added to a stage do not share their parents
+    t3 = Task()
+    t4 = Task()
+    t3.parent_stage['uid'] = 'foo'
+    assert t4.parent_stage['uid'] is None
+
+
+# ------------------------------------------------------------------------------
@@ -236,6 +236,7 @@ def test_task_to_dict():
                  'exit_code'            : None,
                  'path'                 : None,
                  'tag'                  : None,
+                 'rts_uid'              : None,
                  'parent_stage'         : {'uid' : None, 'name' : None},
                  'parent_pipeline'      : {'uid' : None, 'name' : None}}
 
@@ -263,6 +264,7 @@ def test_task_to_dict():
     t.exit_code                       = 1
     t.path                            = 'a/b/c'
     t.tag                             = 'task.0010'
+    t.rts_uid                         = 'unit.000000'
     t.parent_stage                    = {'uid': 's1', 'name': 'stage1'}
     t.parent_pipeline                 = {'uid': 'p1', 'name': 'pipeline1'}
 
@@ -297,6 +299,7 @@ def test_task_to_dict():
                  'exit_code'            : 1,
                  'path'                 : 'a/b/c',
                  'tag'                  : 'task.0010',
+                 'rts_uid'              : 'unit.000000',
                  'parent_stage'         : {'uid': 's1', 'name' : 'stage1'},
                  'parent_pipeline'      : {'uid': 'p1', 'name' : 'pipeline1'}}
 
@@ -333,6 +336,7 @@ def test_task_to_dict():
                  'exit_code'            : 1,
                  'path'                 : 'a/b/c',
                  'tag'                  : 'task.0010',
+                 'rts_uid'              : 'unit.000000',
                  'parent_stage'         : {'uid': 's1', 'name' : 'stage1'},
                  'parent_pipeline'      : {'uid': 'p1', 'name' : 'pipeline1'}}
 
@@ -375,6 +379,7 @@ def test_task_from_dict():
          'exit_code'            : 555,
          'path'                 : 'here/it/is',
          'tag'                  : 'task.0010',
+         'rts_uid'              : 'unit.000000',
          'parent_stage'         : {'uid': 's1', 'name' : 'stage1'},
          'parent_pipeline'      : {'uid': 'p1', 'name' : 'pipe1'}}
 
@@ -404,6 +409,7 @@ def test_task_from_dict():
     assert t.exit_code             == d['exit_code']
     assert t.path                  == d['path']
     assert t.tag                   == d['tag']
+    assert t.rts_uid               == d['rts_uid']
     assert t.parent_stage          == d['parent_stage']
     assert t.parent_pipeline       == d['parent_pipeline']
 
@@ -446,6 +452,68 @@ def test_task_validate():
         t._validate()
 
 
+# ------------------------------------------------------------------------------
+#
+def test_task_compact():
+
+    t1 = Task()
+    t2 = Task()
+
+    # no per-instance dict, no arbitrary attributes
+    assert not hasattr(t1, '__dict__')
+    with pytest.raises(AttributeError):
+        t1.foo = 'bar'
+
+    # default requirements are shared until they are changed
+    assert t1._cpu_reqs is t2._cpu_reqs
+    t1.cpu_reqs['processes'] = 4
+    assert t1.cpu_reqs['processes'] == 4
+    assert t2.cpu_reqs['processes'] == 1
+
+    t2.gpu_reqs = {'processes'          : 2,
+                   'process_type'       : None,
+                   'threads_per_process': 1,
+                   'thread_type'        : None}
+    assert t2.gpu_reqs['processes']    == 2
+    assert Task().gpu_reqs['processes'] == 0
+
+    # lists are allocated on first use
+    assert t1._copy_input_data is None
+    t1.copy_input_data.append('foo')
+    assert t1.copy_input_data      == ['foo']
+    assert t2.to_dict()['copy_input_data'] == list()
+    assert t2._copy_input_data is None
+
+
+# ------------------------------------------------------------------------------
+#
+def test_task_from_trusted_dict():
+
+    t = Task()
+    t.uid             = 'task.0000'
+    t.name            = 'foo'
+    t.executable      = '/bin/date'
+    t.arguments       = ['-u']
+    t.parent_stage    = {'uid': 'stage.0000',    'name': 's'}
+    t.parent_pipeline = {'uid': 'pipeline.0000', 'name': 'p'}
+    t.state           = states.SCHEDULED
+
+    copy = Task._from_trusted_dict(t.to_dict())
+    assert copy.to_dict() == t.to_dict()
+
+    # missing attributes have their default values
+    copy = Task._from_trusted_dict({'uid': 'task.0000'})
+    assert copy.uid           == 'task.0000'
+    assert copy.state         == states.INITIAL
+    assert copy.state_history == [states.INITIAL]
+
+    d = Task().to_dict()
+    del d['uid']
+    c = copy.to_dict()
+    del c['uid']
+    assert c == d
+
+
 # ------------------------------------------------------------------------------
 #
 if __name__ == '__main__':
@@ -457,6 +525,8 @@ if __name__ == '__main__':
     test_task_from_dict()
     test_task_assign_uid()
     test_task_validate()
+    test_task_compact()
+    test_task_from_trusted_dict()
 
 
 # ------------------------------------------------------------------------------
@@ -23,6 +23,7 @@ from radical.entk.execman.mock import TaskManager          as MockTmgr
 from radical.entk.execman.mock import ResourceManager      as MockRmgr
 from radical.entk              import exceptions           as ree
 from radical.entk              import Task, states
+from radical.entk.transport    import JSON_Codec
 
 
 hostname = os.environ.get('RMQ_HOSTNAME', 'localhost')
@@ -361,9 +362,9 @@ def func_for_mock_tmgr_test(mq_hostname, port, pending_queue, completed_queue):
         task = Task()
         task.state      = states.SCHEDULING
         task.executable = '/bin/echo'
-        tasks.append(task.to_dict())
+        tasks.append(task)
 
-    tasks_as_json = json.dumps(tasks)
+    tasks_as_json = json.dumps(JSON_Codec().pack_workload(tasks))
     mq_channel.basic_publish(exchange='',
                              routing_key=pending_queue,
                              body=tasks_as_json)
@@ -375,11 +376,11 @@ def func_for_mock_tmgr_test(mq_hostname, port, pending_queue, completed_queue):
         if not body:
             continue
 
-        task = Task()
-        task.from_dict(json.loads(body))
+        # the completed queue carries state updates of the tasks
+        for update in json.loads(body):
 
-        if task.state == states.DONE:
-            cnt += 1
+            if update['state'] == states.DONE:
+                cnt += 1
 
         mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
 
@@ -10,6 +10,7 @@ import radical.utils   as ru
 from radical.entk.execman.rp import TaskManager     as RPTmgr
 from radical.entk.execman.rp import ResourceManager as RPRmgr
 from radical.entk            import Task, states
+from radical.entk.transport  import JSON_Codec
 
 hostname =     os.environ.get('RMQ_HOSTNAME', 'localhost')
 port     = int(os.environ.get('RMQ_PORT',     5672))
@@ -32,9 +33,9 @@ def func_for_mock_tmgr_test(mq_hostname, port, pending_queue, completed_queue):
         t.state      = states.SCHEDULING
         t.executable = '/bin/echo'
         print t.to_dict()
-        tasks.append(t.to_dict())
+        tasks.append(t)
 
-    tasks_as_json = json.dumps(tasks)
+    tasks_as_json = json.dumps(JSON_Codec().pack_workload(tasks))
     mq_channel.basic_publish(exchange='',
                              routing_key=pending_queue,
                              body=tasks_as_json)
@@ -46,11 +47,11 @@ def func_for_mock_tmgr_test(mq_hostname, port, pending_queue, completed_queue):
         if not body:
             continue
 
-        task = Task()
-        task.from_dict(json.loads(body))
+        # the completed queue carries state updates of the tasks
+        for update in json.loads(body):
 
-        if task.state == states.DONE:
-            cnt += 1
+            if update['state'] == states.DONE:
+                cnt += 1
 
         mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
 
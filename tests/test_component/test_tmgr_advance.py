@@ -29,13 +29,11 @@ def func(obj, obj_type, new_state, queue1):
                     port=port,
                     rts=None)
 
-    mq_connection = pika.BlockingConnection(pika.ConnectionParameters(
-                                                      host=hostname, port=port))
-    mq_channel = mq_connection.channel()
+    mq_channel = tmgr._transport.channel()
 
     tmgr._advance(obj, obj_type, new_state, mq_channel, queue1)
 
-    mq_connection.close()
+    mq_channel.close()
 
 
 # ------------------------------------------------------------------------------
@@ -62,7 +60,7 @@ def master(obj, obj_type, new_state):
         if body:
 
             msg = json.loads(body)
-            assert msg['object']['state'] == new_state
+            assert msg['objects'][0]['state'] == new_state
 
             nprops = pika.BasicProperties(correlation_id=props.correlation_id)
             mq_channel.basic_publish(exchange='',
@@ -89,4 +87,78 @@ def test_utils_sync_with_master():
 
 
 # ------------------------------------------------------------------------------
+#
+def func_bulk(objs, new_state, queue1):
+
+    hostname = os.environ.get('RMQ_HOSTNAME', 'localhost')
+    port = int(os.environ.get('RMQ_PORT', 5672))
 
+    sid  = 'test.0013'
+    rmgr = BaseRmgr({}, sid, None, {})
+    tmgr = BaseTmgr(sid=sid,
+                    pending_queue=['pending-1'],
+                    completed_queue=['completed-1'],
+                    rmgr=rmgr,
+                    mq_hostname=hostname,
+                    port=port,
+                    rts=None)
+    tmgr._sync_size = 2
+
+    mq_channel = tmgr._transport.channel()
+
+    tmgr._advance_bulk(objs, 'Task', new_state, mq_channel, queue1)
+
+    mq_channel.close()
+
+
+# ------------------------------------------------------------------------------
+#
+def test_tmgr_advance_bulk():
+
+    hostname = os.environ.get('RMQ_HOSTNAME', 'localhost')
+    port = int(os.environ.get('RMQ_PORT', 5672))
+
+    mq_connection = pika.BlockingConnection(pika.ConnectionParameters(
+                                                      host=hostname, port=port))
+    mq_channel = mq_connection.channel()
+
+    queue1 = 'test-1-2-3'       # Expected queue name structure 'X-A-B-C'
+    queue2 = 'test-3-2-1'       # Expected queue name structure 'X-C-B-A'
+    mq_channel.queue_declare(queue=queue1)
+    mq_channel.queue_declare(queue=queue2)
+
+    tasks   = [Task() for _ in range(3)]
+    thread1 = mt.Thread(target=func_bulk,
+                        args=(tasks, states.SUBMITTING, queue1))
+    thread1.start()
+
+    # 3 tasks in messages of 2 tasks each: expect 2 messages, in order
+    msgs = list()
+    while len(msgs) < 2:
+        method_frame, props, body = mq_channel.basic_get(queue=queue1)
+        if body:
+            msgs.append(json.loads(body))
+            mq_channel.basic_ack(delivery_tag=method_frame.delivery_tag)
+
+    # a single (cumulative) ack for the last message releases the bulk
+    nprops = pika.BasicProperties(correlation_id=props.correlation_id)
+    mq_channel.basic_publish(exchange='',
+                             routing_key=queue2,
+                             properties=nprops,
+                             body='ack')
+    thread1.join()
+
+    uids = [obj['uid'] for msg in msgs for obj in msg['objects']]
+    assert uids == [task.uid for task in tasks]
+
+    for msg in msgs:
+        assert msg['type'] == 'Task'
+        for obj in msg['objects']:
+            assert obj['state'] == states.SUBMITTING
+
+    mq_channel.queue_delete(queue=queue1)
+    mq_channel.queue_delete(queue=queue2)
+    mq_connection.close()
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+
+import os
+import time
+import Queue
+import pytest
+
+import threading       as mt
+import multiprocessing as mp
+
+import radical.pilot   as rp
+
+from radical.entk                           import Task, states
+from radical.entk.exceptions                import EnTKError
+from radical.entk.transport                 import IPC_Transport
+from radical.entk.execman.base              import AdmissionControl
+from radical.entk.execman.base              import Base_ResourceManager
+from radical.entk.execman.rp                import TaskManager
+from radical.entk.execman.rp.task_processor import Placeholders
+
+# pylint: disable=protected-access
+
+
+# ------------------------------------------------------------------------------
+#
+class Tmgr(TaskManager):
+    '''
+    An RP TaskManager which records the syncs and pushes to the completed
+    queue in `events` (and the threads they happen in in `threads`), instead
+    of communicating with an AppManager.
+    '''
+
+    def __init__(self):
+
+        sid = 'test.tmgr.rp'
+        TaskManager.__init__(self, sid=sid,
+                             pending_queue=['%s-pendingq-1' % sid],
+                             completed_queue=['%s-completedq-1' % sid],
+                             rmgr=Base_ResourceManager({}, sid, None, {}),
+                             rmq_conn_params=None,
+                             transport=IPC_Transport())
+
+        self.events          = list()
+        self.threads         = set()
+        self._tmgr_terminate = mp.Event()
+        self._admission      = AdmissionControl(1, 0, None)
+
+    def _advance_bulk(self, objs, obj_type, new_state, channel, queue):
+
+        for obj in objs:
+            obj.state = new_state
+
+        self.events.append(('sync', new_state, [obj.uid for obj in objs]))
+        self.threads.add(mt.current_thread().name)
+
+    def _publish_completed(self, tasks, channel):
+
+        self.events.append(('publish', [task.uid for task in tasks]))
+        self.threads.add(mt.current_thread().name)
+
+
+# ------------------------------------------------------------------------------
+#
+class UnitManager(object):
+    '''
+    A UnitManager which records the submission of units in the `events` of
+    the TaskManager.
+    '''
+
+    def __init__(self, events):
+
+        self.events    = events
+        self.callbacks = list()
+
+    def register_callback(self, cb):
+
+        self.callbacks.append(cb)
+
+    def submit_units(self, cuds):
+
+        self.events.append(('submit', [cud.name.split(',')[0]
+                                       for cud in cuds]))
+
+
+# ------------------------------------------------------------------------------
+#
+def _tasks(n):
+
+    tasks = list()
+
+    for idx in range(n):
+
+        task                 = Task()
+        task.uid             = 'task.%04d' % idx
+        task.name            = 't%d' % idx
+        task.executable      = '/bin/date'
+        task.state           = states.SCHEDULED
+        task.parent_stage    = {'uid': 'stage.0000',    'name': 's'}
+        task.parent_pipeline = {'uid': 'pipeline.0000', 'name': 'p'}
+        tasks.append(task)
+
+    return tasks
+
+
+# ------------------------------------------------------------------------------
+#
+def _start(tmgr, umgr):
+    '''
+    Run the task processing of `tmgr` on `umgr` in a thread, and return the
+    queue to pass workloads to it.
+    '''
+
+    def create_umgr(rmgr, unit_state_cb):
+        umgr.register_callback(unit_state_cb)
+        return umgr
+
+    task_queue = Queue.Queue()
+
+    tmgr._create_umgr       = create_umgr
+    tmgr._rmq_ping_interval = 0.1
+    tmgr._rts_runner        = mt.Thread(target=tmgr._process_tasks,
+                                        args=(task_queue, tmgr._rmgr))
+    tmgr._rts_runner.start()
+
+    return task_queue
+
+
+# ------------------------------------------------------------------------------
+#
+def _wait(cond, timeout=10):
+
+    start = time.time()
+    while not cond():
+        assert time.time() - start < timeout
+        time.sleep(0.01)
+
+
+# ------------------------------------------------------------------------------
+#
+class Unit(object):
+    '''
+    A final RP unit of the task with index `idx`.
+    '''
+
+    def __init__(self, idx, state=rp.DONE, name=None):
+
+        self.uid     = 'unit.%06d' % idx
+        self.state   = state
+        self.sandbox = 'file://localhost/tmp/%s/' % self.uid
+        self.name    = name or 'task.%04d,t%d,stage.0000,s,pipeline.0000,p' \
+                               % (idx, idx)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_tmgr_rp_publisher_drain():
+
+    tmgr      = Tmgr()
+    completed = Queue.Queue()
+
+    for idx in range(3):
+        completed.put(Unit(idx))
+
+    # units received before termination are still published
+    tmgr._tmgr_terminate.set()
+    tmgr._publish_completions(completed, Placeholders(), mt.Event())
+
+    uids = ['task.0000', 'task.0001', 'task.0002']
+    assert tmgr.events == [('sync', states.COMPLETED, uids),
+                           ('publish', uids)]
+
+
+# ------------------------------------------------------------------------------
+#
+def test_tmgr_rp_publisher_died():
+
+    tmgr = Tmgr()
+
+    tmgr._publisher = mt.Thread(target=lambda: None)
+    tmgr._publisher.start()
+    tmgr._publisher.join()
+
+    # nothing would release the tasks in flight: don't submit more
+    with pytest.raises(EnTKError):
+        tmgr._submit([Task()], [rp.ComputeUnitDescription()], None,
+                     tmgr._transport.channel())
+
+    assert tmgr.events == []
+
+
+# ------------------------------------------------------------------------------
+#
+def test_tmgr_rp_submit_chunks():
+
+    os.environ['ENTK_SUBMIT_CHUNK'] = '2'
+    try:
+        tmgr = Tmgr()
+    finally:
+        del os.environ['ENTK_SUBMIT_CHUNK']
+
+    assert tmgr._submit_chunk == 2
+
+    umgr       = UnitManager(tmgr.events)
+    task_queue = _start(tmgr, umgr)
+
+    try:
+        task_queue.put(tmgr._codec.pack_workload(_tasks(5)))
+        _wait(lambda: len(tmgr.events) == 6)
+
+    finally:
+        tmgr._tmgr_terminate.set()
+        tmgr._rts_runner.join()
+
+    # the chunks are submitted in order, each after its tasks were synced
+    chunks = [['task.0000', 'task.0001'],
+              ['task.0002', 'task.0003'],
+              ['task.0004']]
+    events = list()
+    for chunk in chunks:
+        events.append(('sync', states.SUBMITTING, chunk))
+        events.append(('submit', chunk))
+
+    assert tmgr.events == events
+
+
+# ------------------------------------------------------------------------------
+#
+def test_tmgr_rp_unit_state_cb():
+
+    tmgr = Tmgr()
+    umgr = UnitManager(tmgr.events)
+
+    _start(tmgr, umgr)
+
+    try:
+        _wait(lambda: umgr.callbacks)
+        unit_state_cb = umgr.callbacks[0]
+
+        units = [Unit(0), Unit(1, state=rp.FAILED)]
+
+        for unit in units:
+            unit_state_cb(unit, rp.AGENT_EXECUTING)
+
+        for unit in units:
+            unit_state_cb(unit, unit.state)
+
+        _wait(lambda: sum([len(e[1]) for e in tmgr.events
+                                     if e[0] == 'publish']) == 2)
+
+    finally:
+        tmgr._tmgr_terminate.set()
+        tmgr._rts_runner.join()
+
+    # only final units are published, and the callback only enqueues them:
+    # conversion, sync and push happen in the publisher thread
+    published = [uid for e in tmgr.events if e[0] == 'publish' for uid in e[1]]
+    assert published    == ['task.0000', 'task.0001']
+    assert tmgr.threads == set(['completion-publisher'])
+
+
+# ------------------------------------------------------------------------------
+#
+def test_tmgr_rp_publish_placeholders():
+
+    placeholders = Placeholders()
+    known        = list()
+
+    class Checked(Tmgr):
+
+        def _advance_bulk(self, objs, obj_type, new_state, channel, queue):
+            known.append(sorted(placeholders['p']['s']))
+            Tmgr._advance_bulk(self, objs, obj_type, new_state, channel, queue)
+
+        def _publish_completed(self, tasks, channel):
+            known.append(sorted(placeholders['p']['s']))
+            Tmgr._publish_completed(self, tasks, channel)
+
+    tmgr      = Checked()
+    completed = Queue.Queue()
+
+    # a unit which can't be converted is skipped, the others of its bulk are
+    # still published
+    for unit in [Unit(0), Unit(1, name='task.0001'), Unit(2)]:
+        completed.put(unit)
+
+    tmgr._tmgr_terminate.set()
+    tmgr._publish_completions(completed, placeholders, mt.Event())
+
+    uids = ['task.0000', 'task.0002']
+    assert tmgr.events == [('sync', states.COMPLETED, uids),
+                           ('publish', uids)]
+
+    # the placeholders are added before the tasks are synced and pushed
+    assert known == [['t0', 't2'], ['t0', 't2']]
+    assert placeholders['p']['s']['t2']['rts_uid'] == 'unit.000002'
+
+
+# ------------------------------------------------------------------------------
+#
+def test_tmgr_rp_publish_release():
+
+    tmgr      = Tmgr()
+    completed = Queue.Queue()
+    tasks     = _tasks(3)
+
+    tmgr._admission = AdmissionControl(cpus=1, gpus=0, window=3)
+    assert tmgr._admission.admit(tasks) == 3
+
+    # units which can't be converted release their tasks, too
+    for unit in [Unit(0), Unit(1, name='task.0001')]:
+        completed.put(unit)
+
+    tmgr._tmgr_terminate.set()
+    tmgr._publish_completions(completed, Placeholders(), mt.Event())
+
+    assert tmgr._admission.inflight == 1
+    assert tmgr.events[-1] == ('publish', ['task.0000'])
+
+
+# ------------------------------------------------------------------------------
+#
+if __name__ == '__main__':
+
+    test_tmgr_rp_publisher_drain()
+    test_tmgr_rp_publisher_died()
+    test_tmgr_rp_submit_chunks()
+    test_tmgr_rp_unit_state_cb()
+    test_tmgr_rp_publish_placeholders()
+    test_tmgr_rp_publish_release()
+
+
+# ------------------------------------------------------------------------------
+
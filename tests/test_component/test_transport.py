@@ -0,0 +1,290 @@
+import json
+import pytest
+
+import threading       as mt
+import multiprocessing as mp
+
+from radical.entk import states
+from radical.entk import Task
+
+from radical.entk.transport    import IPC_Transport, ZMQ_Transport
+from radical.entk.execman.base import Base_TaskManager     as BaseTmgr
+from radical.entk.execman.base import Base_ResourceManager as BaseRmgr
+
+
+# ------------------------------------------------------------------------------
+#
+def _transport(name):
+
+    if name == 'zmq':
+        pytest.importorskip('zmq')
+        return ZMQ_Transport()
+
+    return IPC_Transport()
+
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.parametrize('name', ['ipc', 'zmq'])
+def test_transport(name):
+
+    transport = _transport(name)
+    transport.declare(['test-1-2-3'])
+
+    channel = transport.channel()
+    assert channel.is_open
+
+    channel.publish('test-1-2-3', 'msg-1', 'corr-1')
+    channel.publish('test-1-2-3', 'msg-2')
+
+    got = list()
+    channel.consume('test-1-2-3', lambda body, corr_id: got.append((body,
+                                                                    corr_id)))
+    while len(got) < 2:
+        channel.process(0.1)
+
+    assert got == [('msg-1', 'corr-1'), ('msg-2', None)]
+    assert channel.get('test-1-2-3') == (None, None)
+
+    channel.close()
+    assert not channel.is_open
+
+    transport.delete(['test-1-2-3'])
+
+
+# ------------------------------------------------------------------------------
+#
+def test_ipc_transport_unknown():
+
+    channel = IPC_Transport().channel()
+
+    with pytest.raises(KeyError):
+        channel.publish('unknown', 'msg')
+
+
+# ------------------------------------------------------------------------------
+#
+def test_ipc_transport_purge():
+
+    transport = IPC_Transport()
+    transport.declare(['test-1-2-3'])
+
+    channel = transport.channel()
+    channel.publish('test-1-2-3', 'msg-1')
+    channel.sleep(0.1)
+
+    # deleted queues stay usable, they only lose their messages
+    transport.delete(['test-1-2-3'])
+    assert channel.get('test-1-2-3') == (None, None)
+
+    channel.publish('test-1-2-3', 'msg-2')
+    channel.sleep(0.1)
+    assert channel.get('test-1-2-3') == ('msg-2', None)
+
+
+# ------------------------------------------------------------------------------
+#
+def _get(channel, queue):
+
+    while True:
+        body, corr_id = channel.get(queue)
+        if body:
+            return body, corr_id
+        channel.sleep(0.1)
+
+
+def _echo(transport):
+
+    channel = transport.channel()
+    channel.publish('test-3-2-1', *_get(channel, 'test-1-2-3'))
+    channel.close()
+
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.parametrize('name', ['ipc', 'zmq'])
+def test_transport_fork(name):
+
+    transport = _transport(name)
+    transport.declare(['test-1-2-3', 'test-3-2-1'])
+
+    proc = mp.Process(target=_echo, args=(transport,))
+    proc.start()
+
+    channel = transport.channel()
+    channel.publish('test-1-2-3', 'msg', 'corr')
+    assert _get(channel, 'test-3-2-1') == ('msg', 'corr')
+
+    channel.close()
+    proc.join()
+    transport.delete(['test-1-2-3', 'test-3-2-1'])
+
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.parametrize('name', ['ipc', 'zmq'])
+def test_transport_sync(name):
+
+    queue1    = 'test-1-2-3'       # Expected queue name structure 'X-A-B-C'
+    queue2    = 'test-3-2-1'       # Expected queue name structure 'X-C-B-A'
+    transport = _transport(name)
+    transport.declare([queue1, queue2])
+
+    sid  = 'test.0016'
+    rmgr = BaseRmgr({}, sid, None, {})
+    tmgr = BaseTmgr(sid=sid,
+                    pending_queue=['pending-1'],
+                    completed_queue=['completed-1'],
+                    rmgr=rmgr,
+                    rmq_conn_params=None,
+                    rts=None,
+                    transport=transport)
+
+    tasks  = [Task() for _ in range(10)]
+    synced = list()
+
+    # ack each sync message like the AppManager's synchronizer does
+    def master():
+
+        channel = transport.channel()
+
+        def sync(body, corr_id):
+            msg = json.loads(body)
+            synced.extend([obj['uid'] for obj in msg['objects']])
+            channel.publish(queue2, '%s-ack' % msg['objects'][-1]['uid'],
+                            corr_id)
+
+        channel.consume(queue1, sync)
+        while len(synced) < len(tasks):
+            channel.process(0.1)
+
+        channel.close()
+
+    thread = mt.Thread(target=master)
+    thread.start()
+
+    mq_channel = tmgr._transport.channel()
+    tmgr._advance_bulk(tasks, 'Task', states.SUBMITTING, mq_channel, queue1)
+    mq_channel.close()
+
+    thread.join()
+
+    assert synced == [task.uid for task in tasks]
+    for task in tasks:
+        assert task.state == states.SUBMITTING
+
+    transport.delete([queue1, queue2])
+
+
+# ------------------------------------------------------------------------------
+#
+def test_codec():
+
+    from radical.entk.transport import get_codec, JSON_Codec, MsgPack_Codec
+
+    with pytest.raises(ValueError):
+        get_codec('bogus')
+
+    assert isinstance(get_codec('json'), JSON_Codec)
+
+    pytest.importorskip('msgpack')
+    codec = get_codec('msgpack')
+    assert isinstance(codec, MsgPack_Codec)
+
+    task            = Task()
+    task.uid        = 'task.0000'
+    task.name       = 'foo'
+    task.executable = '/bin/date'
+    task.arguments  = ['-u']
+    task.state      = states.SCHEDULED
+    task.rts_uid    = 'unit.0000'
+
+    # only the attributes which differ from their defaults are sent
+    packed = codec.pack_task(task)
+    assert len(packed) == 6
+
+    msg  = codec.loads(codec.dumps({'type': 'Task', 'objects': [packed]}))
+    copy = codec.unpack_task(msg['objects'][0])
+
+    expected = task.to_dict()
+    got      = copy.to_dict()
+    del expected['state_history']
+    del got['state_history']
+    assert got == expected
+
+
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+#
+def test_codec_state():
+
+    from radical.entk.transport import JSON_Codec
+
+    task                 = Task()
+    task.uid             = 'task.0000'
+    task.parent_stage    = {'uid': 'stage.0000',    'name': 's'}
+    task.parent_pipeline = {'uid': 'pipeline.0000', 'name': 'p'}
+    task.state           = states.COMPLETED
+
+    # unset attributes are not part of a state update
+    assert JSON_Codec().pack_state(task) == {'uid'     : 'task.0000',
+                                             'state'   : states.COMPLETED,
+                                             'stage'   : 'stage.0000',
+                                             'pipeline': 'pipeline.0000'}
+
+    task.exit_code = 0
+    task.path      = '/tmp/task.0000'
+    task.rts_uid   = 'unit.0000'
+
+    update = JSON_Codec().pack_state(task)
+    assert update['exit_code'] == 0
+    assert update['path']      == '/tmp/task.0000'
+    assert update['rts_uid']   == 'unit.0000'
+
+
+# ------------------------------------------------------------------------------
+
+# ------------------------------------------------------------------------------
+#
+@pytest.mark.parametrize('name', ['json', 'msgpack'])
+def test_codec_workload(name):
+
+    from radical.entk           import Stage
+    from radical.entk.transport import get_codec
+
+    if name == 'msgpack':
+        pytest.importorskip('msgpack')
+
+    codec = get_codec(name)
+
+    template            = Task()
+    template.executable = '/bin/echo'
+    template.pre_exec   = ['module load foo']
+
+    stage = Stage()
+    array = stage.add_task_array(template, 4,
+                                 per_task_args=[{'arguments': [str(i)]}
+                                                for i in range(4)])
+    other            = Task()
+    other.executable = '/bin/date'
+    stage.add_tasks(other)
+    stage._assign_uid('test')
+
+    tasks = array + [other]
+    msg   = codec.loads(codec.dumps(codec.pack_workload(tasks)))
+
+    # the template is sent once, the tasks only carry their differences
+    assert len(msg['templates']) == 1
+    assert 'pre_exec' not in str(msg['tasks'][0])
+
+    for task, copy in zip(tasks, codec.unpack_workload(msg)):
+        assert copy.uid        == task.uid
+        assert copy.executable == task.executable
+        assert copy.pre_exec   == task.pre_exec
+        assert copy.arguments  == task.arguments
+        assert copy.parent_stage['uid'] == task.parent_stage['uid']
+
+
+# ------------------------------------------------------------------------------
+
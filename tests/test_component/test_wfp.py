@@ -1,6 +1,7 @@
 
 import os
 import json
+import time
 import pika
 
 from hypothesis import given, settings, strategies as st
@@ -9,6 +10,7 @@ import threading as mt
 from radical.entk.appman.wfprocessor import WFprocessor
 from radical.entk                    import AppManager as Amgr
 from radical.entk                    import Pipeline, Stage, Task, states
+from radical.entk.transport          import IPC_Transport, JSON_Codec
 
 
 hostname =     os.environ.get('RMQ_HOSTNAME', 'localhost')
@@ -203,7 +205,7 @@ def test_wfp_dequeue():
     for t in p.stages[0].tasks:
         t.state = states.COMPLETED
 
-    task_as_dict  = json.dumps(t.to_dict())
+    task_as_dict  = json.dumps([JSON_Codec().pack_state(t)])
     mq_connection = pika.BlockingConnection(pika.ConnectionParameters(
                                           host=amgr._hostname, port=amgr._port))
     mq_channel    = mq_connection.channel()
@@ -254,7 +256,7 @@ def test_wfp_start_processor():
     wfp.start_processor()
 
     assert wfp._enqueue_thread
-    assert wfp._dequeue_thread
+    assert wfp._dequeue_threads
 
     assert not wfp._enqueue_thread_terminate.is_set()
     assert not wfp._dequeue_thread_terminate.is_set()
@@ -289,7 +291,7 @@ def test_wfp_terminate_processor():
     wfp.terminate_processor()
 
     assert not wfp._enqueue_thread
-    assert not wfp._dequeue_thread
+    assert not wfp._dequeue_threads
 
     assert wfp._enqueue_thread_terminate.is_set()
     assert wfp._dequeue_thread_terminate.is_set()
@@ -326,7 +328,7 @@ def test_wfp_workflow_incomplete():
     for t in p.stages[0].tasks:
         t.state = states.COMPLETED
 
-    task_as_dict  = json.dumps(t.to_dict())
+    task_as_dict  = json.dumps([JSON_Codec().pack_state(t)])
     mq_connection = pika.BlockingConnection(pika.ConnectionParameters(
                                           host=amgr._hostname, port=amgr._port))
     mq_channel    = mq_connection.channel()
@@ -378,3 +380,126 @@ def test_wfp_check_processor():
 
 # ------------------------------------------------------------------------------
 
+#
+def test_wfp_ready_set():
+
+    pipes = list()
+    for _ in range(3):
+        p = Pipeline()
+        s = Stage()
+        t = Task()
+        t.executable = '/bin/date'
+        s.add_tasks(t)
+        p.add_stages(s)
+        pipes.append(p)
+
+    wfp = WFprocessor(sid='test.ready',
+                      workflow=pipes,
+                      pending_queue=list(),
+                      completed_queue=list(),
+                      resubmit_failed=False,
+                      rmq_conn_params=None,
+                      transport=IPC_Transport())
+    wfp.initialize_workflow()
+    wfp._rescan_interval = 0.1
+
+    # ready pipelines are returned in workflow order, only once
+    wfp._set_ready([pipes[2], pipes[0]])
+    assert wfp._get_ready() == [pipes[0], pipes[2]]
+
+    # nothing got ready: all pipelines are rescanned after the interval
+    assert wfp._get_ready() == pipes
+
+    # only tasks of ready pipelines are scheduled
+    workload, stages = wfp._create_workload([pipes[1]])
+    assert workload == list(pipes[1].stages[0].tasks)
+    assert stages   == [pipes[1].stages[0]]
+    assert pipes[0].state == states.INITIAL
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_dequeue_bulk():
+
+    pipes = list()
+    for _ in range(2):
+        p = Pipeline()
+        s = Stage()
+        for _ in range(2):
+            t = Task()
+            t.executable = '/bin/date'
+            s.add_tasks(t)
+        p.add_stages(s)
+        pipes.append(p)
+
+    wfp = WFprocessor(sid='test.bulk',
+                      workflow=pipes,
+                      pending_queue=list(),
+                      completed_queue=list(),
+                      resubmit_failed=False,
+                      rmq_conn_params=None,
+                      transport=IPC_Transport())
+    wfp.initialize_workflow()
+    wfp._create_workload()
+
+    # completions of both pipelines arrive interleaved in one message
+    updates = list()
+    for ts in zip(*[list(p.stages[0].tasks) for p in pipes]):
+        for t in ts:
+            update = JSON_Codec().pack_state(t)
+            update['state'] = states.COMPLETED
+            updates.append(update)
+
+    wfp._update_dequeued_tasks(updates)
+
+    for p in pipes:
+        assert p.state           == states.DONE
+        assert p.stages[0].state == states.DONE
+        for t in p.stages[0].tasks:
+            assert t.state == states.DONE
+
+
+# ------------------------------------------------------------------------------
+#
+def test_wfp_wait_workflow():
+
+    pipes = list()
+    for _ in range(2):
+        p = Pipeline()
+        s = Stage()
+        t = Task()
+        t.executable = '/bin/date'
+        s.add_tasks(t)
+        p.add_stages(s)
+        pipes.append(p)
+
+    wfp = WFprocessor(sid='test.wait',
+                      workflow=pipes,
+                      pending_queue=list(),
+                      completed_queue=list(),
+                      resubmit_failed=False,
+                      rmq_conn_params=None,
+                      transport=IPC_Transport())
+    wfp.initialize_workflow()
+    wfp._create_workload()
+
+    assert wfp.workflow_incomplete()
+    assert not wfp.wait_workflow(0.1)
+
+    def complete(p):
+        task = list(p.stages[0].tasks)[0]
+        wfp._update_dequeued_tasks([JSON_Codec().pack_state(task)])
+
+    # the first completion wakes up the waiting thread
+    mt.Timer(0.1, complete, args=(pipes[0],)).start()
+    start = time.time()
+    assert not wfp.wait_workflow(10)
+    assert time.time() - start < 5
+    assert wfp.workflow_incomplete()
+
+    complete(pipes[1])
+    assert wfp.wait_workflow(0)
+    assert not wfp.workflow_incomplete()
+
+
+# ------------------------------------------------------------------------------
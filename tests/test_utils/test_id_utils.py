@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+import shutil
+
+import threading     as mt
+import radical.utils as ru
+
+from radical.entk.utils import generate_ids
+from radical.entk.utils import id_utils
+
+# pylint: disable=protected-access
+
+
+# ------------------------------------------------------------------------------
+#
+def test_generate_ids():
+
+    sid    = ru.generate_id('test.ids', ru.ID_UNIQUE)
+    prefix = 'task.%(item_counter)04d'
+
+    try:
+        assert generate_ids(prefix, 0, sid) == []
+        assert generate_ids(prefix, 3, sid) == ['task.0000', 'task.0001',
+                                                'task.0002']
+
+        # bulk and single allocations share the counter
+        assert ru.generate_id(prefix, ru.ID_CUSTOM, namespace=sid) \
+                                            == 'task.0003'
+        assert generate_ids(prefix, 2, sid) == ['task.0004', 'task.0005']
+
+    finally:
+        shutil.rmtree('%s/%s' % (ru.get_radical_base('utils'), sid))
+
+
+# ------------------------------------------------------------------------------
+#
+def test_generate_ids_interleaved():
+
+    sid    = ru.generate_id('test.ids', ru.ID_UNIQUE)
+    prefix = 'task.%(item_counter)06d'
+    uids   = list()
+    lock   = mt.Lock()
+
+    def allocate(bulk):
+        for _ in range(50):
+            if bulk: new = generate_ids(prefix, 7, sid)
+            else   : new = [ru.generate_id(prefix, ru.ID_CUSTOM, namespace=sid)]
+            with lock:
+                uids.extend(new)
+
+    try:
+        # the counter file is checked on first use, before the bulk allocations
+        uids.extend(generate_ids(prefix, 1, sid))
+        assert id_utils._shared_counter[(sid, prefix)]
+
+        threads = [mt.Thread(target=allocate, args=(i % 2,)) for i in range(8)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+
+        # no uid is handed out twice, and none is skipped
+        assert len(uids) == 1 + 4 * 50 * 7 + 4 * 50
+        assert sorted(uids) == [prefix % {'item_counter': i}
+                                for i in range(len(uids))]
+
+    finally:
+        shutil.rmtree('%s/%s' % (ru.get_radical_base('utils'), sid))
+
+
+# ------------------------------------------------------------------------------
+#
+def test_generate_ids_fallback():
+
+    sid    = ru.generate_id('test.ids', ru.ID_UNIQUE)
+    prefix = 'task.%(item_counter)04d'
+
+    # if radical.utils does not use the expected counter file, all uids are
+    # generated by radical.utils
+    id_utils._shared_counter[(sid, prefix)] = False
+
+    try:
+        assert generate_ids(prefix, 2, sid) == ['task.0000', 'task.0001']
+        assert ru.generate_id(prefix, ru.ID_CUSTOM, namespace=sid) \
+                                            == 'task.0002'
+
+    finally:
+        del id_utils._shared_counter[(sid, prefix)]
+        shutil.rmtree('%s/%s' % (ru.get_radical_base('utils'), sid))
+
+
+# ------------------------------------------------------------------------------
+
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+
+from radical.entk       import Task, states
+from radical.entk.utils import Profiler, Progress
+
+
+# ------------------------------------------------------------------------------
+#
+def test_profiler_bulk():
+
+    path = tempfile.mkdtemp()
+    os.environ['RADICAL_ENTK_TEST_PROFILE'] = 'True'
+
+    try:
+        prof  = Profiler('radical.entk.test', path=path, bulk=4)
+        fname = '%s/radical.entk.test.prof' % path
+
+        def events():
+            with open(fname) as fin:
+                return [line.split(',')[1] for line in fin
+                                           if not line.startswith('#')]
+
+        prof.prof('one', uid='task.0000')
+        prof.prof('two', uid=['task.0000', 'task.0001'])
+        assert events() == ['sync_abs']
+
+        prof.prof('three')
+        assert events() == ['sync_abs', 'one', 'two', 'two', 'three']
+
+        prof.prof('four')
+        prof.close()
+        assert events() == ['sync_abs', 'one', 'two', 'two', 'three', 'four',
+                            'END']
+
+    finally:
+        del os.environ['RADICAL_ENTK_TEST_PROFILE']
+        shutil.rmtree(path)
+
+
+# ------------------------------------------------------------------------------
+#
+def test_progress():
+
+    class Reporter(object):
+
+        def __init__(self):
+            self.lines = list()
+
+        def ok(self, msg):
+            pass
+
+        def info(self, msg):
+            self.lines.append(msg)
+
+    report   = Reporter()
+    progress = Progress(report, interval=3600)
+
+    task = Task()
+    task.parent_pipeline = {'uid': 'pipeline.0000', 'name': 'p'}
+    task.parent_stage    = {'uid': 'stage.0000',    'name': None}
+
+    for state in [states.SCHEDULING, states.SCHEDULED, states.SCHEDULING]:
+        task.state = state
+        progress.advance(task)
+
+    assert report.lines == []
+
+    progress.flush()
+    assert report.lines == ['p.stage.0000: SCHEDULING: 2, SCHEDULED: 1\n']
+
+    # only stages which progressed are reported
+    progress.flush()
+    assert len(report.lines) == 1
+
+
+# ------------------------------------------------------------------------------
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+from radical.entk.utils import get_queue
+
+
+# ------------------------------------------------------------------------------
+#
+def test_get_queue():
+
+    queues = ['test-pendingq-%d' % i for i in range(1, 5)]
+    uids   = ['pipeline.%04d' % i for i in range(100)]
+
+    # all uids map to one of the queues, and the mapping is stable
+    for uid in uids:
+        assert get_queue(uid, queues) in queues
+        assert get_queue(uid, queues) == get_queue(unicode(uid), queues)
+
+    # a single queue gets everything
+    for uid in uids:
+        assert get_queue(uid, queues[:1]) == queues[0]
+
+    # uids are spread over the queues
+    assert set([get_queue(uid, queues) for uid in uids]) == set(queues)
+
+
+# ------------------------------------------------------------------------------
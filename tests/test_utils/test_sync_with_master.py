@@ -16,10 +16,6 @@ def syncer(obj, obj_type, queue1):
     hostname = os.environ.get('RMQ_HOSTNAME', 'localhost')
     port = int(os.environ.get('RMQ_PORT', 5672))
 
-    mq_connection = pika.BlockingConnection(pika.ConnectionParameters(
-                                                      host=hostname, port=port))
-    mq_channel = mq_connection.channel()
-
     sid = 'test.0015'
     rmgr = BaseRmgr({}, sid, None, {})
     tmgr = BaseTmgr(sid=sid,
@@ -30,9 +26,11 @@ def syncer(obj, obj_type, queue1):
                     port=port,
                     rts=None)
 
+    mq_channel = tmgr._transport.channel()
+
     tmgr._sync_with_master(obj, obj_type, mq_channel, queue1)
 
-    mq_connection.close()
+    mq_channel.close()
 
 
 # ------------------------------------------------------------------------------